@@ -0,0 +1,254 @@
+"""
+Cached, parallel index of JSON game data (mods/data trees).
+
+JsonIndex walks one or more folders for .json files, parses new or changed
+ones on a process pool and stores every top level object in a SQLite file,
+indexed by "type" and "id". A file is parsed again only when its size or
+mtime_ns changed, so re-running a query over thousands of files costs one
+stat per file plus the query. Encodings are tried as UTF-8 (with or without
+BOM) first; chardet is only used for files that aren't UTF-8, and the
+result is kept with the file.
+
+    if __name__ == "__main__":
+        index = JsonIndex("gamedata.sqlite", [modpath, basepath])
+        index.refresh()
+        guns = index.query("type", "GUN")
+
+refresh() parses on a process pool, which re-imports the main module in
+every worker on Windows (spawn): scripts must call it under a __main__
+guard, or each worker runs the script again and fails.
+
+`python -m eakse.jsonindex --db gamedata.sqlite PATH... --key type --value GUN`
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+FALLBACK_ENCODING = "latin-1"
+# files handed to a worker at once
+CHUNKSIZE = 32
+# sqlite limits the number of "?" per statement
+BATCH = 500
+
+
+def find_files(roots, extension: str = ".json") -> dict:
+    """Map path -> (size, mtime_ns) for all files ending in extension below roots."""
+    result = {}
+    extension = extension.lower()
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(extension):
+                    st = entry.stat()
+                    result[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                # removed while walking
+                pass
+    return result
+
+
+def detect_encoding(data: bytes, known=None) -> str:
+    for encoding in (known, "utf-8-sig"):
+        if encoding:
+            try:
+                data.decode(encoding)
+                return encoding
+            except (UnicodeDecodeError, LookupError):
+                pass
+    try:
+        import chardet
+    except ImportError:
+        return FALLBACK_ENCODING
+    return chardet.detect(data)["encoding"] or FALLBACK_ENCODING
+
+
+def item_id(item: dict):
+    """The "id" of an object as a string ("abstract" for templates), None if it has none."""
+    value = item.get("id", item.get("abstract"))
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def parse_file(path: str, known_encoding=None):
+    """Worker: (path, encoding, objects, error) for one file."""
+    try:
+        with open(path, "rb") as infile:
+            data = infile.read()
+        encoding = detect_encoding(data, known_encoding)
+        content = json.loads(data.decode(encoding))
+    except (OSError, ValueError) as e:
+        return path, None, [], str(e)
+    if isinstance(content, dict):
+        content = [content]
+    if not isinstance(content, list):
+        return path, encoding, [], None
+    return path, encoding, [item for item in content if isinstance(item, dict)], None
+
+
+def _parse_chunk(jobs: list) -> list:
+    return [parse_file(path, encoding) for path, encoding in jobs]
+
+
+class JsonIndex:
+    def __init__(self, db_path: str, roots, extension: str = ".json", workers: int = 0):
+        self.roots = list(roots)
+        self.extension = extension
+        self.workers = workers or os.cpu_count() or 1
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                "mtime_ns INTEGER, encoding TEXT, error TEXT)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS items (path TEXT, position INTEGER, "
+                "type TEXT, id TEXT, data TEXT)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS items_type ON items (type)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS items_id ON items (id)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS items_path ON items (path)")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def refresh(self, log=None) -> dict:
+        """Bring the index up to date with the folders, returns counts."""
+        started = time.perf_counter()
+        found = find_files(self.roots, self.extension)
+        known = {
+            row["path"]: row
+            for row in self.db.execute("SELECT path, size, mtime_ns, encoding FROM files")
+        }
+        removed = [path for path in known if path not in found]
+        changed = [
+            (path, known[path]["encoding"] if path in known else None)
+            for path, (size, mtime_ns) in found.items()
+            if path not in known
+            or known[path]["size"] != size
+            or known[path]["mtime_ns"] != mtime_ns
+        ]
+        results = self._parse(changed)
+        errors = 0
+        with self.db:
+            stale = removed + [path for path, _ in changed]
+            for i in range(0, len(stale), BATCH):
+                batch = stale[i : i + BATCH]
+                marks = ", ".join("?" for _ in batch)
+                self.db.execute(f"DELETE FROM files WHERE path IN ({marks})", batch)
+                self.db.execute(f"DELETE FROM items WHERE path IN ({marks})", batch)
+            for path, encoding, objects, error in results:
+                size, mtime_ns = found[path]
+                errors += error is not None
+                self.db.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, encoding, error),
+                )
+                self.db.executemany(
+                    "INSERT INTO items VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            path,
+                            position,
+                            str(item.get("type")) if "type" in item else None,
+                            item_id(item),
+                            json.dumps(item, separators=(",", ":")),
+                        )
+                        for position, item in enumerate(objects)
+                    ],
+                )
+        stats = {
+            "files": len(found),
+            "parsed": len(changed),
+            "removed": len(removed),
+            "errors": errors,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        if log is not None:
+            log(
+                f"Indexed {stats['files']} files: {stats['parsed']} parsed, "
+                f"{stats['removed']} removed, {stats['errors']} unreadable "
+                f"in {stats['seconds']} s"
+            )
+        return stats
+
+    def _parse(self, jobs: list) -> list:
+        if len(jobs) < CHUNKSIZE * 2 or self.workers < 2:
+            return _parse_chunk(jobs)
+        chunks = [jobs[i : i + CHUNKSIZE] for i in range(0, len(jobs), CHUNKSIZE)]
+        with ProcessPoolExecutor(self.workers) as pool:
+            return [result for chunk in pool.map(_parse_chunk, chunks) for result in chunk]
+
+    # queries ------------------------------------------------------------
+    def _rows(self, sql: str, args=()) -> list:
+        return [json.loads(row["data"]) for row in self.db.execute(sql, args)]
+
+    def by_type(self, value: str) -> list:
+        return self._rows("SELECT data FROM items WHERE type = ? ORDER BY path, position", (value,))
+
+    def by_id(self, value: str) -> list:
+        return self._rows("SELECT data FROM items WHERE id = ? ORDER BY path, position", (value,))
+
+    def query(self, key: str, value) -> list:
+        """Objects whose top level key equals value, indexed for "type" and "id"."""
+        if key == "type":
+            return self.by_type(value)
+        if key == "id":
+            return self.by_id(value)
+        path = "$." + json.dumps(key)
+        if isinstance(value, (dict, list)):
+            sql = "SELECT data FROM items WHERE json_extract(data, ?) = json(?) ORDER BY path, position"
+            return self._rows(sql, (path, json.dumps(value)))
+        sql = "SELECT data FROM items WHERE json_extract(data, ?) = ? ORDER BY path, position"
+        return self._rows(sql, (path, value))
+
+    def errors(self) -> list:
+        """(path, error) of files that couldn't be parsed."""
+        return [
+            (row["path"], row["error"])
+            for row in self.db.execute("SELECT path, error FROM files WHERE error IS NOT NULL")
+        ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="eakse.jsonindex", description="Query JSON game data")
+    parser.add_argument("paths", nargs="+", help="folders to index")
+    parser.add_argument("--db", default="jsonindex.sqlite", help="index file")
+    parser.add_argument("--key", default="type")
+    parser.add_argument("--value", required=True)
+    parser.add_argument("--count", action="store_true", help="only print the number of matches")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args(argv)
+    with JsonIndex(args.db, args.paths, workers=args.workers) as index:
+        index.refresh(log=lambda text: print(text, file=sys.stderr))
+        items = index.query(args.key, args.value)
+    if args.count:
+        print(len(items))
+    else:
+        print(json.dumps(items, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,211 @@
-# from github here:
+# originally based on:
 # https://github.com/ikonikon/fast-copy
+"""
+Parallel, tree-preserving file copy.
 
-import queue
-import threading
+FastCopy copies a directory tree (or a list of file pairs) with a pool of
+worker threads. Every instance has its own pool, which is shut down when the
+copy finishes or fails. File data goes through os.copy_file_range or
+os.sendfile where the OS has them, with a buffered loop as fallback, and
+byte-level progress is reported through a callback.
+"""
+import errno
 import os
 import shutil
-from tqdm import tqdm
-from typing import List
+import sys
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+BUFSIZE = 1024 * 1024
+# worker counts per storage type, spinning disks hate concurrent seeks
+HDD_WORKERS = 2
+SSD_WORKERS = 8
+# errors that mean "this zero-copy call isn't supported here, try the next"
+FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.EPERM,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+}
+
+
+def is_rotational(path: str):
+    """True for a spinning disk, False for SSD/NVMe, None if unknown (non Linux)."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        dev = os.stat(path).st_dev
+        block = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+        # partitions don't have a queue dir, their parent device does
+        for candidate in (block, os.path.dirname(block)):
+            queue = os.path.join(candidate, "queue", "rotational")
+            if os.path.exists(queue):
+                with open(queue) as infile:
+                    return infile.read().strip() == "1"
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_workers(*paths) -> int:
+    """Worker count for copying between paths, low if any of them is a HDD."""
+    for path in paths:
+        if is_rotational(path):
+            return HDD_WORKERS
+    return min(SSD_WORKERS, (os.cpu_count() or 1) * 2)
+
+
+def _zero_copy(func, fsrc, fdst, progress) -> bool:
+    """Copy with func(infd, outfd) -> bytes until EOF, False if func is unsupported."""
+    infd = fsrc.fileno()
+    outfd = fdst.fileno()
+    copied = 0
+    while True:
+        try:
+            n = func(infd, outfd)
+        except OSError as e:
+            if copied == 0 and e.errno in FALLBACK_ERRNOS:
+                return False
+            raise
+        if n == 0:
+            return True
+        copied += n
+        if progress is not None:
+            progress(n)
+
+
+def copy_file(src: str, dst: str, progress=None, check=None):
+    """
+    Copy data and metadata of src to dst. progress(nbytes) is called as data
+    is copied, check() between chunks may raise to abort.
+    """
+    def report(n):
+        if check is not None:
+            check()
+        if progress is not None:
+            progress(n)
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        done = False
+        if hasattr(os, "copy_file_range"):
+            done = _zero_copy(
+                lambda i, o: os.copy_file_range(i, o, CHUNK_SIZE), fsrc, fdst, report
+            )
+        if not done and hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+            # file to file sendfile only works on Linux
+            done = _zero_copy(
+                lambda i, o: os.sendfile(o, i, None, CHUNK_SIZE), fsrc, fdst, report
+            )
+        if not done:
+            buf = bytearray(BUFSIZE)
+            view = memoryview(buf)
+            while True:
+                n = fsrc.readinto(buf)
+                if not n:
+                    break
+                fdst.write(view[:n])
+                report(n)
+    shutil.copystat(src, dst)
 
 
 class FastCopy:
-    file_queue = queue.Queue()
-    totalFiles = 0
-    copy_count = 0
-    lock = threading.Lock()
-    progress_bar = None
-
-
-    def __init__(self, src_dir: str, dest_dir: str):
-        self.src_dir = os.path.abspath(src_dir)
-        if not os.path.exists(self.src_dir):
-            raise ValueError(f"Error: source directory {self.src_dir} does not exist.")
-        self.dest_dir = os.path.abspath(dest_dir)
-        # create output dir
-        if not os.path.exists(self.dest_dir):
-            print(f"Destination folder {self.dest_dir} does not exist - creating now.")
-            os.makedirs(self.dest_dir)
-
-
-        file_list = []
-        for root, _, files in os.walk(os.path.abspath(self.src_dir)):
-            for file in files:
-                file_list.append(os.path.join(root, file))
-        self.total_files = len(file_list)
-        print(f"{self.total_files} files to copy from {self.src_dir} to {self.dest_dir}")
-        self.dispatch_workers(file_list)
-
-
-    def single_copy(self):
-        while True:
-            file = self.file_queue.get()
-            shutil.copy(file, self.dest_dir)
-            self.file_queue.task_done()
-            with self.lock:
-                self.progress_bar.update(1)
-
-
-    def dispatch_workers(self, file_list: List[str]):
-        n_threads = 16
-        for i in range(n_threads):
-            t = threading.Thread(target=self.single_copy)
-            t.daemon = True
-            t.start()
-        print("{} copy deamons started.".format(16))
-        self.progress_bar = tqdm(total=self.total_files)
-        for file_name in file_list:
-            self.file_queue.put(file_name)
-        self.file_queue.join()
-        self.progress_bar.close()
-        print(f"{len(os.listdir(self.dest_dir))}/{self.total_files} files copied successfully.")
+    def __init__(self, workers: int = 0, progress=None, check=None):
+        """
+        workers <= 0 picks a count from the storage type of source and target.
+        progress(done_bytes, total_bytes, done_files, total_files) is called
+        from the worker threads, check() may raise to cancel the copy.
+        """
+        self.workers = workers
+        self.progress = progress
+        self.check = check
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.done_bytes = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.total_files = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise InterruptedError("copy cancelled")
+        if self.check is not None:
+            self.check()
+
+    def _add_bytes(self, n: int):
+        with self.lock:
+            self.done_bytes += n
+            state = (self.done_bytes, self.total_bytes, self.done_files, self.total_files)
+        if self.progress is not None:
+            self.progress(*state)
+
+    def _copy_one(self, src: str, dst: str):
+        self._check()
+        copy_file(src, dst, self._add_bytes, self._check)
+        with self.lock:
+            self.done_files += 1
+            state = (self.done_bytes, self.total_bytes, self.done_files, self.total_files)
+        if self.progress is not None:
+            self.progress(*state)
+
+    def copy_files(self, pairs: list) -> dict:
+        """Copy (src, dst) file pairs in parallel, target dirs must exist."""
+        self.done_bytes = 0
+        self.done_files = 0
+        self.total_files = len(pairs)
+        self.total_bytes = 0
+        for src, _ in pairs:
+            try:
+                self.total_bytes += os.path.getsize(src)
+            except OSError:
+                pass
+        if not pairs:
+            return {"files": 0, "bytes": 0}
+        workers = self.workers
+        if workers <= 0:
+            workers = default_workers(pairs[0][0], os.path.dirname(pairs[0][1]))
+        executor = ThreadPoolExecutor(workers, thread_name_prefix="eakse-copy")
+        try:
+            futures = [executor.submit(self._copy_one, src, dst) for src, dst in pairs]
+            finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in finished:
+                error = future.exception()
+                if error is not None:
+                    # stop the others at their next chunk and drop queued files
+                    self.cancelled.set()
+                    raise error
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.cancelled.clear()
+        return {"files": self.done_files, "bytes": self.done_bytes}
+
+    def copytree(self, src_dir: str, dest_dir: str) -> dict:
+        """
+        Copy src_dir into dest_dir keeping the tree structure (like
+        shutil.copytree with dirs_exist_ok=True), returns {files, bytes}.
+        """
+        src_dir = os.path.abspath(src_dir)
+        dest_dir = os.path.abspath(dest_dir)
+        if not os.path.isdir(src_dir):
+            raise ValueError(f"Error: source directory {src_dir} does not exist.")
+        pairs = []
+        dirs = []
+        for root, dirnames, files in os.walk(src_dir):
+            rel = os.path.relpath(root, src_dir)
+            target = dest_dir if rel == "." else os.path.join(dest_dir, rel)
+            os.makedirs(target, exist_ok=True)
+            dirs.append((root, target))
+            for name in files:
+                pairs.append((os.path.join(root, name), os.path.join(target, name)))
+        stats = self.copy_files(pairs)
+        # after the files, writing them changed the dir mtimes
+        for root, target in dirs:
+            shutil.copystat(root, target)
+        return stats
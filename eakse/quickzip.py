@@ -1,11 +1,133 @@
+"""
+Run the 7-Zip command line program.
+
+find_7zip() looks for 7zz (7-Zip for Linux/macOS), 7z or 7za on PATH and in
+the default Windows install folder. SevenZip runs it with progress output
+(-bsp1) and parses the percentages while it works, on all cores unless -mmt
+says otherwise. check() is called in between and may raise to stop it, the
+process is killed then.
+
+    SevenZip(find_7zip()).run(["a", "-t7z", "out.7z", "folder"], cwd=parent)
+"""
+import functools
 import os
+import queue
+import re
+import shutil
 import subprocess
+import threading
+
+
+NAMES = ("7zz", "7z", "7za")
+WINDOWS_PATHS = (
+    os.path.join(os.environ.get("ProgramFiles", r"C:\Program Files"), "7-Zip", "7z.exe"),
+    os.path.join(os.environ.get("ProgramFiles(x86)", r"C:\Program Files (x86)"), "7-Zip", "7z.exe"),
+)
+# seconds between check() calls while 7-Zip runs
+POLL = 0.2
+# -bsp1 redraws "  42% 12 + name" with backspaces
+SEPARATORS = re.compile(rb"[\b\r\n]+")
+PERCENT = re.compile(rb"^\s*(\d{1,3})%")
+# bytes of stderr kept for the error message
+ERROR_TAIL = 2000
+
+
+class SevenZipError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def find_7zip(path=None):
+    """Path of the 7-Zip binary (path if given and runnable), None if there is none."""
+    if path:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+        return shutil.which(path)
+    for name in NAMES:
+        found = shutil.which(name)
+        if found:
+            return found
+    if os.name == "nt":
+        for candidate in WINDOWS_PATHS:
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def _read_progress(stream, put):
+    buffer = b""
+    last = None
+    for chunk in iter(lambda: stream.read1(4096), b""):
+        parts = SEPARATORS.split(buffer + chunk)
+        # the last part may be cut off, it is finished by the next chunk
+        buffer = parts.pop()
+        for part in parts:
+            match = PERCENT.match(part)
+            if match and int(match.group(1)) != last:
+                last = int(match.group(1))
+                put(last)
+
+
+class SevenZip:
+    def __init__(self, binary: str):
+        self.binary = binary
+        self.name = os.path.basename(binary)
+
+    def run(self, args: list, cwd=None, progress=None, check=None):
+        """
+        Run 7-Zip with args (command first), progress(percent) is called on
+        the calling thread whenever the percentage changes. Raises
+        SevenZipError if it fails.
+        """
+        command = [self.binary, args[0], "-bsp1", "-bso0", *args[1:]]
+        flags = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+        process = subprocess.Popen(
+            command,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=flags,
+        )
+        percents = queue.Queue()
+        errors = []
+        readers = [
+            threading.Thread(target=_read_progress, args=(process.stdout, percents.put), daemon=True),
+            threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            while True:
+                try:
+                    returncode = process.wait(POLL)
+                except subprocess.TimeoutExpired:
+                    returncode = None
+                while not percents.empty():
+                    percent = percents.get()
+                    if progress is not None:
+                        progress(percent)
+                if returncode is not None:
+                    break
+                if check is not None:
+                    check()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            for reader in readers:
+                reader.join()
+            process.stdout.close()
+            process.stderr.close()
+        if returncode != 0:
+            message = b"".join(errors)[-ERROR_TAIL:].decode(errors="replace").strip()
+            raise SevenZipError(f"{self.name} exited with code {returncode}: {message}")
 
-path_7zip = r"C:/Program Files/7-Zip/7z.exe"
-path_working = r"C:/###VS Projects/###TMP"
-outfile_name = "compressed.zip"
-os.chdir(path_working)
 
-def zipthis():
-    ret = subprocess.check_output([path_7zip, "a", "-tzip", outfile_name])
-    return ret
\ No newline at end of file
+def zipthis(outfile_name: str = "compressed.zip", paths=(), cwd=None):
+    """Zip paths (relative to cwd) into outfile_name."""
+    binary = find_7zip()
+    if binary is None:
+        raise FileNotFoundError("7-Zip not found")
+    SevenZip(binary).run(["a", "-tzip", outfile_name, *paths], cwd=cwd)
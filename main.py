@@ -1,6 +1,13 @@
-from savemanager_app import SaveManagerApp
+import sys
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # any arguments: run headless, e.g. `python main.py backup`
+        from savemanager.cli import main
+
+        sys.exit(main())
+    from savemanager_app import SaveManagerApp
+
     app = SaveManagerApp()
     app.run()
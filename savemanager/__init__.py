@@ -0,0 +1 @@
+"""Backend helpers for the save manager (storage formats, snapshots, jobs)."""
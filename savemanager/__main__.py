@@ -0,0 +1,6 @@
+import sys
+
+from savemanager.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+Benchmarks on synthetic save trees: `python -m savemanager.bench`.
+
+Generates source folders of different shapes (many tiny files, a few huge
+blobs, deep nesting, already-compressed data) and destination folders with
+10/1,000/10,000 backups, runs the engine headless against them and prints
+wall time, MB/s, peak RSS and compression ratio per operation as JSON.
+Startup (a fresh interpreter importing what the GUI imports and showing the
+cached backup list) is checked against a time budget.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from savemanager.engine import BackupEngine
+from savemanager.logpipe import WARNING, LogPipeline
+from savemanager.settings import DEFAULT_SETTINGS
+
+
+SHAPES = ("tiny", "blobs", "deep", "compressed")
+BACKUP_COUNTS = (10, 1000, 10000)
+MB = 1024 * 1024
+# seconds from interpreter start to a filled backup list
+STARTUP_BUDGET_S = 0.5
+# imported on first use only, startup must not pull them in
+LAZY_MODULES = ("py7zr", "backports.zstd", "compression.zstd")
+# run by bench_startup in a fresh interpreter, prints its timings as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from savemanager.engine import BackupEngine
+from savemanager.jobs import JobScheduler
+from savemanager.logpipe import LogPipeline
+from savemanager.metadata import MetadataLoader
+from savemanager.settings import SettingsStore
+from savemanager.sizescan import BackgroundSizeScanner
+imported = time.perf_counter()
+engine = BackupEngine(json.loads(sys.argv[1]), LogPipeline())
+engine.get_current_backups(cached=True)
+listed = time.perf_counter()
+engine.get_current_backups()
+reconciled = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "cached_list_s": listed - imported,
+    "reconcile_s": reconciled - listed,
+    "lazy_loaded": [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+
+# synthetic trees ------------------------------------------------------------
+def compressible(rng: random.Random, size: int) -> bytes:
+    """Save-game like data: repetitive records with some noise."""
+    words = [rng.randbytes(rng.randint(2, 12)) for _ in range(64)]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words)
+        out += rng.randint(0, 65535).to_bytes(2, "little")
+    return bytes(out[:size])
+
+
+def write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as outfile:
+        outfile.write(data)
+
+
+def make_tree(shape: str, root: str, scale: float = 1.0, seed: int = 0):
+    """Fill root with a synthetic save folder of the given shape."""
+    rng = random.Random(f"{shape}-{seed}")
+    if shape == "tiny":
+        for i in range(int(5000 * scale)):
+            write(
+                os.path.join(root, f"slot{i % 20:02}", f"chunk{i:05}.dat"),
+                compressible(rng, rng.randint(64, 512)),
+            )
+    elif shape == "blobs":
+        for i in range(3):
+            # half random, half compressible, like big world files
+            size = int(32 * MB * scale)
+            write(
+                os.path.join(root, f"world{i}.bin"),
+                rng.randbytes(size // 2) + compressible(rng, size - size // 2),
+            )
+    elif shape == "deep":
+        for chain in range(int(20 * scale) or 1):
+            path = os.path.join(root, f"tree{chain:02}")
+            for depth in range(30):
+                path = os.path.join(path, f"level{depth:02}")
+                write(os.path.join(path, "node.json"), compressible(rng, 2048))
+    elif shape == "compressed":
+        for i in range(int(200 * scale)):
+            # stands in for png/ogg/zip assets that won't compress further
+            write(os.path.join(root, "assets", f"asset{i:04}.png"), rng.randbytes(256 * 1024))
+    else:
+        raise ValueError(f"Unknown shape: {shape}")
+
+
+def tree_size(root: str):
+    size = 0
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            size += os.path.getsize(os.path.join(dirpath, name))
+            count += 1
+    return size, count
+
+
+def make_dest(dest: str, count: int, settings: dict):
+    """A destination folder with count (empty) numbered backups."""
+    os.makedirs(dest, exist_ok=True)
+    for i in range(1, count + 1):
+        open(os.path.join(dest, f"{settings['FILE_NAME']}{i:05}{settings['FILE_EXT']}"), "wb").close()
+
+
+# measuring ------------------------------------------------------------------
+def reset_peak_rss() -> bool:
+    """Reset the peak RSS counter (Linux), False if only a process peak exists."""
+    try:
+        with open("/proc/self/clear_refs", "w") as outfile:
+            outfile.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak resident set size in bytes, None if unknown."""
+    try:
+        with open("/proc/self/status") as infile:
+            for line in infile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def measure(name: str, func, data_bytes: int = 0, **extra) -> dict:
+    scoped = reset_peak_rss()
+    start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - start
+    result = {
+        "operation": name,
+        "wall_s": round(wall, 6),
+        "mb_per_s": round(data_bytes / MB / wall, 2) if data_bytes and wall else None,
+        "peak_rss_mb": None,
+        "rss_scope": "operation" if scoped else "process",
+        **extra,
+    }
+    rss = peak_rss()
+    if rss is not None:
+        result["peak_rss_mb"] = round(rss / MB, 1)
+    return result
+
+
+def quiet_engine(settings: dict) -> BackupEngine:
+    return BackupEngine(settings, LogPipeline(level=WARNING, stream=sys.stderr))
+
+
+# benchmarks -----------------------------------------------------------------
+def bench_shape(shape: str, workdir: str, args) -> list:
+    source = os.path.join(workdir, shape, "save")
+    dest = os.path.join(workdir, shape, "backups")
+    make_tree(shape, source, args.scale, args.seed)
+    source_bytes, file_count = tree_size(source)
+    settings = {
+        **DEFAULT_SETTINGS,
+        "SOURCE_FOLDER": source,
+        "DEST_FOLDER": dest,
+        "SHOW_DEBUG": False,
+        "SKIP_UNCHANGED": "off",
+        "BACKUP_FORMAT": args.format,
+        "COMPRESSION": {"preset": args.preset},
+    }
+    engine = quiet_engine(settings)
+    common = {"shape": shape, "source_mb": round(source_bytes / MB, 2), "files": file_count}
+    results = []
+
+    results.append(
+        measure("size_cold", lambda: engine.scan_size(), source_bytes, **common)
+    )
+    results.append(
+        measure("size_warm", lambda: engine.scan_size(), source_bytes, **common)
+    )
+    results.append(
+        measure("fingerprint", lambda: engine.source_tree(), source_bytes, **common)
+    )
+
+    filename = []
+    result = measure(
+        "backup", lambda: filename.append(engine.add_new_backup()), source_bytes, **common
+    )
+    if filename[0] is None:
+        raise RuntimeError("The benchmark backup failed, see the log.")
+    if filename[0].endswith(".manifest"):
+        # chunk data is shared, count the chunk store
+        archive_bytes = tree_size(dest)[0]
+    else:
+        archive_bytes = os.path.getsize(engine.dest_path(filename[0]))
+    result["archive_mb"] = round(archive_bytes / MB, 2)
+    result["compression_ratio"] = round(archive_bytes / source_bytes, 4) if source_bytes else None
+    results.append(result)
+
+    results.append(
+        measure(
+            "verify",
+            lambda: engine.verify_backup(filename[0]),
+            archive_bytes,
+            **common,
+        )
+    )
+    results.append(
+        measure(
+            "restore_unchanged",
+            lambda: engine.restore_latest(False),
+            source_bytes,
+            **common,
+        )
+    )
+    shutil.rmtree(source)
+    os.makedirs(source)
+    results.append(
+        measure(
+            "restore_full",
+            lambda: engine.restore_latest(False),
+            source_bytes,
+            **common,
+        )
+    )
+    return results
+
+
+def bench_listing(count: int, workdir: str) -> list:
+    dest = os.path.join(workdir, f"dest{count}")
+    settings = {**DEFAULT_SETTINGS, "DEST_FOLDER": dest, "SOURCE_FOLDER": dest}
+    make_dest(dest, count, settings)
+    common = {"backups": count}
+    results = []
+    engine = quiet_engine(settings)
+    results.append(measure("list_cold", engine.get_current_backups, **common))
+    results.append(measure("list_warm", engine.get_current_backups, **common))
+    results.append(measure("highest", engine.get_current_highest, **common))
+    # catalog exists on disk now, fresh process-like engine
+    engine = quiet_engine(settings)
+    results.append(measure("list_reopen", engine.get_current_backups, **common))
+    # the GUI shows the catalog as last synced first
+    results.append(
+        measure("list_cached", lambda: engine.get_current_backups(cached=True), **common)
+    )
+    return results
+
+
+def bench_startup(count: int, workdir: str, budget: float) -> dict:
+    """Time a fresh interpreter to the cached backup list of count backups."""
+    dest = os.path.join(workdir, f"startup{count}")
+    settings = {**DEFAULT_SETTINGS, "DEST_FOLDER": dest, "SOURCE_FOLDER": dest}
+    make_dest(dest, count, settings)
+    # a catalog from an earlier run, like the GUI finds it
+    quiet_engine(settings).get_current_backups()
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = filter(None, (package, os.environ.get("PYTHONPATH")))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(paths)}
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, json.dumps(settings), *LAZY_MODULES],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    wall = time.perf_counter() - start
+    timings = json.loads(output)
+    # interpreter start up to the cached list, the reconcile runs behind the window
+    to_list = wall - timings["reconcile_s"]
+    return {
+        "operation": "startup",
+        "backups": count,
+        "wall_s": round(wall, 6),
+        "to_list_s": round(to_list, 6),
+        "import_s": round(timings["import_s"], 6),
+        "cached_list_s": round(timings["cached_list_s"], 6),
+        "reconcile_s": round(timings["reconcile_s"], 6),
+        "budget_s": budget,
+        "within_budget": to_list <= budget,
+        "lazy_loaded": timings["lazy_loaded"],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="savemanager.bench", description=__doc__.split("\n")[1])
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="comma separated")
+    parser.add_argument(
+        "--backups",
+        default=",".join(str(count) for count in BACKUP_COUNTS),
+        help="destination sizes for the listing benchmark, comma separated",
+    )
+    parser.add_argument("--scale", type=float, default=1.0, help="tree size multiplier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--preset", default="balanced", help="compression preset")
+    parser.add_argument("--format", default="7z", choices=("7z", "chunks"))
+    parser.add_argument("--workdir", help="where to generate trees (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep generated files")
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=STARTUP_BUDGET_S,
+        help="seconds the GUI may take to its backup list",
+    )
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="savemanager_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "preset": args.preset,
+            "format": args.format,
+            "startup_budget_s": args.startup_budget,
+        },
+        "results": [],
+    }
+    try:
+        for shape in filter(None, args.shapes.split(",")):
+            print(f"Benchmarking {shape}...", file=sys.stderr)
+            report["results"].extend(bench_shape(shape, workdir, args))
+        for count in filter(None, args.backups.split(",")):
+            print(f"Benchmarking listing of {count} backups...", file=sys.stderr)
+            report["results"].extend(bench_listing(int(count), workdir))
+            report["results"].append(bench_startup(int(count), workdir, args.startup_budget))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in report["results"]:
+        if result["operation"] == "startup" and not result["within_budget"]:
+            print(
+                f"Startup with {result['backups']} backups took {result['to_list_s']:.3f} s, "
+                f"over the {result['budget_s']} s budget",
+                file=sys.stderr,
+            )
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
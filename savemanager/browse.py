@@ -0,0 +1,96 @@
+"""
+Archive browsing.
+
+ArchiveListing is the file list of one backup (header only, nothing is
+decompressed) arranged as a tree, ListingCache keeps the most recently used
+listings keyed by path, size and mtime_ns so a rewritten archive is read
+again. Names are archive names: "root/rel/path" with forward slashes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+CACHE_SIZE = 16
+
+
+class ArchiveListing:
+    def __init__(self, entries: dict, dirs=()):
+        """entries maps file name -> ArchiveEntry, dirs are explicit dir names."""
+        self.entries = entries
+        self.children = {}
+        # total file size below each directory
+        self.sizes = {}
+        for name in dirs:
+            self._add_dir(name.strip("/"))
+        for name, entry in entries.items():
+            parent, _, _ = name.rpartition("/")
+            self._add_dir(parent)
+            self.children[parent].add(name)
+            while True:
+                self.sizes[parent] = self.sizes.get(parent, 0) + (entry.size or 0)
+                if not parent:
+                    break
+                parent, _, _ = parent.rpartition("/")
+
+    def _add_dir(self, name: str):
+        self.children.setdefault(name, set())
+        while name:
+            parent, _, _ = name.rpartition("/")
+            siblings = self.children.setdefault(parent, set())
+            if name in siblings:
+                # ancestors are linked already
+                break
+            siblings.add(name)
+            name = parent
+
+    def is_dir(self, name: str) -> bool:
+        return name.strip("/") in self.children
+
+    def list(self, path: str = "") -> list:
+        """Direct children of path as (name, is_dir, size), dirs first."""
+        path = path.strip("/")
+        result = []
+        for name in self.children.get(path, ()):
+            if name in self.children:
+                result.append((name, True, self.tree_size(name)))
+            else:
+                result.append((name, False, self.entries[name].size))
+        return sorted(result, key=lambda item: (not item[1], item[0].lower()))
+
+    def files_under(self, path: str) -> list:
+        """All file names at or below path."""
+        path = path.strip("/")
+        if path in self.entries:
+            return [path]
+        prefix = f"{path}/" if path else ""
+        return [name for name in self.entries if name.startswith(prefix)]
+
+    def tree_size(self, path: str) -> int:
+        path = path.strip("/")
+        if path in self.entries:
+            return self.entries[path].size or 0
+        return self.sizes.get(path, 0)
+
+
+class ListingCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.listings = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, load) -> ArchiveListing:
+        """Cached listing of path, load() -> ArchiveListing on a miss."""
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self.lock:
+            listing = self.listings.get(key)
+            if listing is not None:
+                self.listings.move_to_end(key)
+                return listing
+        listing = load()
+        with self.lock:
+            self.listings[key] = listing
+            while len(self.listings) > self.size:
+                self.listings.popitem(last=False)
+        return listing
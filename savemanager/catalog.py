@@ -0,0 +1,323 @@
+"""
+Persistent backup catalog.
+
+A small SQLite database in DEST_FOLDER/.savemanager records every backup
+(number, filename, size, creation time, source size, file count, archive
+checksum, source fingerprint, pinned, last verification, delta bases) plus the source listing each backup was made
+from, cached content hashes of source files and the block hashes of the latest
+backup's delta files. It is updated incrementally when backups are created or deleted and
+only reconciled against the directory when DEST_FOLDER's mtime changed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+
+CATALOG_DIR = ".savemanager"
+CATALOG_NAME = "catalog.sqlite"
+CHECKSUM_BUFSIZE = 1024 * 1024
+# content hash cache rows kept, oldest are dropped beyond this
+HASH_LIMIT = 200000
+# sqlite limits the number of "?" per statement
+BATCH = 500
+
+# column -> sql type, new columns are added to existing catalogs on open
+COLUMNS = {
+    "filename": "TEXT PRIMARY KEY",
+    "number": "INTEGER",
+    "size": "INTEGER",
+    "created": "REAL",
+    "source_size": "INTEGER",
+    "file_count": "INTEGER",
+    "checksum": "TEXT",
+    "fingerprint": "TEXT",
+    # pinned backups are never pruned
+    "pinned": "INTEGER DEFAULT 0",
+    # last scrub: time and "ok" or what was wrong
+    "verified": "REAL",
+    "verify_result": "TEXT",
+    # json list of the backups this one's delta files are rebuilt from
+    "delta_refs": "TEXT",
+}
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as infile:
+        while True:
+            data = infile.read(CHECKSUM_BUFSIZE)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+
+class Catalog:
+    def __init__(self, dest_folder: str, is_backup, get_number):
+        """
+        is_backup(filename) decides which files in dest_folder are backups,
+        get_number(filename) returns their backup number.
+        """
+        self.dest_folder = dest_folder
+        self.is_backup = is_backup
+        self.get_number = get_number
+        self.lock = threading.RLock()
+        folder = os.path.join(dest_folder, CATALOG_DIR)
+        os.makedirs(folder, exist_ok=True)
+        self.db = sqlite3.connect(
+            os.path.join(folder, CATALOG_NAME), check_same_thread=False
+        )
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS backups ("
+                + ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+                + ")"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS trees (filename TEXT PRIMARY KEY, entries BLOB)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS content_hashes (inode INTEGER, size INTEGER, "
+                "mtime_ns INTEGER, digest TEXT, PRIMARY KEY (inode, size, mtime_ns))"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS signatures (filename TEXT, path TEXT, "
+                "chain INTEGER, block_size INTEGER, hashes BLOB, refs TEXT, "
+                "PRIMARY KEY (filename, path))"
+            )
+            existing = {row["name"] for row in self.db.execute("PRAGMA table_info(backups)")}
+            for name, kind in COLUMNS.items():
+                if name not in existing:
+                    self.db.execute(f"ALTER TABLE backups ADD COLUMN {name} {kind}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def number(self, filename: str):
+        try:
+            return self.get_number(filename)
+        except (ValueError, IndexError):
+            return None
+
+    # directory state ----------------------------------------------------
+    def dir_mtime(self) -> str:
+        try:
+            return str(os.stat(self.dest_folder).st_mtime_ns)
+        except OSError:
+            return ""
+
+    def stored_mtime(self) -> str:
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+        return row["value"] if row else ""
+
+    def mark_synced(self):
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime', ?)",
+            (self.dir_mtime(),),
+        )
+
+    def in_sync(self) -> bool:
+        """
+        True if no one touched dest_folder since the last sync. Take this
+        before writing/deleting a backup and pass it to add()/remove(), so
+        our own change doesn't force a full rescan.
+        """
+        with self.lock:
+            return self.stored_mtime() == self.dir_mtime()
+
+    def reconcile(self, force: bool = False) -> bool:
+        """Sync rows with the files in dest_folder, returns True if it had to."""
+        with self.lock:
+            if not force and self.stored_mtime() == self.dir_mtime():
+                return False
+            rows = {
+                row["filename"]: row
+                for row in self.db.execute("SELECT filename, size FROM backups")
+            }
+            with self.db:
+                try:
+                    entries = list(os.scandir(self.dest_folder))
+                except OSError:
+                    entries = []
+                for entry in entries:
+                    if not entry.is_file() or not self.is_backup(entry.name):
+                        continue
+                    st = entry.stat()
+                    row = rows.pop(entry.name, None)
+                    if row is None:
+                        self.db.execute(
+                            "INSERT INTO backups (filename, number, size, created) "
+                            "VALUES (?, ?, ?, ?)",
+                            (entry.name, self.number(entry.name), st.st_size, st.st_mtime),
+                        )
+                    elif row["size"] != st.st_size:
+                        # replaced behind our back, checksum no longer valid
+                        self.db.execute(
+                            "UPDATE backups SET size = ?, checksum = NULL, "
+                            "fingerprint = NULL, verified = NULL, "
+                            "verify_result = NULL WHERE filename = ?",
+                            (st.st_size, entry.name),
+                        )
+                for filename in rows:
+                    self.db.execute("DELETE FROM backups WHERE filename = ?", (filename,))
+                    self.db.execute("DELETE FROM trees WHERE filename = ?", (filename,))
+                    self.db.execute("DELETE FROM signatures WHERE filename = ?", (filename,))
+                self.mark_synced()
+            return True
+
+    # queries ------------------------------------------------------------
+    def backups(self, reconcile: bool = True) -> list:
+        """
+        All backups as dicts, newest filename first. Without reconcile it's
+        the catalog as last synced, without looking at the folder.
+        """
+        if reconcile:
+            self.reconcile()
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.db.execute("SELECT * FROM backups ORDER BY filename DESC")
+            ]
+
+    def get(self, filename: str):
+        self.reconcile()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT * FROM backups WHERE filename = ?", (filename,)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def rows(self, filenames: list) -> dict:
+        """filename -> row (dict) of those filenames that are backups in the catalog."""
+        self.reconcile()
+        result = {}
+        with self.lock:
+            for i in range(0, len(filenames), BATCH):
+                batch = filenames[i : i + BATCH]
+                marks = ", ".join("?" for _ in batch)
+                for row in self.db.execute(
+                    f"SELECT * FROM backups WHERE filename IN ({marks})", batch
+                ):
+                    result[row["filename"]] = dict(row)
+        return result
+
+    def highest(self):
+        self.reconcile()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT * FROM backups ORDER BY number DESC LIMIT 1"
+            ).fetchone()
+            return dict(row) if row else None
+
+    # updates ------------------------------------------------------------
+    def add(self, filename: str, synced: bool = False, **fields):
+        """Record a backup that was just written to dest_folder."""
+        path = os.path.join(self.dest_folder, filename)
+        st = os.stat(path)
+        values = {
+            "filename": filename,
+            "number": self.number(filename),
+            "size": st.st_size,
+            "created": st.st_mtime,
+            **fields,
+        }
+        with self.lock, self.db:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO backups ({', '.join(values)}) "
+                f"VALUES ({', '.join('?' for _ in values)})",
+                tuple(values.values()),
+            )
+            if synced:
+                self.mark_synced()
+
+    def update(self, filename: str, **fields):
+        with self.lock, self.db:
+            self.db.execute(
+                f"UPDATE backups SET {', '.join(f'{key} = ?' for key in fields)} "
+                "WHERE filename = ?",
+                (*fields.values(), filename),
+            )
+
+    def remove(self, filename: str, synced: bool = False):
+        """Forget a backup that was deleted from dest_folder."""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM backups WHERE filename = ?", (filename,))
+            self.db.execute("DELETE FROM trees WHERE filename = ?", (filename,))
+            self.db.execute("DELETE FROM signatures WHERE filename = ?", (filename,))
+            if synced:
+                self.mark_synced()
+
+    # source listings ----------------------------------------------------
+    def set_tree(self, filename: str, rows: list):
+        """Store the (json-able) source listing a backup was made from."""
+        blob = zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO trees (filename, entries) VALUES (?, ?)",
+                (filename, blob),
+            )
+
+    def get_tree(self, filename: str):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT entries FROM trees WHERE filename = ?", (filename,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row["entries"]))
+
+    def set_signatures(self, filename: str, signatures: dict):
+        """
+        Block hashes of filename's big files, path -> (chain, block_size,
+        hashes, refs). Only the latest backup's are needed, older ones go.
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM signatures")
+            self.db.executemany(
+                "INSERT INTO signatures VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (filename, path, chain, block_size, hashes, json.dumps(refs))
+                    for path, (chain, block_size, hashes, refs) in signatures.items()
+                ],
+            )
+
+    def get_signatures(self, filename: str) -> dict:
+        with self.lock:
+            return {
+                row["path"]: (
+                    row["chain"],
+                    row["block_size"],
+                    row["hashes"],
+                    json.loads(row["refs"]),
+                )
+                for row in self.db.execute(
+                    "SELECT * FROM signatures WHERE filename = ?", (filename,)
+                )
+            }
+
+    def load_hashes(self) -> list:
+        with self.lock:
+            return [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT inode, size, mtime_ns, digest FROM content_hashes"
+                )
+            ]
+
+    def store_hashes(self, rows: list):
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?)", rows
+            )
+            self.db.execute(
+                "DELETE FROM content_hashes WHERE rowid <= "
+                "(SELECT MAX(rowid) FROM content_hashes) - ?",
+                (HASH_LIMIT,),
+            )
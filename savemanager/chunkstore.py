@@ -0,0 +1,440 @@
+"""
+Content-addressed, deduplicated chunk store.
+
+Files are split into content-defined chunks (FastCDC style gear hash), every
+chunk is stored once under its hash in DEST_FOLDER/chunks and every backup is
+a small JSON manifest (BACKUP_NNN.manifest) that lists the chunks per file.
+Chunks no manifest refers to anymore are deleted by gc() (mark and sweep).
+A backup bumps the mtime of every chunk it reuses, so gc() running while it
+hasn't written its manifest yet leaves those chunks alone.
+
+With numpy the chunk boundaries are searched vectorized (about 20 times
+faster than byte by byte), the cut points are the same either way.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+
+from savemanager.restore import ArchiveEntry, live_files, remove_extra
+from savemanager import trace
+
+
+MANIFEST_EXT = ".manifest"
+CHUNK_DIR = "chunks"
+MANIFEST_VERSION = 1
+
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024
+MAX_CHUNK = 256 * 1024
+READ_SIZE = 4 * MAX_CHUNK
+# with no manifest to go by, gc() keeps unreferenced chunks this young
+GC_GRACE = 3600
+
+# normalized chunking: harder mask before the average size, easier after it.
+# Masks test the top bits of the gear hash, those depend on the last 64 bytes.
+_M64 = (1 << 64) - 1
+_MASK_S = ((1 << 18) - 1) << (64 - 18)
+_MASK_L = ((1 << 14) - 1) << (64 - 14)
+_GEAR = [
+    int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "little")
+    for i in range(256)
+]
+
+
+# the hash covers this many bytes, older ones are shifted out of the 64 bits
+WINDOW = 64
+# hashes compared per search step, a cut is usually found in the first ones
+SEARCH_BLOCK = 16 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _load_numpy():
+    """(numpy, gear table as uint64 array), None without numpy."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy, numpy.array(_GEAR, dtype=numpy.uint64)
+
+
+def chunk_hash(data) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _window_hashes(np, gear, buf, a: int, b: int):
+    """Gear hash of the WINDOW bytes ending at each position in buf[a:b]."""
+    h = gear[np.frombuffer(buf, dtype=np.uint8, count=b)[a - WINDOW + 1 :]]
+    # h holds sums of m bytes, doubled until it covers the window
+    m = 1
+    while m < WINDOW:
+        h[m:] += h[:-m] << np.uint64(m)
+        m *= 2
+    return h[WINDOW - 1 :]
+
+
+def _search(np, gear, buf, start: int, end: int, mask: int):
+    """First position in buf[start:end] whose window hash has no mask bits, None if none."""
+    mask = np.uint64(mask)
+    # block by block, the hashes past the cut are never needed
+    for block in range(start, end, SEARCH_BLOCK):
+        hashes = _window_hashes(np, gear, buf, block, min(block + SEARCH_BLOCK, end))
+        hits = (hashes & mask == 0).nonzero()[0]
+        if hits.size:
+            return block + int(hits[0])
+    return None
+
+
+def _cut_point(buf, start: int, end: int) -> int:
+    """Return the end offset of the chunk starting at `start` in buf[:end]."""
+    if end - start <= MIN_CHUNK:
+        return end
+    normal = min(start + AVG_CHUNK, end)
+    limit = min(start + MAX_CHUNK, end)
+    gear = _GEAR
+    h = 0
+    i = start + MIN_CHUNK
+    loaded = _load_numpy()
+    if loaded is not None:
+        # h only covers a full window WINDOW - 1 bytes after MIN_CHUNK,
+        # the positions before are hashed one by one
+        first = min(i + WINDOW - 1, normal)
+        while i < first:
+            h = ((h << 1) + gear[buf[i]]) & _M64
+            if not h & _MASK_S:
+                return i + 1
+            i += 1
+        if i < normal:
+            found = _search(*loaded, buf, i, normal, _MASK_S)
+            if found is not None:
+                return found + 1
+        found = _search(*loaded, buf, max(i, normal), limit, _MASK_L)
+        return limit if found is None else found + 1
+    while i < normal:
+        h = ((h << 1) + gear[buf[i]]) & _M64
+        if not h & _MASK_S:
+            return i + 1
+        i += 1
+    while i < limit:
+        h = ((h << 1) + gear[buf[i]]) & _M64
+        if not h & _MASK_L:
+            return i + 1
+        i += 1
+    return limit
+
+
+def iter_chunks(fileobj):
+    """Yield content-defined chunks (bytes) read from a binary file object."""
+    buf = b""
+    eof = False
+    while True:
+        if not eof and len(buf) < MAX_CHUNK:
+            data = fileobj.read(READ_SIZE)
+            if data:
+                buf += data
+                continue
+            eof = True
+        if not buf:
+            return
+        if not eof and len(buf) < MAX_CHUNK:
+            continue
+        pos = 0
+        # only cut while a full MAX_CHUNK window is available (or at EOF)
+        while pos < len(buf) and (eof or len(buf) - pos >= MAX_CHUNK):
+            cut = _cut_point(buf, pos, len(buf))
+            yield buf[pos:cut]
+            pos = cut
+        buf = buf[pos:]
+
+
+class ChunkStore:
+    def __init__(self, dest_folder: str, level: int = 6):
+        self.dest_folder = dest_folder
+        self.chunk_folder = os.path.join(dest_folder, CHUNK_DIR)
+        self.level = level
+        self._known = set()
+
+    # chunks -------------------------------------------------------------
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunk_folder, digest[:2], digest)
+
+    def has_chunk(self, digest: str) -> bool:
+        """True if the chunk is stored, its mtime is bumped (once per backup) as it's reused."""
+        if digest in self._known:
+            return True
+        try:
+            os.utime(self.chunk_path(digest))
+        except FileNotFoundError:
+            return False
+        self._known.add(digest)
+        return True
+
+    def put_chunk(self, data) -> tuple[str, int]:
+        """Store a chunk if new, return (digest, bytes written to disk)."""
+        digest = chunk_hash(data)
+        if self.has_chunk(digest):
+            return digest, 0
+        path = self.chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = zlib.compress(data, self.level)
+        _atomic_write(path, packed)
+        self._known.add(digest)
+        return digest, len(packed)
+
+    def get_chunk(self, digest: str, on_read=None) -> bytes:
+        """The data of a chunk, on_read(bytes read from disk) is called first."""
+        with open(self.chunk_path(digest), "rb") as infile:
+            packed = infile.read()
+        if on_read is not None:
+            on_read(len(packed))
+        data = zlib.decompress(packed)
+        if chunk_hash(data) != digest:
+            raise ValueError(f"Chunk {digest} is corrupt")
+        return data
+
+    # manifests ----------------------------------------------------------
+    def load_manifest(self, filename: str) -> dict:
+        with open(filename) as infile:
+            return json.load(infile)
+
+    def backup(
+        self, source: str, filename: str, previous=None, log=print, check=None
+    ) -> dict:
+        """
+        Store `source` as a new manifest `filename`.
+        Files whose path, size and mtime_ns match the `previous` manifest reuse
+        its chunk list without being read again. `check` is called before each
+        file and may raise to abort (no manifest is written then).
+        """
+        source = os.path.normpath(source)
+        # so has_chunk() bumps the mtime of every chunk this backup reuses
+        self._known.clear()
+        known = {}
+        if previous and os.path.exists(previous):
+            try:
+                for entry in self.load_manifest(previous)["files"]:
+                    known[entry["path"]] = entry
+            except Exception as e:
+                log(f"Ignoring previous manifest {previous}: {e}")
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "root": os.path.basename(source),
+            "dirs": [],
+            "files": [],
+        }
+        stats = {"files": 0, "reused": 0, "bytes": 0, "written": 0}
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            reldir = os.path.relpath(dirpath, source)
+            if reldir != ".":
+                manifest["dirs"].append(reldir.replace(os.sep, "/"))
+            for name in sorted(filenames):
+                if check is not None:
+                    check()
+                filepath = os.path.join(dirpath, name)
+                relpath = os.path.relpath(filepath, source).replace(os.sep, "/")
+                st = os.stat(filepath)
+                entry = {
+                    "path": relpath,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "mode": st.st_mode & 0o7777,
+                    "chunks": [],
+                }
+                old = known.get(relpath)
+                if (
+                    old is not None
+                    and old["size"] == st.st_size
+                    and old["mtime_ns"] == st.st_mtime_ns
+                    and all(self.has_chunk(d) for d in old["chunks"])
+                ):
+                    entry["chunks"] = old["chunks"]
+                    stats["reused"] += 1
+                else:
+                    with open(filepath, "rb") as infile:
+                        for chunk in iter_chunks(infile):
+                            digest, written = self.put_chunk(chunk)
+                            entry["chunks"].append(digest)
+                            stats["written"] += written
+                manifest["files"].append(entry)
+                stats["files"] += 1
+                stats["bytes"] += st.st_size
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        _atomic_write(filename, json.dumps(manifest, indent=1).encode("utf-8"))
+        return stats
+
+    def entries(self, filename: str) -> dict:
+        """Archive style listing: "root/path" -> ArchiveEntry (no CRCs)."""
+        manifest = self.load_manifest(filename)
+        root = manifest["root"]
+        return {
+            f"{root}/{entry['path']}": ArchiveEntry(entry["path"], entry["size"], None)
+            for entry in manifest["files"]
+        }
+
+    def dirs(self, filename: str) -> list:
+        manifest = self.load_manifest(filename)
+        return [f"{manifest['root']}/{reldir}" for reldir in manifest["dirs"]]
+
+    def restore(self, filename: str, target: str, targets=None) -> dict:
+        """
+        Rebuild the tree of manifest `filename` into `target` differentially:
+        files with the recorded size and mtime_ns are left alone, files that
+        are not in the manifest are removed. With targets (listing names like
+        "root/slot1") only those files/subtrees are touched. Returns a stats dict.
+        """
+        manifest = self.load_manifest(filename)
+        target = os.path.normpath(target)
+        parent, base = os.path.split(target)
+        # relative to the manifest root, "" is everything
+        selected = [""]
+        if targets is not None:
+            selected = [t.strip("/").partition("/")[2] for t in targets]
+
+        def wanted(path):
+            return any(not s or path == s or path.startswith(f"{s}/") for s in selected)
+
+        files = [entry for entry in manifest["files"] if wanted(entry["path"])]
+        file_paths = {entry["path"] for entry in manifest["files"]}
+        roots = [f"{base}/{s}" if s else base for s in selected if s not in file_paths]
+        live = live_files(parent, roots)
+        os.makedirs(target, exist_ok=True)
+        dirs = [reldir for reldir in manifest["dirs"] if wanted(reldir)]
+        for reldir in dirs:
+            os.makedirs(os.path.join(target, *reldir.split("/")), exist_ok=True)
+        stats = {"extracted": 0, "deleted": 0, "unchanged": 0}
+        for entry in files:
+            filepath = os.path.join(target, *entry["path"].split("/"))
+            found = live.pop(f"{base}/{entry['path']}", None)
+            if found is not None and found[1] == entry["size"]:
+                if os.stat(filepath).st_mtime_ns == entry["mtime_ns"]:
+                    stats["unchanged"] += 1
+                    continue
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            # written next to it and renamed, the old file may be linked into a staged tree
+            tmp = f"{filepath}.tmp{os.getpid()}"
+            try:
+                with trace.span("extract", entry["size"]), open(tmp, "wb") as outfile:
+                    for digest in entry["chunks"]:
+                        outfile.write(self.get_chunk(digest))
+            except BaseException:
+                os.remove(tmp)
+                raise
+            try:
+                os.chmod(tmp, entry["mode"])
+            except Exception:
+                pass
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, filepath)
+            stats["extracted"] += 1
+        delete = [path for path, _ in live.values()]
+        remove_extra(delete, parent, roots, [f"{base}/{d}" for d in manifest["dirs"]])
+        stats["deleted"] = len(delete)
+        return stats
+
+    # garbage collection -------------------------------------------------
+    def manifests(self) -> list:
+        return sorted(
+            os.path.join(self.dest_folder, name)
+            for name in os.listdir(self.dest_folder)
+            if name.endswith(MANIFEST_EXT)
+        )
+
+    def referenced(self) -> set:
+        """Digests of all chunks the manifests in dest_folder refer to."""
+        digests = set()
+        for filename in self.manifests():
+            # an unreadable manifest raises: better keep everything than lose its chunks
+            for entry in self.load_manifest(filename)["files"]:
+                digests.update(entry["chunks"])
+        return digests
+
+    def usage(self, filenames: list) -> dict:
+        """filename -> {digest: bytes on disk} of the chunks each manifest uses."""
+        sizes = {}
+        result = {}
+        for filename in filenames:
+            used = {}
+            manifest = self.load_manifest(os.path.join(self.dest_folder, filename))
+            for entry in manifest["files"]:
+                for digest in entry["chunks"]:
+                    if digest not in sizes:
+                        try:
+                            sizes[digest] = os.stat(self.chunk_path(digest)).st_size
+                        except OSError:
+                            sizes[digest] = 0
+                    used[digest] = sizes[digest]
+            result[filename] = used
+        return result
+
+    def chunk_files(self):
+        """Yield (digest, path, stat) of every file in the chunk folder."""
+        if not os.path.isdir(self.chunk_folder):
+            return
+        for prefix in sorted(os.listdir(self.chunk_folder)):
+            folder = os.path.join(self.chunk_folder, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if entry.is_file(follow_symlinks=False):
+                    yield entry.name, entry.path, entry.stat(follow_symlinks=False)
+
+    def gc(self, check=None) -> dict:
+        """
+        Delete chunks (and leftover temp files) no manifest refers to,
+        returns {"chunks", "bytes"} freed. Chunks written or reused after
+        the newest manifest may belong to a backup that is still running and
+        are kept.
+        """
+        manifests = self.manifests()
+        if manifests:
+            cutoff = max(os.stat(filename).st_mtime for filename in manifests)
+        else:
+            cutoff = time.time() - GC_GRACE
+        keep = self.referenced()
+        stats = {"chunks": 0, "bytes": 0}
+        for digest, path, st in self.chunk_files():
+            if digest in keep or st.st_mtime > cutoff:
+                continue
+            if check is not None:
+                check()
+            # claimed by a rename first: a backup reusing it before that bumped
+            # its mtime, one reusing it after finds it gone and writes it again
+            claimed = f"{path}.gc{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            if os.stat(claimed).st_mtime > cutoff:
+                os.replace(claimed, path)
+                continue
+            os.remove(claimed)
+            self._known.discard(digest)
+            stats["chunks"] += 1
+            stats["bytes"] += st.st_size
+        return stats
+
+    def verify(self, filename: str, on_read=None):
+        """
+        Check every chunk of a manifest, return the first bad file or None.
+        on_read(bytes) is called for every chunk read.
+        """
+        manifest = self.load_manifest(filename)
+        for entry in manifest["files"]:
+            try:
+                for digest in entry["chunks"]:
+                    self.get_chunk(digest, on_read)
+            except (OSError, ValueError, zlib.error):
+                return entry["path"]
+        return None
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as outfile:
+        outfile.write(data)
+    os.replace(tmp, path)
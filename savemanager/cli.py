@@ -0,0 +1,284 @@
+"""
+Command line interface: `python -m savemanager <command>`.
+
+Runs the same BackupEngine as the GUI without creating a Tk window, so
+backups can be scripted, run from cron or on a headless machine. With
+--connect the command is sent to a running `daemon` instead.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from savemanager.daemon import DEFAULT_PORT, EngineDaemon, read_token, send_command, token_path
+from savemanager.engine import BackupEngine, sizeof_fmt
+from savemanager.logpipe import DEBUG, ERROR, LogPipeline
+from savemanager.settings import SETTINGS_FILENAME, load_settings, profile_settings
+
+
+# command name -> func(engine, args) -> json-able result, shared with the daemon
+def cmd_backup(engine, args):
+    filename = engine.add_new_backup()
+    if filename is not None:
+        engine.prune()
+    return filename
+
+
+def backup_path(engine, filename: str) -> str:
+    if not os.path.isabs(filename) and not os.path.exists(filename):
+        return engine.dest_path(filename)
+    return filename
+
+
+def cmd_restore(engine, args):
+    filename = backup_path(engine, args["file"])
+    safety = args.get("safety", engine.settings["MAKE_BACKUP"])
+    if args.get("paths"):
+        return engine.restore_paths(filename, args["paths"], safety)
+    return engine.restore_backup(filename, safety)
+
+
+def cmd_browse(engine, args):
+    listing = engine.list_archive(backup_path(engine, args["file"]))
+    return listing.list(args.get("path", ""))
+
+
+def cmd_restore_latest(engine, args):
+    return engine.restore_latest(args.get("safety", engine.settings["MAKE_BACKUP"]))
+
+
+def cmd_undo(engine, args):
+    engine.undo_restore()
+
+
+def cmd_compress_safety(engine, args):
+    return engine.compress_safety(args.get("force", True))
+
+
+def cmd_list(engine, args):
+    rows = engine.get_backup_rows()
+    safety = engine.safety_path()
+    if os.path.exists(safety):
+        st = os.stat(safety)
+        rows.insert(
+            0,
+            {
+                "filename": engine.settings["SAFETY_BACKUP"],
+                "number": None,
+                "size": st.st_size,
+                "created": st.st_mtime,
+            },
+        )
+    return rows
+
+
+def cmd_verify(engine, args):
+    return engine.scrub(args.get("files"), stale_only=args.get("stale", False))
+
+
+def cmd_changes(engine, args):
+    changes = engine.changes_since(args.get("file"))
+    return None if changes is None else changes._asdict()
+
+
+def cmd_prune(engine, args):
+    return engine.prune(args.get("dry_run", False))
+
+
+def cmd_pin(engine, args):
+    engine.pin_backup(args["file"], True)
+
+
+def cmd_unpin(engine, args):
+    engine.pin_backup(args["file"], False)
+
+
+COMMANDS = {
+    "backup": cmd_backup,
+    "restore": cmd_restore,
+    "browse": cmd_browse,
+    "restore-latest": cmd_restore_latest,
+    "undo": cmd_undo,
+    "compress-safety": cmd_compress_safety,
+    "list": cmd_list,
+    "verify": cmd_verify,
+    "changes": cmd_changes,
+    "prune": cmd_prune,
+    "pin": cmd_pin,
+    "unpin": cmd_unpin,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="savemanager", description="Save game backup manager")
+    parser.add_argument("--settings", default=SETTINGS_FILENAME, help="settings file")
+    parser.add_argument("--profile", help="profile to use (default: PROFILE of the settings)")
+    parser.add_argument("--debug", action="store_true", help="show debug output")
+    parser.add_argument(
+        "--trace",
+        metavar="MODE",
+        help='record timing spans: "summary", "chrome" or "summary,chrome"',
+    )
+    parser.add_argument(
+        "--connect",
+        type=int,
+        nargs="?",
+        const=DEFAULT_PORT,
+        metavar="PORT",
+        help="send the command to a running daemon",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backup", help="create a new numbered backup")
+    restore = sub.add_parser("restore", help="restore a backup")
+    restore.add_argument("file", help="backup filename (in DEST_FOLDER) or path")
+    restore.add_argument(
+        "--path",
+        dest="paths",
+        action="append",
+        help="only restore this file or folder (as shown by browse), repeatable",
+    )
+    restore_latest = sub.add_parser("restore-latest", help="restore the newest backup")
+    for p in (restore, restore_latest):
+        p.add_argument(
+            "--no-safety",
+            dest="safety",
+            action="store_false",
+            default=None,
+            help="don't create SAFETY_BACKUP first",
+        )
+    sub.add_parser("undo", help="put back the save the last restore replaced")
+    sub.add_parser(
+        "compress-safety", help="compress the safety snapshot into SAFETY_BACKUP now"
+    )
+    browse = sub.add_parser("browse", help="list the contents of a backup")
+    browse.add_argument("file", help="backup filename (in DEST_FOLDER) or path")
+    browse.add_argument("path", nargs="?", default="", help="folder inside the backup")
+    listing = sub.add_parser("list", help="list backups")
+    listing.add_argument("--json", action="store_true", help="print JSON")
+    verify = sub.add_parser("verify", help="check backups for corruption")
+    verify.add_argument("files", nargs="*", help="backups to check (default: all)")
+    verify.add_argument(
+        "--stale",
+        action="store_true",
+        help="only backups not verified within SCRUB max_age_days",
+    )
+    changes = sub.add_parser("changes", help="show what changed since a backup")
+    changes.add_argument("file", nargs="?", help="backup filename (default: latest)")
+    prune = sub.add_parser("prune", help="delete backups the RETENTION setting doesn't keep")
+    prune.add_argument("--dry-run", action="store_true", help="only show what would go")
+    for name in ("pin", "unpin"):
+        p = sub.add_parser(name, help=f"{name} a backup (pinned backups are never pruned)")
+        p.add_argument("file", help="backup filename")
+    daemon = sub.add_parser("daemon", help="keep running and accept --connect commands")
+    daemon.add_argument("--port", type=int, default=DEFAULT_PORT)
+    return parser
+
+
+def command_args(options) -> dict:
+    args = {}
+    if getattr(options, "file", None):
+        args["file"] = options.file
+    if getattr(options, "safety", None) is not None:
+        args["safety"] = options.safety
+    if getattr(options, "files", None):
+        args["files"] = options.files
+    if getattr(options, "paths", None):
+        args["paths"] = options.paths
+    if getattr(options, "path", None):
+        args["path"] = options.path
+    if getattr(options, "dry_run", False):
+        args["dry_run"] = True
+    if getattr(options, "stale", False):
+        args["stale"] = True
+    return args
+
+
+def print_result(options, result) -> int:
+    if options.command == "list":
+        if options.json:
+            print(json.dumps(result, indent=4))
+            return 0
+        for row in result:
+            created = datetime.fromtimestamp(row["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            size = sizeof_fmt(row["size"]) if row["size"] is not None else "?"
+            pinned = "  pinned" if row.get("pinned") else ""
+            print(f"{row['filename']:<40} {created}  {size:>10}{pinned}")
+    elif options.command == "verify":
+        for filename, (ok, message) in result.items():
+            print(f"{filename}: {message}")
+        return 0 if all(ok for ok, _ in result.values()) else 1
+    elif options.command == "changes":
+        if result is None:
+            print("No source listing stored for that backup.")
+            return 1
+        for kind, mark in (("added", "+"), ("removed", "-"), ("changed", "*")):
+            for path in result[kind]:
+                print(f"{mark} {path}")
+    elif options.command == "browse":
+        for name, is_dir, size in result:
+            print(f"{sizeof_fmt(size or 0):>10}  {name}{'/' if is_dir else ''}")
+    elif options.command == "prune":
+        for filename in result:
+            print(filename)
+    elif options.command == "backup":
+        if result is None:
+            return 1
+        print(result)
+    elif options.command in ("restore", "restore-latest"):
+        # False: the backup wasn't found or the safety backup failed
+        return 0 if result else 1
+    return 0
+
+
+def main(argv=None) -> int:
+    options = build_parser().parse_args(argv)
+    args = command_args(options)
+
+    if options.connect is not None:
+        if options.command == "daemon":
+            print("Can't start a daemon with --connect", file=sys.stderr)
+            return 2
+        try:
+            token = read_token(token_path(options.settings))
+        except OSError as e:
+            print(f"Can't read the daemon token (is it running?): {e}", file=sys.stderr)
+            return 2
+        try:
+            response = send_command(options.command, args, token, port=options.connect)
+        except OSError as e:
+            print(f"Can't reach daemon on port {options.connect}: {e}", file=sys.stderr)
+            return 2
+        sys.stdout.write("".join(response["log"]))
+        if not response["ok"]:
+            return 1
+        return print_result(options, response["result"])
+
+    loaded = load_settings(options.settings)
+    profile = options.profile or loaded["PROFILE"]
+    if profile not in loaded["PROFILES"]:
+        print(f"Unknown profile {profile}, have: {', '.join(loaded['PROFILES'])}", file=sys.stderr)
+        return 2
+    settings = profile_settings(loaded, profile)
+    if options.trace is not None:
+        settings["TRACE"] = options.trace
+    # log lines go to stderr so `list --json` output stays machine readable
+    logger = LogPipeline(stream=sys.stderr)
+    logger.set_level(DEBUG if options.debug else settings["LOG_LEVEL"])
+    try:
+        logger.set_logfile(settings["LOG_FILE"])
+    except Exception as e:
+        logger.log(f"Can't open log file {settings['LOG_FILE']}: {e}", ERROR)
+    engine = BackupEngine(settings, logger)
+
+    if options.command == "daemon":
+        EngineDaemon(
+            engine, COMMANDS, token_path(options.settings), port=options.port
+        ).serve_forever()
+        return 0
+    try:
+        result = COMMANDS[options.command](engine, args)
+    except Exception as e:
+        logger.log(f"Error running {options.command}: {e}", ERROR)
+        return 1
+    return print_result(options, result)
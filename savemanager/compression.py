@@ -0,0 +1,556 @@
+"""
+Compression backends for create_backup / restore_backup.
+
+A backend is picked from the backup filename (.7z, .zip, .tar.zst) and
+configured with a codec and level, usually taken from a preset:
+
+    "COMPRESSION": {"preset": "balanced"}
+
+Any key of a preset (backend, codec, level, threads) can be overridden in the
+same dict, e.g. {"preset": "smallest", "level": 7}.
+
+7z archives with lzma2 or store are written and extracted by the 7-Zip
+program when it is installed (multithreaded, with progress), py7zr does it
+otherwise or when that fails. "native" is "auto" (look for 7zz/7z/7za, see
+eakse.quickzip), "off" or the path of the binary. Both write plain 7z
+archives with the same members (every folder, empty ones too, and every
+file with its mtime), so either reads what the other wrote. The streaming
+writers of all backends add the same folder entries.
+
+py7zr and zstd are imported on first use, importing this module is cheap.
+"""
+import functools
+import importlib.util
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from eakse.quickzip import SevenZip, SevenZipError, find_7zip
+from savemanager.restore import ArchiveEntry
+
+PRESETS = {
+    # multi-threaded zstd, falls back to 7z+zstd when no zstd module is around
+    "fastest": {"backend": "tar.zst", "codec": "zstd", "level": 1, "threads": 0},
+    "balanced": {"backend": "7z", "codec": "lzma2", "level": 5, "threads": 0},
+    "smallest": {"backend": "7z", "codec": "lzma2", "level": 9, "threads": 0},
+    # for saves that are already compressed
+    "store": {"backend": "7z", "codec": "store", "level": 0, "threads": 0},
+}
+DEFAULT_PRESET = "balanced"
+# "auto", "off" or the path of a 7-Zip binary
+DEFAULT_NATIVE = "auto"
+# codecs the 7-Zip program writes the way py7zr reads them
+NATIVE_METHODS = {"lzma2": "LZMA2", "store": "Copy"}
+ARCHIVE_EXTS = (".7z", ".zip", ".tar.zst")
+COPY_BUFSIZE = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def load_zstd():
+    """The zstd module, None if there is none."""
+    try:
+        from compression import zstd  # python 3.14+
+    except ImportError:
+        try:
+            from backports import zstd  # installed alongside py7zr
+        except ImportError:
+            return None
+    return zstd
+
+
+def resolve_options(setting) -> dict:
+    """Turn the COMPRESSION setting (preset name or dict) into full options."""
+    if isinstance(setting, str):
+        setting = {"preset": setting}
+    setting = dict(setting or {})
+    preset = PRESETS.get(setting.pop("preset", DEFAULT_PRESET), PRESETS[DEFAULT_PRESET])
+    options = {"native": DEFAULT_NATIVE, **preset, **setting}
+    if options["backend"] == "tar.zst" and load_zstd() is None:
+        options["backend"] = "7z"
+    if options["threads"] <= 0:
+        options["threads"] = os.cpu_count() or 1
+    return options
+
+
+def backend_ext(options: dict, ext_7z: str = ".7z") -> str:
+    return {"7z": ext_7z, "zip": ".zip", "tar.zst": ".tar.zst"}[options["backend"]]
+
+
+def get_backend(filename: str, options: dict):
+    """Return the backend that reads/writes `filename`, configured by options."""
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        return ZipBackend(options)
+    if lower.endswith(".tar.zst"):
+        return TarZstdBackend(options)
+    return SevenZipBackend(options)
+
+
+class Backend:
+    name = ""
+    codecs = ()
+    # has a header with sizes/CRCs, so differential restore is possible
+    supports_diff = False
+    # a SevenZip that writes and extracts whole trees, None for py7zr/zipfile/tarfile
+    native = None
+
+    def __init__(self, options: dict):
+        self.codec = options.get("codec", self.codecs[0])
+        if self.codec not in self.codecs:
+            self.codec = self.codecs[0]
+        self.level = options.get("level")
+        self.threads = options.get("threads") or os.cpu_count() or 1
+        # set by the engine for native runs: progress(percent), check() and warn(text)
+        self.progress = None
+        self.check = None
+        self.warn = None
+
+    def describe(self) -> str:
+        return f"{self.name} {self.codec} level {self.level}"
+
+    def writer(self, filename: str):
+        raise NotImplementedError
+
+    def extractall(self, filename: str, path: str):
+        raise NotImplementedError
+
+    def entries(self, filename: str) -> dict:
+        """Map normalized member name -> ArchiveEntry for all files."""
+        raise NotImplementedError
+
+    def dirs(self, filename: str) -> list:
+        return []
+
+    def listing(self, filename: str):
+        """(entries(), dirs()) for browsing, backends may read the header once."""
+        return self.entries(filename), self.dirs(filename)
+
+    def extract(self, filename: str, path: str, targets: list):
+        raise NotImplementedError
+
+    def test(self, filename):
+        """
+        Check all CRCs, return the first bad member name or None. filename
+        may also be an open binary file (e.g. a throttled reader).
+        """
+        raise NotImplementedError
+
+
+class SevenZipBackend(Backend):
+    name = "7z"
+    # no brotli: py7zr can't read its own brotli archives with brotli>=1.2
+    codecs = ("lzma2", "zstd", "store")
+    supports_diff = True
+
+    def __init__(self, options: dict):
+        super().__init__(options)
+        # the zstd 7z filter needs an optional module
+        if self.codec == "zstd" and not any(
+            _have_module(name) for name in ("compression.zstd", "backports.zstd", "pyzstd")
+        ):
+            self.codec = "lzma2"
+        setting = options.get("native", DEFAULT_NATIVE)
+        if self.codec in NATIVE_METHODS and setting != "off":
+            binary = find_7zip(None if setting == "auto" else setting)
+            if binary is not None:
+                self.native = SevenZip(binary)
+
+    def describe(self) -> str:
+        program = self.native.name if self.native is not None else "py7zr"
+        return f"{super().describe()} ({program})"
+
+    def filters(self) -> list:
+        import py7zr
+
+        level = self.level
+        if self.codec == "store":
+            return [{"id": py7zr.FILTER_COPY}]
+        if self.codec == "zstd":
+            return [{"id": py7zr.FILTER_ZSTD, "level": 3 if level is None else level}]
+        preset = 7 if level is None else min(int(level), 9)
+        if preset >= 9:
+            preset |= lzma.PRESET_EXTREME
+        return [{"id": py7zr.FILTER_LZMA2, "preset": preset}]
+
+    def writer(self, filename: str):
+        return SevenZipWriter(filename, self.filters())
+
+    def write_tree(self, filename: str, root: str):
+        """Archive folder root as a whole (members start with its name) with 7-Zip."""
+        level = 7 if self.level is None else max(0, min(int(self.level), 9))
+        if self.codec == "store":
+            level = 0
+        self.run_native(
+            [
+                "a",
+                "-t7z",
+                f"-m0={NATIVE_METHODS[self.codec]}",
+                f"-mx={level}",
+                f"-mmt={self.threads}",
+                "-y",
+                os.path.abspath(filename),
+                os.path.basename(root),
+            ],
+            cwd=os.path.dirname(os.path.abspath(root)),
+        )
+
+    def run_native(self, args: list, cwd=None):
+        self.native.run(args, cwd=cwd, progress=self.progress, check=self.check)
+
+    def extract_native(self, filename: str, path: str, targets=None) -> bool:
+        """Extract with 7-Zip, False if it failed and py7zr has to do it."""
+        if self.native is None:
+            return False
+        args = ["x", os.path.abspath(filename), f"-o{path}", "-y", "-aoa", f"-mmt={self.threads}"]
+        listfile = None
+        try:
+            if targets is not None:
+                # no wildcards, names as stored, any number of them
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", suffix=".txt", delete=False
+                ) as outfile:
+                    outfile.write("\n".join(targets))
+                listfile = outfile.name
+                args += ["-spd", "-scsUTF-8", f"@{listfile}"]
+            self.run_native(args)
+        except (SevenZipError, OSError) as e:
+            # e.g. a codec this 7-Zip doesn't know
+            if self.warn is not None:
+                self.warn(f"7-Zip failed, extracting with py7zr: {e}")
+            self.native = None
+            return False
+        finally:
+            if listfile is not None:
+                os.remove(listfile)
+        return True
+
+    def extractall(self, filename: str, path: str):
+        if self.extract_native(filename, path):
+            return
+        import py7zr
+
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            archive.extractall(path=path)
+
+    def entries(self, filename: str) -> dict:
+        import py7zr
+
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            return {
+                info.filename.replace("\\", "/"): ArchiveEntry(
+                    info.filename, info.uncompressed, info.crc32
+                )
+                for info in archive.list()
+                if not info.is_directory
+            }
+
+    def dirs(self, filename: str) -> list:
+        import py7zr
+
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            return [
+                info.filename.replace("\\", "/")
+                for info in archive.list()
+                if info.is_directory
+            ]
+
+    def listing(self, filename: str):
+        import py7zr
+
+        entries = {}
+        dirs = []
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            for info in archive.list():
+                name = info.filename.replace("\\", "/")
+                if info.is_directory:
+                    dirs.append(name)
+                else:
+                    entries[name] = ArchiveEntry(info.filename, info.uncompressed, info.crc32)
+        return entries, dirs
+
+    def extract(self, filename: str, path: str, targets: list):
+        if self.extract_native(filename, path, targets):
+            return
+        import py7zr
+
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            if self.threads < 2 or archive.archiveinfo().blocks < 2:
+                archive.extract(path=path, targets=targets)
+                return
+            # non-solid: every block decompresses on its own, one reader per thread
+            wanted = set(targets)
+            blocks = {}
+            for info in archive.files:
+                if info.filename in wanted:
+                    blocks.setdefault(id(info.folder), []).append(info.filename)
+
+        _make_parents(path, targets)
+
+        def run(groups):
+            with py7zr.SevenZipFile(filename, "r") as archive:
+                archive.extract(path=path, targets=[name for group in groups for name in group])
+
+        _run_parallel(run, _split(list(blocks.values()), self.threads))
+
+    def test(self, filename):
+        import py7zr
+
+        with py7zr.SevenZipFile(filename, "r") as archive:
+            return archive.testzip()
+
+
+class SevenZipWriter:
+    def __init__(self, filename: str, filters: list):
+        import py7zr
+
+        self.archive = py7zr.SevenZipFile(filename, "w", filters=filters)
+
+    def add(self, fileobj, arcname: str, mtime=None):
+        self.archive.writef(fileobj, arcname)
+        self.stamp(mtime)
+
+    def add_dir(self, path: str, arcname: str, mtime=None):
+        self.archive.write(path, arcname)
+        self.stamp(mtime)
+
+    def stamp(self, mtime):
+        """Set the mtime of the member added last, the header is written on close."""
+        if mtime is None:
+            return
+        from py7zr.helpers import ArchiveTimestamp
+
+        # writef stamps the member with the current time
+        self.archive.header.files_info.files[-1]["lastwritetime"] = (
+            ArchiveTimestamp.from_datetime(mtime)
+        )
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ZipBackend(Backend):
+    name = "zip"
+    codecs = ("deflate", "lzma", "bzip2", "store")
+    methods = {
+        "deflate": zipfile.ZIP_DEFLATED,
+        "lzma": zipfile.ZIP_LZMA,
+        "bzip2": zipfile.ZIP_BZIP2,
+        "store": zipfile.ZIP_STORED,
+    }
+    supports_diff = True
+
+    def writer(self, filename: str):
+        level = self.level
+        if self.codec in ("deflate", "bzip2") and level is not None:
+            level = max(1 if self.codec == "bzip2" else 0, min(int(level), 9))
+        else:
+            level = None
+        return ZipWriter(filename, self.methods[self.codec], level)
+
+    def extractall(self, filename: str, path: str):
+        with zipfile.ZipFile(filename, "r") as archive:
+            for info in archive.infolist():
+                _extract_zip(archive, info, path)
+
+    def entries(self, filename: str) -> dict:
+        with zipfile.ZipFile(filename, "r") as archive:
+            return {
+                info.filename: ArchiveEntry(info.filename, info.file_size, info.CRC)
+                for info in archive.infolist()
+                if not info.is_dir()
+            }
+
+    def dirs(self, filename: str) -> list:
+        with zipfile.ZipFile(filename, "r") as archive:
+            return [info.filename.rstrip("/") for info in archive.infolist() if info.is_dir()]
+
+    def extract(self, filename: str, path: str, targets: list):
+        # members are compressed one by one, one reader per thread
+        def run(names):
+            with zipfile.ZipFile(filename, "r") as archive:
+                for name in names:
+                    _extract_zip(archive, archive.getinfo(name), path)
+
+        groups = _split(targets, self.threads)
+        if len(groups) > 1:
+            _make_parents(path, targets)
+        _run_parallel(run, groups)
+
+    def test(self, filename):
+        with zipfile.ZipFile(filename, "r") as archive:
+            return archive.testzip()
+
+
+class ZipWriter:
+    def __init__(self, filename: str, method: int, level):
+        self.archive = zipfile.ZipFile(
+            filename, "w", compression=method, compresslevel=level, allowZip64=True
+        )
+
+    def add(self, fileobj, arcname: str, mtime=None):
+        info = zipfile.ZipInfo(arcname.replace(os.sep, "/"), _zip_date_time(mtime))
+        info.compress_type = self.archive.compression
+        info._compresslevel = self.archive.compresslevel
+        info.external_attr = 0o644 << 16
+        with self.archive.open(info, "w", force_zip64=True) as outfile:
+            shutil.copyfileobj(fileobj, outfile, COPY_BUFSIZE)
+
+    def add_dir(self, path: str, arcname: str, mtime=None):
+        info = zipfile.ZipInfo(arcname.replace(os.sep, "/") + "/", _zip_date_time(mtime))
+        # MS-DOS directory flag, unix mode in the high bits
+        info.external_attr = (0o40755 << 16) | 0x10
+        self.archive.writestr(info, b"")
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class TarZstdBackend(Backend):
+    name = "tar.zst"
+    codecs = ("zstd",)
+
+    def writer(self, filename: str):
+        level = 3 if self.level is None else self.level
+        return TarZstdWriter(filename, level, self.threads)
+
+    def extractall(self, filename: str, path: str):
+        with load_zstd().ZstdFile(filename, "rb") as infile:
+            with tarfile.open(fileobj=infile, mode="r|") as archive:
+                archive.extractall(path=path, filter="data")
+
+    # no index: listing and targeted extraction have to read the whole stream
+    def entries(self, filename: str) -> dict:
+        with load_zstd().ZstdFile(filename, "rb") as infile:
+            with tarfile.open(fileobj=infile, mode="r|") as archive:
+                return {
+                    member.name: ArchiveEntry(member.name, member.size, None)
+                    for member in archive
+                    if member.isfile()
+                }
+
+    def dirs(self, filename: str) -> list:
+        with load_zstd().ZstdFile(filename, "rb") as infile:
+            with tarfile.open(fileobj=infile, mode="r|") as archive:
+                return [member.name for member in archive if member.isdir()]
+
+    def extract(self, filename: str, path: str, targets: list):
+        wanted = set(targets)
+        with load_zstd().ZstdFile(filename, "rb") as infile:
+            with tarfile.open(fileobj=infile, mode="r|") as archive:
+                for member in archive:
+                    if member.name in wanted:
+                        archive.extract(member, path=path, filter="data")
+
+    def test(self, filename):
+        # no per-member CRC, but zstd frames carry checksums
+        with load_zstd().ZstdFile(filename, "rb") as infile:
+            with tarfile.open(fileobj=infile, mode="r|") as archive:
+                for member in archive:
+                    if member.isfile():
+                        data = archive.extractfile(member)
+                        while data.read(COPY_BUFSIZE):
+                            pass
+        return None
+
+
+class TarZstdWriter:
+    def __init__(self, filename: str, level: int, threads: int):
+        param = load_zstd().CompressionParameter
+        options = {param.compression_level: level}
+        if threads > 1:
+            # zstd compresses on its own worker threads, outside the GIL
+            options[param.nb_workers] = threads
+        self.outfile = load_zstd().ZstdFile(filename, "wb", options=options)
+        self.archive = tarfile.open(fileobj=self.outfile, mode="w|")
+
+    def add(self, fileobj, arcname: str, mtime=None):
+        info = tarfile.TarInfo(arcname.replace(os.sep, "/"))
+        if hasattr(fileobj, "getbuffer"):
+            info.size = fileobj.getbuffer().nbytes
+        else:
+            info.size = os.fstat(fileobj.fileno()).st_size
+        info.mtime = mtime or time.time()
+        info.mode = 0o644
+        self.archive.addfile(info, fileobj)
+
+    def add_dir(self, path: str, arcname: str, mtime=None):
+        info = tarfile.TarInfo(arcname.replace(os.sep, "/"))
+        info.type = tarfile.DIRTYPE
+        info.mtime = mtime or time.time()
+        info.mode = 0o755
+        self.archive.addfile(info)
+
+    def close(self):
+        self.archive.close()
+        self.outfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _zip_date_time(mtime) -> tuple:
+    date_time = time.localtime(mtime or time.time())[:6]
+    # zip can't store dates before 1980
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    return date_time
+
+
+def _extract_zip(archive, info, path: str):
+    """ZipFile.extract that also sets the member's mtime (zipfile leaves the current time)."""
+    target = archive.extract(info, path=path)
+    if not info.is_dir():
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(target, (mtime, mtime))
+
+
+def _split(items: list, parts: int) -> list:
+    """items dealt round-robin into at most parts non-empty lists."""
+    return [group for group in (items[i::parts] for i in range(max(1, parts))) if group]
+
+
+def _make_parents(path: str, names: list):
+    # up front, so parallel extractors don't race creating them
+    for parent in {os.path.dirname(name.replace("\\", "/")) for name in names}:
+        if parent:
+            os.makedirs(os.path.join(path, *parent.split("/")), exist_ok=True)
+
+
+def _run_parallel(func, groups: list):
+    if len(groups) <= 1:
+        for group in groups:
+            func(group)
+        return
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        for future in [pool.submit(func, group) for group in groups]:
+            future.result()
+
+
+def _have_module(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
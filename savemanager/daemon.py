@@ -0,0 +1,183 @@
+"""
+Long-running backup daemon.
+
+Keeps one BackupEngine (and with it the catalog connection and the size
+cache) alive and accepts commands from `python -m savemanager --connect`.
+The protocol is one JSON object per line over a localhost TCP socket:
+
+    request:  {"command": "backup", "args": {...}, "token": "..."}
+    response: {"ok": true, "result": ..., "log": ["line", ...]}
+
+The port is open to every local user, so each request must carry the token
+the daemon writes on start to a file only its owner can read (TOKEN_NAME
+next to the settings file). Requests without it are rejected.
+
+Commands run one at a time, in arrival order. With SCRUB interval_hours set
+the daemon also re-verifies stale backups on that interval, and it compresses
+safety snapshots once they are SAFETY compress_after_min old.
+"""
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+
+from savemanager.engine import BackupEngine
+from savemanager.logpipe import ERROR, LogPipeline
+from savemanager.scrub import resolve_scrub
+
+
+# how often to look for a safety snapshot that is due
+SAFETY_POLL = 60.0
+
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 47613
+TOKEN_NAME = "savemanager_daemon.token"
+
+
+def token_path(settings_filename: str) -> str:
+    """Where the daemon using settings_filename keeps its token."""
+    return os.path.join(os.path.dirname(os.path.abspath(settings_filename)), TOKEN_NAME)
+
+
+def write_token(path: str) -> str:
+    """Write a new random token readable by the owner only and return it."""
+    token = secrets.token_hex(32)
+    if os.path.exists(path):
+        os.remove(path)
+    # created 0600, never world readable in between
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as outfile:
+        outfile.write(token)
+    return token
+
+
+def read_token(path: str) -> str:
+    with open(path) as infile:
+        return infile.read().strip()
+
+
+def send_command(
+    command: str, args: dict, token: str, port: int = DEFAULT_PORT, host: str = HOST
+) -> dict:
+    """Client side: run one command on a running daemon and return the response."""
+    request = {"command": command, "args": args, "token": token}
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+class EngineDaemon:
+    def __init__(
+        self, engine: BackupEngine, commands: dict, token_file: str, port: int = DEFAULT_PORT
+    ):
+        """
+        commands maps a command name to func(engine, args) -> json-able
+        result, token_file is (re)written with the token clients must send.
+        """
+        self.engine = engine
+        self.commands = commands
+        self.token_file = token_file
+        self.token = None
+        self.port = port
+        self.lock = threading.Lock()
+        self.server = None
+        self.stopped = threading.Event()
+
+    def authorized(self, request: dict) -> bool:
+        token = request.get("token")
+        return (
+            self.token is not None
+            and isinstance(token, str)
+            and hmac.compare_digest(token.encode(), self.token.encode())
+        )
+
+    def handle(self, request: dict) -> dict:
+        command = request.get("command")
+        func = self.commands.get(command)
+        if func is None:
+            return {"ok": False, "result": f"unknown command: {command}", "log": []}
+        with self.lock:
+            # capture this command's log lines for the client, echo them locally
+            logger = self.engine.logger
+            capture = LogPipeline(level=logger.level, stream=None)
+            self.engine.logger = capture
+            try:
+                result = func(self.engine, request.get("args") or {})
+                ok = True
+            except Exception as e:
+                capture.log(f"Error running {command}: {e}", ERROR)
+                result = str(e)
+                ok = False
+            finally:
+                self.engine.logger = logger
+            lines = capture.lines()
+            if logger.stream is not None:
+                logger.stream.write("".join(lines))
+        return {"ok": ok, "result": result, "log": lines}
+
+    def scrub_loop(self, interval: float):
+        while not self.stopped.wait(interval):
+            self.handle({"command": "verify", "args": {"stale": True}})
+
+    def safety_loop(self):
+        while not self.stopped.wait(SAFETY_POLL):
+            if self.engine.safety_due():
+                self.handle({"command": "compress-safety", "args": {"force": False}})
+
+    def serve_forever(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                        if not isinstance(request, dict):
+                            raise ValueError("not an object")
+                    except ValueError as e:
+                        response = {"ok": False, "result": f"bad request: {e}", "log": []}
+                    else:
+                        if daemon.authorized(request):
+                            response = daemon.handle(request)
+                        else:
+                            response = {"ok": False, "result": "invalid token", "log": []}
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer((HOST, self.port), Handler) as server:
+            self.server = server
+            self.token = write_token(self.token_file)
+            server.daemon_threads = True
+            self.engine.log(f"Save manager daemon listening on {HOST}:{self.port}")
+            hours = resolve_scrub(self.engine.settings["SCRUB"])["interval_hours"]
+            if hours:
+                threading.Thread(
+                    target=self.scrub_loop, args=(hours * 3600,), name="savemanager-scrub", daemon=True
+                ).start()
+            threading.Thread(
+                target=self.safety_loop, name="savemanager-safety", daemon=True
+            ).start()
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                self.engine.log("Daemon stopped.")
+            finally:
+                self.stopped.set()
+                try:
+                    os.remove(self.token_file)
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
@@ -0,0 +1,366 @@
+"""
+Binary delta backups for big, slightly changed files.
+
+With DELTA min_size_mb set, archive backups cut files of at least that size
+into fixed blocks and hash them. The hashes are kept in the catalog, and when
+the previous backup has them for the same file only the blocks that aren't in
+the previous version are stored, as DELTA_DIR/NNNNNN.bin, next to a list of
+ops in DELTA_DIR/index.json:
+
+    ["c", block, count]    copy count blocks of the previous version
+    ["l", offset, length]  copy length bytes of the .bin member
+
+Every keyframe_every-th version, and whenever more than max_changed of the
+file is new, the full file is stored again, so restore chains stay short.
+Restoring composes the ops of the whole chain into byte ranges of the
+keyframe and the .bin members and writes the file in one pass: intermediate
+versions are never built.
+"""
+import bisect
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+
+from savemanager.restore import ArchiveEntry
+
+
+DELTA_DIR = ".savemanager-delta"
+INDEX_NAME = f"{DELTA_DIR}/index.json"
+INDEX_VERSION = 1
+HASH_SIZE = 16
+COPY_BUFSIZE = 1024 * 1024
+MB = 1024 * 1024
+
+DEFAULT_DELTA = {
+    # files at least this big are stored as deltas, 0 is off
+    "min_size_mb": 0,
+    # full copy of a file after this many versions
+    "keyframe_every": 8,
+    "block_kb": 64,
+    # store the full file when a bigger fraction than this changed
+    "max_changed": 0.5,
+}
+
+
+def resolve_delta(setting) -> dict:
+    return {**DEFAULT_DELTA, **(setting or {})}
+
+
+def is_delta_member(name: str) -> bool:
+    return name.replace("\\", "/").split("/")[0] == DELTA_DIR
+
+
+def block_hash(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+
+def block_hashes(fileobj, block_size: int) -> bytes:
+    """Concatenated hashes of all blocks of fileobj."""
+    hashes = bytearray()
+    while True:
+        data = fileobj.read(block_size)
+        if not data:
+            return bytes(hashes)
+        hashes += block_hash(data)
+
+
+def encode(fileobj, base_hashes: bytes, block_size: int, literal) -> dict:
+    """
+    Write the blocks of fileobj that aren't in base_hashes to literal.
+    Returns {"ops", "hashes", "size", "crc32", "literal"}.
+    """
+    index = {}
+    for block in range(len(base_hashes) // HASH_SIZE):
+        index.setdefault(base_hashes[block * HASH_SIZE : (block + 1) * HASH_SIZE], block)
+    ops = []
+    hashes = bytearray()
+    crc = 0
+    size = 0
+    written = 0
+    while True:
+        data = fileobj.read(block_size)
+        if not data:
+            break
+        digest = block_hash(data)
+        hashes += digest
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        block = index.get(digest)
+        last = ops[-1] if ops else None
+        if block is not None:
+            if last is not None and last[0] == "c" and last[1] + last[2] == block:
+                last[2] += 1
+            else:
+                ops.append(["c", block, 1])
+        else:
+            literal.write(data)
+            if last is not None and last[0] == "l" and last[1] + last[2] == written:
+                last[2] += len(data)
+            else:
+                ops.append(["l", written, len(data)])
+            written += len(data)
+    return {"ops": ops, "hashes": bytes(hashes), "size": size, "crc32": crc, "literal": written}
+
+
+def compose(keyframe_size: int, versions: list) -> list:
+    """
+    Byte ranges of the newest version as (source, offset, length): source 0
+    is the keyframe, source i the .bin member of versions[i - 1], which are
+    (ops, block_size) oldest first.
+    """
+    segments = [(0, 0, keyframe_size)] if keyframe_size else []
+    for source, (ops, block_size) in enumerate(versions, 1):
+        starts = []
+        total = 0
+        for segment in segments:
+            starts.append(total)
+            total += segment[2]
+        result = []
+        for kind, offset, length in ops:
+            if kind == "l":
+                _append(result, (source, offset, length))
+                continue
+            start = offset * block_size
+            end = min(start + length * block_size, total)
+            i = bisect.bisect_right(starts, start) - 1
+            while start < end:
+                seg_source, seg_offset, seg_length = segments[i]
+                skip = start - starts[i]
+                take = min(seg_length - skip, end - start)
+                _append(result, (seg_source, seg_offset + skip, take))
+                start += take
+                i += 1
+        segments = result
+    return segments
+
+
+def _append(segments: list, segment: tuple):
+    if segments:
+        source, offset, length = segments[-1]
+        if source == segment[0] and offset + length == segment[1]:
+            segments[-1] = (source, offset, length + segment[2])
+            return
+    segments.append(segment)
+
+
+def write_segments(segments: list, sources: list, target: str, check=None) -> int:
+    """Write segments (see compose) read from the source paths to target, return its crc32."""
+    files = {}
+    crc = 0
+    try:
+        with open(target, "wb") as outfile:
+            for source, offset, length in segments:
+                if check is not None:
+                    check()
+                infile = files.get(source)
+                if infile is None:
+                    infile = files[source] = open(sources[source], "rb")
+                infile.seek(offset)
+                while length:
+                    data = infile.read(min(length, COPY_BUFSIZE))
+                    if not data:
+                        raise ValueError(f"Delta source {sources[source]} is truncated")
+                    outfile.write(data)
+                    crc = zlib.crc32(data, crc)
+                    length -= len(data)
+    finally:
+        for infile in files.values():
+            infile.close()
+    return crc
+
+
+class DeltaEncoder:
+    """Writes big files to an archive as deltas against the previous backup."""
+
+    def __init__(self, options: dict, base: str, signatures: dict):
+        """
+        base is the previous backup's filename and signatures maps its archive
+        names to (chain, block_size, hashes, refs) as stored in the catalog.
+        """
+        self.min_size = options["min_size_mb"] * MB
+        self.keyframe_every = max(1, int(options["keyframe_every"]))
+        self.block_size = int(options["block_kb"] * 1024)
+        self.max_changed = options["max_changed"]
+        self.base = base
+        self.base_signatures = signatures
+        self.reset()
+
+    def reset(self):
+        """Start over, for a retried archive."""
+        self.files = {}
+        self.signatures = {}
+        self.saved = 0
+
+    def wants(self, size: int) -> bool:
+        return size >= self.min_size
+
+    def refs(self) -> list:
+        """Backups the deltas written so far need, nearest first."""
+        refs = []
+        for name in self.files:
+            for filename in self.signatures[name][3]:
+                if filename not in refs:
+                    refs.append(filename)
+        return refs
+
+    def add(self, archive, fileobj, arcname: str, mtime=None) -> bool:
+        """Add fileobj as a delta if that pays off, else in full. True for a delta."""
+        name = arcname.replace(os.sep, "/")
+        base = self.base_signatures.get(name)
+        if (
+            base is not None
+            and base[0] + 1 < self.keyframe_every
+            and base[1] == self.block_size
+        ):
+            with tempfile.TemporaryFile() as literal:
+                result = encode(fileobj, base[2], self.block_size, literal)
+                if result["literal"] <= self.max_changed * result["size"]:
+                    member = f"{DELTA_DIR}/{len(self.files) + 1:06}.bin"
+                    literal.seek(0)
+                    archive.add(literal, member, mtime)
+                    self.files[name] = {
+                        "base": self.base,
+                        "member": member,
+                        "size": result["size"],
+                        "crc32": result["crc32"],
+                        "mtime": mtime,
+                        "block_size": self.block_size,
+                        "ops": result["ops"],
+                    }
+                    self.signatures[name] = (
+                        base[0] + 1,
+                        self.block_size,
+                        result["hashes"],
+                        [self.base, *base[3]],
+                    )
+                    self.saved += result["size"] - result["literal"]
+                    return True
+            fileobj.seek(0)
+        archive.add(fileobj, arcname, mtime)
+        fileobj.seek(0)
+        self.signatures[name] = (0, self.block_size, block_hashes(fileobj, self.block_size), [])
+        return False
+
+    def finish(self, archive):
+        """Add the index, call before the archive is closed."""
+        if not self.files:
+            return
+        index = {"version": INDEX_VERSION, "files": self.files}
+        archive.add(io.BytesIO(json.dumps(index).encode("utf-8")), INDEX_NAME, time.time())
+
+
+class DeltaChains:
+    """
+    Reads delta indexes and rebuilds delta files of one or more backups.
+    Extracted members go to a temporary folder in workdir, removed on close().
+    """
+
+    def __init__(self, backend_for, workdir=None):
+        """backend_for(path) returns the compression backend for a backup."""
+        self.backend_for = backend_for
+        self.workdir = workdir
+        self.tmp_directory = None
+        self._entries = {}
+        self._indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if self.tmp_directory is not None:
+            shutil.rmtree(self.tmp_directory, ignore_errors=True)
+            self.tmp_directory = None
+
+    def scratch(self, label: str) -> str:
+        if self.tmp_directory is None:
+            self.tmp_directory = tempfile.mkdtemp(prefix=".eakse_delta_", dir=self.workdir)
+        path = os.path.join(self.tmp_directory, label)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def entries(self, filename: str) -> dict:
+        key = os.path.abspath(filename)
+        if key not in self._entries:
+            if not os.path.exists(filename):
+                raise FileNotFoundError(f"Delta base {os.path.basename(filename)} is missing")
+            self._entries[key] = self.backend_for(filename).entries(filename)
+        return self._entries[key]
+
+    def index(self, filename: str) -> dict:
+        """Delta files of backup filename, archive name -> index item."""
+        key = os.path.abspath(filename)
+        if key not in self._indexes:
+            entries = self.entries(filename)
+            files = {}
+            if INDEX_NAME in entries:
+                path = self.scratch(f"index{len(self._indexes)}")
+                self.backend_for(filename).extract(filename, path, [entries[INDEX_NAME].name])
+                with open(os.path.join(path, *INDEX_NAME.split("/"))) as infile:
+                    files = json.load(infile)["files"]
+            self._indexes[key] = files
+        return self._indexes[key]
+
+    def apply(self, filename: str, entries: dict) -> dict:
+        """entries of filename with delta members replaced by the files they rebuild."""
+        self._entries.setdefault(os.path.abspath(filename), entries)
+        result = {name: entry for name, entry in entries.items() if not is_delta_member(name)}
+        if INDEX_NAME in entries:
+            for name, item in self.index(filename).items():
+                result[name] = ArchiveEntry(name, item["size"], item["crc32"])
+        return result
+
+    def chain(self, filename: str, name: str):
+        """(keyframe archive, [(archive, index item), ...] oldest first) of name."""
+        deltas = []
+        archive = filename
+        while True:
+            item = self.index(archive).get(name)
+            if item is None:
+                break
+            deltas.append((archive, item))
+            if len(deltas) > 10000:
+                raise ValueError(f"Delta chain of {name} doesn't end")
+            archive = os.path.join(os.path.dirname(filename), item["base"])
+        if name not in self.entries(archive):
+            raise ValueError(f"{name} is missing in delta base {os.path.basename(archive)}")
+        deltas.reverse()
+        return archive, deltas
+
+    def rebuild(self, filename: str, names: list, parent: str, check=None):
+        """Write the delta files names (archive names) of backup filename below parent."""
+        chains = {name: self.chain(filename, name) for name in names}
+        # every archive is opened once, for all members needed from it
+        needed = {}
+        for name, (keyframe, deltas) in chains.items():
+            needed.setdefault(keyframe, set()).add(self.entries(keyframe)[name].name)
+            for archive, item in deltas:
+                needed.setdefault(archive, set()).add(self.entries(archive)[item["member"]].name)
+        folders = {}
+        for archive, members in needed.items():
+            if check is not None:
+                check()
+            folders[archive] = self.scratch(f"members{len(folders)}")
+            self.backend_for(archive).extract(archive, folders[archive], sorted(members))
+        for name, (keyframe, deltas) in chains.items():
+            sources = [os.path.join(folders[keyframe], *name.split("/"))]
+            versions = []
+            for archive, item in deltas:
+                sources.append(os.path.join(folders[archive], *item["member"].split("/")))
+                versions.append((item["ops"], item["block_size"]))
+            segments = compose(os.path.getsize(sources[0]), versions)
+            target = os.path.join(parent, *name.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            item = deltas[-1][1]
+            if write_segments(segments, sources, target, check) != item["crc32"]:
+                raise ValueError(f"CRC mismatch rebuilding {name} from its delta chain")
+            if item["mtime"]:
+                os.utime(target, (item["mtime"], item["mtime"]))
@@ -0,0 +1,939 @@
+"""
+GUI-free backup engine.
+
+Everything that creates, lists, restores, verifies or deletes backups lives
+here, so the Tk GUI, the command line and the daemon all share one
+implementation (and, in the daemon, one set of warm caches).
+"""
+import contextlib
+import json
+import os
+import time
+
+from eakse.quickcopy import copy_file
+from savemanager.browse import ArchiveListing, ListingCache
+from savemanager.catalog import Catalog, file_checksum
+from savemanager.chunkstore import ChunkStore, MANIFEST_EXT
+from savemanager.compression import (
+    ARCHIVE_EXTS,
+    SevenZipError,
+    backend_ext,
+    get_backend,
+    resolve_options,
+)
+from savemanager.fingerprint import (
+    HashCache,
+    diff_trees,
+    pack_entries,
+    scan_tree,
+    unpack_entries,
+)
+from savemanager.delta import DeltaChains, DeltaEncoder, is_delta_member, resolve_delta
+from savemanager.jobs import JobCancelled
+from savemanager.logpipe import DEBUG, ERROR, INFO, WARNING, LogPipeline
+from savemanager.restore import differential_restore, partial_restore
+from savemanager.retention import is_active, resolve_policy, select_prune
+from savemanager.safety import SafetySnapshot, resolve_safety
+from savemanager.scrub import Scrubber, resolve_scrub, verify_file
+from savemanager.sizescan import SizeScanner
+from savemanager.snapshot import Snapshot, same_stat
+from savemanager.staging import StagedTree
+from savemanager import trace
+
+
+def sizeof_fmt(num, suffix="B"):
+    # https://stackoverflow.com/a/1094933/9267296
+    for unit in ["", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"]:
+        if abs(num) < 1024.0:
+            return f"{num:3.1f}{unit}{suffix}"
+        num /= 1024.0
+    return f"{num:.1f}Yi{suffix}"
+
+
+class BackupEngine:
+    def __init__(self, settings: dict, logger=None, check=None):
+        """
+        settings is shared with the caller (changes are seen immediately),
+        logger is a LogPipeline and check() is called at cancel points and
+        may raise JobCancelled.
+        """
+        self.settings = settings
+        self.logger = logger or LogPipeline()
+        self.check = check or (lambda: None)
+        self.catalog = None
+        self.hash_cache = None
+        self.size_scanner = SizeScanner()
+        self.listings = ListingCache()
+        # optional callbacks, called from the thread running the operation
+        self.on_backups_changed = None
+        self.on_source_changed = None
+        self.on_backups_removed = None
+        self.on_safety_changed = None
+
+    def log(self, text, level=INFO):
+        self.logger.log(text, level)
+
+    @contextlib.contextmanager
+    def traced(self, operation: str):
+        """
+        Record the spans of operation, if TRACE is set, and report them when
+        it ends. Nested operations are part of the outer one's trace.
+        """
+        if not self.settings["TRACE"] or trace.current() is not None:
+            yield
+            return
+        recorded = trace.Trace()
+        try:
+            with recorded:
+                yield
+        finally:
+            self.finish_trace(operation, recorded)
+
+    def finish_trace(self, operation: str, recorded: trace.Trace) -> list:
+        """Report the spans recorded for operation and clear them, returns them."""
+        mode = self.settings["TRACE"]
+        events = recorded.finish()
+        if not events:
+            return events
+        if "summary" in mode:
+            self.log(f"Trace of {operation}:\n{trace.summary(events)}")
+        if "chrome" in mode:
+            try:
+                trace.export_chrome(self.settings["TRACE_FILE"], events)
+                self.log(f"Trace written to {self.settings['TRACE_FILE']}")
+            except OSError as e:
+                self.log(f"Can't write trace: {e}", WARNING)
+        return events
+
+    def notify(self, callback):
+        if callback is not None:
+            callback()
+
+    # paths and names ----------------------------------------------------
+    def dest_path(self, filename: str) -> str:
+        return f"{self.settings['DEST_FOLDER']}{os.sep}{filename}"
+
+    def safety_path(self) -> str:
+        return self.dest_path(self.settings["SAFETY_BACKUP"])
+
+    def backup_ext(self) -> str:
+        if self.settings["BACKUP_FORMAT"] == "chunks":
+            return MANIFEST_EXT
+        options = resolve_options(self.settings["COMPRESSION"])
+        return backend_ext(options, self.settings["FILE_EXT"])
+
+    def archive_ext(self, filename: str) -> str:
+        for ext in (MANIFEST_EXT, *ARCHIVE_EXTS, self.settings["FILE_EXT"]):
+            if ext and filename.lower().endswith(ext.lower()):
+                return filename[-len(ext) :]
+        return os.path.splitext(filename)[1]
+
+    def is_backup_file(self, filename: str) -> bool:
+        exts = (self.settings["FILE_EXT"].lower(), MANIFEST_EXT, *ARCHIVE_EXTS)
+        return filename.startswith(self.settings["FILE_NAME"]) and filename.lower().endswith(
+            exts
+        )
+
+    def get_number(self, filename: str) -> int:
+        raw = os.path.splitext(filename.split(self.settings["FILE_NAME"])[1])[0]
+        number = int("".join(ch for ch in raw if ch.isdigit()))
+        return number
+
+    def increase(self, filename: str) -> str:
+        nr = self.get_number(filename) + 1
+        return f"{filename.split(self.settings['FILE_NAME'])[0]}{self.settings['FILE_NAME']}{nr:03}{self.backup_ext()}"
+
+    # catalog ------------------------------------------------------------
+    def get_catalog(self) -> Catalog:
+        dest = self.settings["DEST_FOLDER"]
+        if self.catalog is None or self.catalog.dest_folder != dest:
+            if self.catalog is not None:
+                self.catalog.close()
+            self.catalog = Catalog(dest, self.is_backup_file, self.get_number)
+            self.hash_cache = None
+        return self.catalog
+
+    def get_hash_cache(self) -> HashCache:
+        catalog = self.get_catalog()
+        if self.hash_cache is None:
+            self.hash_cache = HashCache(catalog.load_hashes, catalog.store_hashes)
+        return self.hash_cache
+
+    # fingerprints -------------------------------------------------------
+    def source_tree(self):
+        """Fingerprint of SOURCE_FOLDER as it is now."""
+        hashes = None
+        if self.settings["FINGERPRINT_HASH"]:
+            hashes = self.get_hash_cache()
+        with trace.span("fingerprint"):
+            return scan_tree(self.settings["SOURCE_FOLDER"], hashes, check=self.check)
+
+    def record_tree(self, filename: str, tree):
+        catalog = self.get_catalog()
+        if catalog.get(filename) is None:
+            # backup failed
+            return
+        catalog.update(filename, fingerprint=tree.digest)
+        catalog.set_tree(filename, pack_entries(tree.entries))
+
+    def changes_since(self, filename: str = None):
+        """TreeDiff from backup filename (default: latest) to the source now, None if unknown."""
+        filename = filename or self.get_current_highest()
+        rows = self.get_catalog().get_tree(filename)
+        if rows is None:
+            return None
+        return diff_trees(unpack_entries(rows), self.source_tree().entries)
+
+    def record_backup(self, filename, synced, source_size, file_count):
+        # the safety backup isn't a numbered backup and stays out of the catalog
+        if not self.is_backup_file(os.path.basename(filename)):
+            return
+        catalog = self.get_catalog()
+        if os.path.normpath(os.path.dirname(filename)) != os.path.normpath(
+            catalog.dest_folder
+        ):
+            return
+        catalog.add(
+            os.path.basename(filename),
+            synced,
+            source_size=source_size,
+            file_count=file_count,
+            checksum=file_checksum(filename),
+        )
+
+    def delta_encoder(self, filename: str, backend):
+        """DeltaEncoder against the latest backup for a new numbered backup, None if off."""
+        options = resolve_delta(self.settings["DELTA"])
+        if not options["min_size_mb"] or not backend.supports_diff:
+            return None
+        if not self.is_backup_file(os.path.basename(filename)):
+            return None
+        catalog = self.get_catalog()
+        if os.path.normpath(os.path.dirname(filename)) != os.path.normpath(
+            catalog.dest_folder
+        ):
+            return None
+        latest = catalog.highest()
+        base = latest["filename"] if latest is not None else None
+        signatures = {}
+        if base is not None and os.path.exists(self.dest_path(base)):
+            signatures = catalog.get_signatures(base)
+        return DeltaEncoder(options, base, signatures)
+
+    def record_delta(self, filename: str, encoder: DeltaEncoder):
+        catalog = self.get_catalog()
+        name = os.path.basename(filename)
+        if catalog.get(name) is None:
+            return
+        catalog.set_signatures(name, encoder.signatures)
+        if encoder.files:
+            catalog.update(name, delta_refs=json.dumps(encoder.refs()))
+            self.log(
+                f"Stored {len(encoder.files)} file(s) as deltas against {encoder.base}, "
+                f"{sizeof_fmt(encoder.saved)} not stored again."
+            )
+
+    def get_current_backups(self, cached: bool = False) -> list:
+        """
+        Backup filenames, safety backup first, then newest to oldest.
+        cached skips reconciling the catalog with DEST_FOLDER.
+        """
+        result = [row["filename"] for row in self.get_backup_rows(cached)]
+        if os.path.exists(self.safety_path()):
+            result.insert(0, self.settings["SAFETY_BACKUP"])
+        return result
+
+    def get_backup_rows(self, cached: bool = False) -> list:
+        """Catalog rows (dicts) of all numbered backups, newest first."""
+        if not os.path.isdir(self.settings["DEST_FOLDER"]):
+            return []
+        return self.get_catalog().backups(reconcile=not cached)
+
+    def backup_details(self, filenames: list) -> dict:
+        """
+        filename -> catalog row (number, size, created, source_size,
+        file_count, verified, verify_result, pinned, ...) of filenames. The
+        safety backup gets one from its file, backups that are gone none.
+        """
+        safety = self.settings["SAFETY_BACKUP"]
+        names = [filename for filename in filenames if filename != safety]
+        details = {}
+        if names and os.path.isdir(self.settings["DEST_FOLDER"]):
+            details = self.get_catalog().rows(names)
+        if len(names) < len(filenames):
+            try:
+                st = os.stat(self.safety_path())
+            except OSError:
+                pass
+            else:
+                details[safety] = {
+                    "filename": safety,
+                    "number": None,
+                    "size": st.st_size,
+                    "created": st.st_mtime,
+                    "source_size": None,
+                    "file_count": None,
+                    "pinned": 0,
+                    "verified": None,
+                    "verify_result": None,
+                }
+        return details
+
+    def count_backup(self, filename: str) -> dict:
+        """{"source_size", "file_count"} of a backup from its header, kept in the catalog."""
+        listing = self.list_archive(self.dest_path(filename))
+        counts = {"source_size": listing.tree_size(""), "file_count": len(listing.entries)}
+        if self.is_backup_file(filename):
+            self.get_catalog().update(filename, **counts)
+        return counts
+
+    def get_current_highest(self) -> str:
+        highest = f"{self.settings['FILE_NAME']}-1{self.settings['FILE_EXT']}"
+        if os.path.isdir(self.settings["DEST_FOLDER"]):
+            row = self.get_catalog().highest()
+            if row is not None and row["number"] is not None:
+                highest = row["filename"]
+        return highest
+
+    # backup -------------------------------------------------------------
+    def create_chunk_backup(self, filename, extralog="", source=None) -> bool:
+        logstr = "Starting deduplicated backup..."
+        if extralog != "":
+            logstr = extralog + "\n" + logstr
+        self.log(logstr)
+        store = ChunkStore(self.settings["DEST_FOLDER"])
+        previous = None
+        highest = self.get_current_highest()
+        if highest.endswith(MANIFEST_EXT):
+            previous = self.dest_path(highest)
+        synced = self.get_catalog().in_sync()
+        try:
+            with trace.span("chunk") as span:
+                stats = store.backup(
+                    source or self.settings["SOURCE_FOLDER"],
+                    filename,
+                    previous,
+                    log=self.log,
+                    check=self.check,
+                )
+                span.add(stats["bytes"])
+            self.log(
+                f"Stored {stats['files']} files ({stats['reused']} unchanged), "
+                f"{sizeof_fmt(stats['bytes'])} total, "
+                f"{sizeof_fmt(stats['written'])} new chunk data."
+            )
+            self.record_backup(filename, synced, stats["bytes"], stats["files"])
+        except JobCancelled:
+            raise
+        except Exception as e:
+            self.log(f"Error during backup: {e}", ERROR)
+            return False
+        finally:
+            self.notify(self.on_backups_changed)
+        return True
+
+    def create_backup(self, filename, extralog="", source=None) -> bool:
+        """Archive source (default SOURCE_FOLDER) to filename, False if that failed."""
+        if filename.endswith(MANIFEST_EXT):
+            return self.create_chunk_backup(filename, extralog, source)
+        source = source or self.settings["SOURCE_FOLDER"]
+        logstr = "Starting backup..."
+        rootdir = os.path.basename(os.path.normpath(source))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        if extralog != "":
+            logstr = extralog + "\n" + logstr
+        self.log(logstr)
+        mode = self.settings["SNAPSHOT_MODE"]
+        backend = self.backend_for(filename)
+        self.log(f"Snapshot mode: {mode}, compression: {backend.describe()}")
+        delta = self.delta_encoder(filename, backend)
+        synced = self.get_catalog().in_sync()
+        try:
+            with Snapshot(
+                source,
+                mode,
+                log=self.log,
+                copy_workers=self.settings["COPY_WORKERS"],
+            ) as snap:
+                counts = None
+                if backend.native is not None and delta is None:
+                    counts = self.archive_native(backend, snap, filename)
+                if counts is None:
+                    counts = self.archive_stream(backend, snap, filename, rootdir, delta)
+                filecount, source_size = counts
+            self.record_backup(filename, synced, source_size, filecount)
+            if delta is not None:
+                self.record_delta(filename, delta)
+            self.log("Done")
+        except JobCancelled:
+            # don't leave a half written archive behind
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise
+        except Exception as e:
+            self.log(f"Error during backup: {e}", ERROR)
+            return False
+        finally:
+            self.notify(self.on_backups_changed)
+        return True
+
+    def archive_stream(self, backend, snap, filename: str, rootdir: str, delta) -> tuple:
+        """Stream snap into filename file by file, (file count, source size)."""
+        debug = self.logger.enabled(DEBUG)
+        for attempt in range(snap.retries):
+            self.log(f"Creating {backend.name} file...")
+            filecount = 0
+            source_size = 0
+            torn = []
+            if delta is not None:
+                delta.reset()
+            with backend.writer(filename) as archive:
+                # folder entries like 7-Zip writes them, so empty folders are restored
+                for entry in snap.dirs():
+                    arcname = os.path.join(rootdir, entry.relpath) if entry.relpath else rootdir
+                    archive.add_dir(entry.path, arcname, entry.stat.st_mtime)
+                for entry, fileobj, before in snap.prefetch(backend.threads):
+                    self.check()
+                    arcname = os.path.join(rootdir, entry.relpath)
+                    if debug:
+                        self.log(f"Adding: {entry.path}", DEBUG)
+                    with fileobj:
+                        if delta is not None and delta.wants(entry.stat.st_size):
+                            with trace.span("delta", entry.stat.st_size):
+                                delta.add(archive, fileobj, arcname, entry.stat.st_mtime)
+                        else:
+                            with trace.span("compress", entry.stat.st_size):
+                                archive.add(fileobj, arcname, entry.stat.st_mtime)
+                        if snap.changed(fileobj, before):
+                            torn.append(entry)
+                    filecount += 1
+                    source_size += entry.stat.st_size
+                if delta is not None:
+                    delta.finish(archive)
+                self.log(
+                    f"Added {filecount} files.\nFinalizing {backend.name} file..."
+                )
+                finalizing = trace.start()
+            trace.record("finalize", finalizing)
+            if not torn:
+                break
+            # rare: a big file was written to while streaming it
+            self.log(
+                f"{len(torn)} file(s) changed while being archived, "
+                "retrying with a private copy of them:\n"
+                + "\n".join(entry.relpath for entry in torn)
+            )
+            for entry in torn:
+                snap.pin(entry)
+        else:
+            self.log("Files kept changing, backup may be inconsistent.", WARNING)
+        return filecount, source_size
+
+    def archive_native(self, backend, snap, filename: str):
+        """
+        Archive snap with the 7-Zip program, (file count, source size) or
+        None if it failed and the streaming writer has to do it.
+        """
+        for attempt in range(snap.retries):
+            self.log(f"Creating {backend.name} file with {backend.native.name}...")
+            entries = list(snap.entries())
+            size = sum(entry.stat.st_size for entry in entries)
+            if os.path.exists(filename):
+                # 7-Zip would add to it
+                os.remove(filename)
+            try:
+                with trace.span("compress", size):
+                    backend.write_tree(filename, snap.root)
+            except (SevenZipError, OSError) as e:
+                self.log(f"{backend.native.name} failed, using py7zr: {e}", WARNING)
+                backend.native = None
+                if os.path.exists(filename):
+                    os.remove(filename)
+                return None
+            torn = []
+            for entry in entries:
+                try:
+                    if not same_stat(entry.stat, os.stat(entry.path)):
+                        torn.append(entry)
+                except OSError:
+                    torn.append(entry)
+            self.log(f"Added {len(entries)} files.")
+            if not torn:
+                return len(entries), size
+            # 7-Zip reads the live files, a rewritten one may be torn
+            self.log(
+                f"{len(torn)} file(s) changed while being archived, retrying:\n"
+                + "\n".join(entry.relpath for entry in torn)
+            )
+        self.log("Files kept changing, backup may be inconsistent.", WARNING)
+        return len(entries), size
+
+    def add_new_backup(self):
+        with self.traced("backup"), trace.span("backup"):
+            return self._add_new_backup()
+
+    def _add_new_backup(self):
+        """Name of the new (or unchanged latest) backup, None if it failed."""
+        newbackupname = self.increase(self.get_current_highest())
+        start = time.time()
+        tree = None
+        if os.path.isdir(self.settings["SOURCE_FOLDER"]):
+            tree = self.source_tree()
+            latest = self.get_catalog().highest()
+            mode = self.settings["SKIP_UNCHANGED"]
+            if (
+                mode in ("skip", "alias")
+                and latest is not None
+                and latest["fingerprint"] == tree.digest
+            ):
+                if mode == "skip":
+                    self.log(
+                        f"Nothing changed since {latest['filename']}, skipping backup."
+                    )
+                    return latest["filename"]
+                return self.add_alias(latest, newbackupname, tree)
+        if not self.create_backup(
+            self.dest_path(newbackupname),
+            extralog=f"Creating new backup with filename:\n  {newbackupname}",
+        ):
+            self.log(f"Backup {newbackupname} was not written.", ERROR)
+            return None
+        if tree is not None:
+            self.record_tree(newbackupname, tree)
+        self.log(f"Backup done.\nTime elapsed: {time.time() - start:.2f} seconds")
+        return newbackupname
+
+    def add_alias(self, latest: dict, newbackupname: str, tree) -> str:
+        """Record an unchanged source as a hardlink (or copy) of the latest backup."""
+        ext = self.archive_ext(latest["filename"])
+        newbackupname = newbackupname[: -len(self.archive_ext(newbackupname))] + ext
+        source = self.dest_path(latest["filename"])
+        target = self.dest_path(newbackupname)
+        catalog = self.get_catalog()
+        synced = catalog.in_sync()
+        try:
+            os.link(source, target)
+            how = "hardlink"
+        except OSError:
+            copy_file(source, target, check=self.check)
+            how = "copy"
+        catalog.add(
+            newbackupname,
+            synced,
+            created=time.time(),
+            source_size=latest["source_size"],
+            file_count=latest["file_count"],
+            checksum=latest["checksum"],
+            fingerprint=tree.digest,
+            delta_refs=latest["delta_refs"],
+        )
+        catalog.set_tree(newbackupname, pack_entries(tree.entries))
+        signatures = catalog.get_signatures(latest["filename"])
+        if signatures:
+            # the next backup's deltas can build on the alias
+            catalog.set_signatures(newbackupname, signatures)
+        self.log(
+            f"Nothing changed since {latest['filename']}, "
+            f"added {newbackupname} as a {how} of it."
+        )
+        self.notify(self.on_backups_changed)
+        return newbackupname
+
+    # restore ------------------------------------------------------------
+    def restore_backup(self, filename: str, do_backup: bool) -> bool:
+        """Restore backup filename (a path), False if nothing was restored."""
+        with self.traced("restore"), trace.span("restore"):
+            return self._restore_backup(filename, do_backup)
+
+    def prepare_restore(self, filename: str, do_backup: bool) -> bool:
+        """
+        Safety backup before a restore, False if filename doesn't exist or
+        the safety backup failed (the source is left alone then).
+        """
+        if not os.path.exists(filename):
+            self.log(f"File: {filename} not found.", ERROR)
+            return False
+        if do_backup and self.safety_mode() == "snapshot":
+            # kept by the restore itself, see restore_into / _restore_paths
+            self.log("Keeping the current save as safety snapshot.")
+        elif do_backup:
+            if os.path.exists(self.safety_path()):
+                os.remove(self.safety_path())
+            os.makedirs(self.settings["SOURCE_FOLDER"], exist_ok=True)
+            if not self.create_backup(
+                self.safety_path(),
+                extralog=f"Creating safety backup: {self.settings['SAFETY_BACKUP']}",
+            ):
+                self.log("The safety backup failed, not restoring.", ERROR)
+                return False
+        else:
+            self.log("Skipping safety backup.")
+        # last chance to cancel, from here on the source folder gets changed
+        self.check()
+        return True
+
+    def _restore_backup(self, filename: str, do_backup: bool) -> bool:
+        start = time.time()
+        if not self.prepare_restore(filename, do_backup):
+            return False
+        self.log(f"Restoring backup: {filename}")
+
+        def restore(target):
+            if filename.endswith(MANIFEST_EXT):
+                store = ChunkStore(os.path.dirname(filename))
+                return store.restore(filename, target)
+            with self.delta_chains() as delta:
+                return differential_restore(
+                    self.backend_for(filename),
+                    filename,
+                    target,
+                    log=self.log,
+                    check=self.check,
+                    delta=delta,
+                )
+
+        stats = self.restore_into(restore, filename, do_backup)
+        self.source_restored(stats)
+        self.log(f"Backup restored.\nTime elapsed: {time.time() - start:.2f} seconds")
+        return True
+
+    def restore_into(self, restore, filename: str, do_backup: bool) -> dict:
+        """
+        Run restore(target) -> stats for SOURCE_FOLDER, staged (RESTORE_MODE)
+        so the source only changes with the final swap. With a snapshot
+        safety backup the replaced tree is kept for undo_restore().
+        """
+        source = self.settings["SOURCE_FOLDER"]
+        keep = do_backup and self.safety_mode() == "snapshot"
+        if self.settings["RESTORE_MODE"] == "staged":
+            with StagedTree(source, log=self.log, check=self.check) as stage:
+                stats = restore(stage.path)
+                # last chance to cancel, the swap is the only change the source sees
+                self.check()
+                try:
+                    stage.commit()
+                except OSError as e:
+                    # e.g. SOURCE_FOLDER is a mount point or in use
+                    self.log(
+                        f"Can't swap in the restored folder ({e}), restoring in place.", WARNING
+                    )
+                else:
+                    if keep:
+                        self.safety_snapshot().keep(stage.path, os.path.basename(filename))
+                        self.log("The replaced save is kept as safety snapshot.")
+                        self.notify(self.on_safety_changed)
+                    return stats
+        if keep:
+            self.snapshot_source(filename)
+        return restore(source)
+
+    # safety snapshots -------------------------------------------------
+    def safety_mode(self) -> str:
+        return resolve_safety(self.settings["SAFETY"])["mode"]
+
+    def safety_snapshot(self) -> SafetySnapshot:
+        return SafetySnapshot(self.settings["SOURCE_FOLDER"])
+
+    def snapshot_source(self, filename: str):
+        with trace.span("safety"):
+            methods = self.safety_snapshot().link(os.path.basename(filename), self.check)
+        self.log(
+            "Safety snapshot: "
+            + (", ".join(f"{cnt} {method}" for method, cnt in methods.items()) or "empty")
+        )
+        self.notify(self.on_safety_changed)
+
+    def can_undo_restore(self) -> bool:
+        return self.safety_snapshot().info() is not None
+
+    def undo_restore(self):
+        """Put the save that the last restore replaced back, in one rename."""
+        snapshot = self.safety_snapshot()
+        info = snapshot.info()
+        if info is None:
+            self.log("There is no restore to undo.", WARNING)
+            return
+        snapshot.undo()
+        self.size_scanner.invalidate(self.settings["SOURCE_FOLDER"])
+        self.notify(self.on_source_changed)
+        self.notify(self.on_safety_changed)
+        self.log(f"Undid the restore of {info['restored']}.")
+
+    def safety_due(self, info=None) -> bool:
+        """True if the safety snapshot (with info, if read already) is compress_after_min old."""
+        if info is None:
+            info = self.safety_snapshot().info()
+            if info is None:
+                return False
+        age = resolve_safety(self.settings["SAFETY"])["compress_after_min"] * 60
+        return time.time() - info["created"] >= age
+
+    def compress_safety(self, force: bool = False) -> bool:
+        """
+        Compress a safety snapshot that is compress_after_min old (or any,
+        with force) into SAFETY_BACKUP and remove it. True if it did.
+        """
+        snapshot = self.safety_snapshot()
+        info = snapshot.info()
+        if info is None:
+            return False
+        if not force and not self.safety_due(info):
+            return False
+        if os.path.exists(self.safety_path()):
+            os.remove(self.safety_path())
+        done = self.create_backup(
+            self.safety_path(),
+            extralog=f"Compressing safety snapshot into {self.settings['SAFETY_BACKUP']}",
+            source=snapshot.path,
+        )
+        if done:
+            snapshot.discard()
+            self.notify(self.on_safety_changed)
+        return done
+
+    def source_restored(self, stats: dict):
+        self.size_scanner.invalidate(self.settings["SOURCE_FOLDER"])
+        self.notify(self.on_source_changed)
+        if stats["extracted"] is None:
+            self.log("Backup fully extracted.")
+        else:
+            self.log(
+                f"{stats['extracted']} files written, {stats['deleted']} removed, "
+                f"{stats['unchanged']} left untouched."
+            )
+
+    def restore_latest(self, do_backup: bool) -> bool:
+        return self.restore_backup(self.dest_path(self.get_current_highest()), do_backup)
+
+    # browsing -----------------------------------------------------------
+    def backend_for(self, filename: str):
+        backend = get_backend(filename, resolve_options(self.settings["COMPRESSION"]))
+        backend.progress = self.progress_log()
+        backend.check = self.check
+        backend.warn = lambda text: self.log(text, WARNING)
+        return backend
+
+    def progress_log(self, step: int = 10):
+        """A progress(percent) callback that logs every step percent."""
+        shown = [0]
+
+        def progress(percent):
+            mark = percent // step * step
+            if mark < shown[0]:
+                # the next run started
+                shown[0] = 0
+            if mark > shown[0]:
+                shown[0] = mark
+                self.log(f"{mark}%")
+
+        return progress
+
+    def delta_chains(self) -> DeltaChains:
+        # next to the source, rebuilt files come from there
+        workdir = os.path.dirname(os.path.normpath(self.settings["SOURCE_FOLDER"]))
+        return DeltaChains(self.backend_for, workdir if os.path.isdir(workdir) else None)
+
+    def list_archive(self, filename: str) -> ArchiveListing:
+        """File tree of backup filename (a path) from its header, cached."""
+
+        def load():
+            with trace.span("listing"):
+                if filename.endswith(MANIFEST_EXT):
+                    store = ChunkStore(os.path.dirname(filename))
+                    return ArchiveListing(store.entries(filename), store.dirs(filename))
+                entries, dirs = self.backend_for(filename).listing(filename)
+                with DeltaChains(self.backend_for) as delta:
+                    entries = delta.apply(filename, entries)
+                return ArchiveListing(entries, [d for d in dirs if not is_delta_member(d)])
+
+        return self.listings.get(filename, load)
+
+    def restore_paths(self, filename: str, targets: list, do_backup: bool) -> bool:
+        """
+        Restore only targets (names from list_archive) of backup filename,
+        False if nothing was restored.
+        """
+        with self.traced("restore"), trace.span("restore"):
+            return self._restore_paths(filename, targets, do_backup)
+
+    def _restore_paths(self, filename: str, targets: list, do_backup: bool) -> bool:
+        start = time.time()
+        listing = self.list_archive(filename)
+        for target in targets:
+            if not listing.files_under(target):
+                raise ValueError(f"Not in {os.path.basename(filename)}: {target}")
+        if not self.prepare_restore(filename, do_backup):
+            return False
+        if do_backup and self.safety_mode() == "snapshot":
+            self.snapshot_source(filename)
+        self.log(f"Restoring from {filename}:\n" + "\n".join(f"  {t}" for t in targets))
+        if filename.endswith(MANIFEST_EXT):
+            store = ChunkStore(os.path.dirname(filename))
+            stats = store.restore(filename, self.settings["SOURCE_FOLDER"], targets)
+        else:
+            with self.delta_chains() as delta:
+                stats = partial_restore(
+                    self.backend_for(filename),
+                    filename,
+                    self.settings["SOURCE_FOLDER"],
+                    targets,
+                    listing.entries,
+                    keep_dirs=[name for name in listing.children if name],
+                    log=self.log,
+                    check=self.check,
+                    delta=delta,
+                )
+        self.source_restored(stats)
+        self.log(f"Selection restored.\nTime elapsed: {time.time() - start:.2f} seconds")
+        return True
+
+    # maintenance --------------------------------------------------------
+    def delete_backup(self, filename: str, collect: bool = True):
+        """
+        Delete a numbered backup and drop it from the catalog. With collect
+        the chunks only a deleted manifest used are deleted too.
+        """
+        catalog = self.get_catalog()
+        synced = catalog.in_sync()
+        os.remove(self.dest_path(filename))
+        catalog.remove(filename, synced)
+        self.log(f"Deleted {filename}")
+        if collect and filename.endswith(MANIFEST_EXT):
+            self.collect_chunks()
+
+    def collect_chunks(self) -> dict:
+        """Delete chunks no manifest in DEST_FOLDER refers to anymore."""
+        try:
+            stats = ChunkStore(self.settings["DEST_FOLDER"]).gc(check=self.check)
+        except (OSError, ValueError, KeyError) as e:
+            self.log(f"Can't clean up chunks, keeping all of them: {e}", WARNING)
+            return {"chunks": 0, "bytes": 0}
+        if stats["chunks"]:
+            self.log(
+                f"Removed {stats['chunks']} unused chunk(s), {sizeof_fmt(stats['bytes'])} freed."
+            )
+        return stats
+
+    def pin_backup(self, filename: str, pinned: bool = True):
+        """Pinned backups are never pruned."""
+        catalog = self.get_catalog()
+        if catalog.get(filename) is None:
+            raise ValueError(f"Not a backup: {filename}")
+        catalog.update(filename, pinned=int(pinned))
+        self.log(f"{'Pinned' if pinned else 'Unpinned'} {filename}")
+
+    def pinned_backups(self) -> set:
+        return {row["filename"] for row in self.get_backup_rows() if row["pinned"]}
+
+    def toggle_pin(self, filename: str) -> bool:
+        """Pin filename if it isn't pinned, unpin it if it is, returns the new state."""
+        pinned = filename not in self.pinned_backups()
+        self.pin_backup(filename, pinned)
+        return pinned
+
+    def prune(self, dry_run: bool = False) -> list:
+        """Delete backups the RETENTION policy doesn't keep, returns their names."""
+        policy = resolve_policy(self.settings["RETENTION"])
+        if not is_active(policy):
+            return []
+        rows = self.get_backup_rows()
+        chunks = None
+        manifests = [row["filename"] for row in rows if row["filename"].endswith(MANIFEST_EXT)]
+        if policy["max_size_gb"] and manifests:
+            try:
+                chunks = ChunkStore(self.settings["DEST_FOLDER"]).usage(manifests)
+            except (OSError, ValueError, KeyError) as e:
+                # counted by their manifest size only
+                self.log(f"Can't read chunk usage: {e}", WARNING)
+        doomed = [row["filename"] for row in select_prune(rows, policy, chunks)]
+        if dry_run:
+            for filename in doomed:
+                self.log(f"Would delete {filename}")
+            return doomed
+        deleted = []
+        try:
+            for filename in doomed:
+                self.check()
+                try:
+                    # chunks are collected once below
+                    self.delete_backup(filename, collect=False)
+                    deleted.append(filename)
+                except OSError as e:
+                    self.log(f"Can't delete {filename}: {e}", WARNING)
+        finally:
+            if deleted:
+                self.log(f"Retention: pruned {len(deleted)} backup(s).")
+                if self.on_backups_removed is not None:
+                    self.on_backups_removed(deleted)
+                if any(filename.endswith(MANIFEST_EXT) for filename in deleted):
+                    self.collect_chunks()
+        return deleted
+
+    def verify_backup(self, filename: str):
+        """Return (ok, message) for one backup in DEST_FOLDER, in this process."""
+        row = None
+        if self.is_backup_file(filename):
+            row = self.get_catalog().get(filename)
+        options = resolve_options(self.settings["COMPRESSION"])
+        ok, message = verify_file(self.dest_path(filename), row and row["checksum"], options)
+        if row is not None:
+            self.catalog.update(filename, verified=time.time(), verify_result=message)
+        return ok, message
+
+    def stale_backups(self, max_age_days: float) -> list:
+        """Backups never verified, verified before max_age_days or that failed."""
+        limit = time.time() - max_age_days * 86400
+        return [
+            row["filename"]
+            for row in self.get_catalog().backups()
+            if row["verified"] is None or row["verified"] < limit or row["verify_result"] != "ok"
+        ]
+
+    def scrub(self, filenames=None, stale_only: bool = True) -> dict:
+        """
+        Verify backups on the SCRUB process pool and record the results in the
+        catalog. Without filenames all backups are checked, with stale_only
+        only those stale_backups() returns. Returns {filename: (ok, message)}.
+        """
+        scrub = resolve_scrub(self.settings["SCRUB"])
+        catalog = self.get_catalog()
+        rows = {row["filename"]: row for row in catalog.backups()}
+        if filenames:
+            selected = list(filenames)
+        elif stale_only:
+            selected = self.stale_backups(scrub["max_age_days"])
+        else:
+            selected = list(rows)
+        skipped = len(rows) - len(selected) if not filenames else 0
+        jobs = [
+            (filename, self.dest_path(filename), (rows.get(filename) or {}).get("checksum"))
+            for filename in selected
+        ]
+        results = {}
+
+        def on_result(filename, ok, message):
+            results[filename] = (ok, message)
+            if filename in rows:
+                catalog.update(filename, verified=time.time(), verify_result=message)
+            self.log(f"{filename}: {message}", INFO if ok else ERROR)
+
+        options = resolve_options(self.settings["COMPRESSION"])
+        with self.traced("scrub"):
+            started = trace.start()
+            Scrubber(scrub["workers"], scrub["max_mb_s"], self.check).run(jobs, options, on_result)
+            trace.record("scrub", started, sum((rows.get(f) or {}).get("size") or 0 for f in selected))
+        failed = sum(1 for ok, _ in results.values() if not ok)
+        self.log(
+            f"Verified {len(results)} backup(s), {failed} failed"
+            + (f", {skipped} recently verified." if skipped else "."),
+            ERROR if failed else INFO,
+        )
+        return results
+
+    def verify(self, filenames=None) -> bool:
+        """Verify the given (default: all) backups, log results, True if all ok."""
+        results = self.scrub(filenames, stale_only=False)
+        return all(ok for ok, _ in results.values())
+
+    def scan_size(self):
+        return self.size_scanner.scan(self.settings["SOURCE_FOLDER"])
@@ -0,0 +1,133 @@
+"""
+Source tree fingerprints.
+
+A fingerprint is a digest over every path, size and mtime_ns in the source
+folder (optionally content hashes instead of mtimes). Comparing it with the
+fingerprint stored for the latest backup tells whether a new backup would be
+identical, and the stored per-file listing answers "what changed since
+backup N". Content hashes are cached by (inode, size, mtime_ns), so a file is
+only read again after it changed.
+"""
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+
+HASH_BUFSIZE = 1024 * 1024
+
+# size is None for directories, digest is None unless content hashing is on
+TreeEntry = namedtuple("TreeEntry", "size mtime_ns digest")
+Tree = namedtuple("Tree", "digest entries")
+TreeDiff = namedtuple("TreeDiff", "added removed changed")
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as infile:
+        while True:
+            data = infile.read(HASH_BUFSIZE)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+
+class HashCache:
+    """Content hashes keyed by (inode, size, mtime_ns), optionally persisted."""
+
+    def __init__(self, load=None, store=None):
+        """
+        load() returns an iterable of (inode, size, mtime_ns, digest) to start
+        with, store(rows) is called with newly computed rows by flush().
+        """
+        self.lock = threading.Lock()
+        self.hashes = {}
+        self.new = []
+        self.store = store
+        if load is not None:
+            for inode, size, mtime_ns, digest in load():
+                self.hashes[(inode, size, mtime_ns)] = digest
+
+    def get(self, path: str, st) -> str:
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            digest = self.hashes.get(key)
+        if digest is None:
+            digest = content_hash(path)
+            with self.lock:
+                self.hashes[key] = digest
+                self.new.append((*key, digest))
+        return digest
+
+    def flush(self):
+        with self.lock:
+            rows, self.new = self.new, []
+        if rows and self.store is not None:
+            self.store(rows)
+
+
+def scan_tree(source: str, hashes: HashCache = None, check=None) -> Tree:
+    """
+    Walk source the way Snapshot does and return its Tree. With a HashCache
+    the digest uses content hashes instead of mtimes, so touching a file
+    without changing it doesn't count as a change.
+    """
+    source = os.path.normpath(source)
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath, source)
+        if reldir != ".":
+            entries[reldir.replace(os.sep, "/") + "/"] = TreeEntry(None, None, None)
+        for name in sorted(filenames):
+            if check is not None:
+                check()
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+                digest = hashes.get(path, st) if hashes is not None else None
+            except OSError:
+                # deleted while walking
+                continue
+            relpath = os.path.relpath(path, source).replace(os.sep, "/")
+            entries[relpath] = TreeEntry(st.st_size, st.st_mtime_ns, digest)
+    if hashes is not None:
+        hashes.flush()
+    return Tree(tree_digest(entries), entries)
+
+
+def tree_digest(entries: dict) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    for relpath in sorted(entries):
+        entry = entries[relpath]
+        # content hash if we have one, mtime otherwise
+        detail = entry.digest if entry.digest is not None else entry.mtime_ns
+        digest.update(f"{relpath}\0{entry.size}\0{detail}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def same_file(old: TreeEntry, new: TreeEntry) -> bool:
+    if old.size != new.size:
+        return False
+    if old.digest is not None and new.digest is not None:
+        return old.digest == new.digest
+    return old.mtime_ns == new.mtime_ns
+
+
+def diff_trees(old: dict, new: dict) -> TreeDiff:
+    """Paths added, removed and changed going from old to new entries."""
+    added = sorted(path for path in new if path not in old)
+    removed = sorted(path for path in old if path not in new)
+    changed = sorted(
+        path for path in new if path in old and not same_file(old[path], new[path])
+    )
+    return TreeDiff(added, removed, changed)
+
+
+def pack_entries(entries: dict) -> list:
+    """json-able form of entries, see unpack_entries()."""
+    return [[path, *entry] for path, entry in entries.items()]
+
+
+def unpack_entries(rows: list) -> dict:
+    return {row[0]: TreeEntry(*row[1:]) for row in rows}
@@ -0,0 +1,270 @@
+"""
+Background job scheduler for the Tk GUI.
+
+Operations of all profiles run on worker threads, each profile's jobs one at
+a time and in order of priority (MANUAL before AUTOMATIC, then submission
+order). Heavy jobs (backups, restores, verifies) also count against
+max_jobs across all profiles and against max_per_device on every disk they
+read or write, so profiles sharing a disk don't compress at the same time.
+A heavy job waiting for a disk keeps lower priority jobs off that disk.
+Light jobs (listing backups, reading an archive header) only wait for their
+own profile.
+
+Log lines, widget updates and results are posted to a queue that the Tk main
+loop drains with root.after, so the window never blocks and nothing has to
+call root.update().
+"""
+import itertools
+import os
+import queue
+import threading
+import traceback
+from collections import Counter
+
+
+MANUAL = 0
+AUTOMATIC = 1
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def device_of(path: str):
+    """st_dev of path or of its nearest existing parent, None if there is none."""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        func,
+        args,
+        kwargs,
+        on_done=None,
+        profile: str = "",
+        priority: int = MANUAL,
+        devices=frozenset(),
+        heavy: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.profile = profile
+        self.priority = priority
+        self.devices = frozenset(devices)
+        self.heavy = heavy
+        self.seq = 0
+        # "queued", "running" or "done"
+        self.state = "queued"
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class JobScheduler:
+    def __init__(
+        self,
+        root,
+        max_jobs: int = 2,
+        max_per_device: int = 1,
+        poll_ms: int = 50,
+        on_change=None,
+        log=print,
+    ):
+        """
+        max_jobs and max_per_device limit running heavy jobs, 0 is no limit.
+        on_change() is called on the Tk thread when jobs were queued, started
+        or finished.
+        """
+        self.root = root
+        self.max_jobs = max_jobs
+        self.max_per_device = max_per_device
+        self.poll_ms = poll_ms
+        self.on_change = on_change
+        self.log = log
+        self.events = queue.Queue()
+        self.queued = []
+        self.running = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.change_posted = False
+
+    # called from any thread ---------------------------------------------
+    def submit(
+        self,
+        name: str,
+        func,
+        *args,
+        profile: str = "",
+        priority: int = MANUAL,
+        paths=(),
+        heavy: bool = True,
+        on_done=None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queue func(*args, **kwargs) for profile. paths are the folders the
+        job reads or writes, their disks count against max_per_device.
+        on_done(job, result, error) is called on the Tk thread afterwards.
+        """
+        devices = {device_of(path) for path in paths if path} - {None}
+        job = Job(name, func, args, kwargs, on_done, profile, priority, devices, heavy)
+        with self.lock:
+            job.seq = next(self.counter)
+            self.queued.append(job)
+            self.queued.sort(key=lambda queued: (queued.priority, queued.seq))
+        self.dispatch()
+        return job
+
+    def call_soon(self, func, *args):
+        """Run func(*args) on the Tk thread (directly if already on it)."""
+        if threading.current_thread() is threading.main_thread():
+            func(*args)
+        else:
+            self.events.put((func, args))
+
+    def cancel(self, profile=None):
+        """Cancel the jobs of profile (all if None), queued ones never start."""
+        with self.lock:
+            for job in self.running:
+                if profile is None or job.profile == profile:
+                    job.cancel()
+            for job in [job for job in self.queued if profile is None or job.profile == profile]:
+                job.cancel()
+                job.state = "done"
+                self.queued.remove(job)
+        self.changed()
+
+    def check_cancelled(self):
+        """Raise JobCancelled inside a job that has been cancelled."""
+        job = getattr(self.local, "job", None)
+        if job is not None and job.cancelled:
+            raise JobCancelled(job.name)
+
+    def busy(self, profile=None) -> bool:
+        """True while profile (any if None) has running or queued jobs."""
+        with self.lock:
+            return any(
+                profile is None or job.profile == profile
+                for job in itertools.chain(self.running, self.queued)
+            )
+
+    def jobs(self) -> list:
+        """Running jobs, then queued ones in the order they will start."""
+        with self.lock:
+            return self.running + self.queued
+
+    def stop(self):
+        self.cancel()
+
+    # scheduling ---------------------------------------------------------
+    def dispatch(self):
+        """Start every queued job the limits allow."""
+        started = []
+        with self.lock:
+            heavy = sum(job.heavy for job in self.running)
+            per_device = Counter(
+                device for job in self.running if job.heavy for device in job.devices
+            )
+            blocked_profiles = {job.profile for job in self.running}
+            waiting_devices = set()
+            for job in list(self.queued):
+                if job.profile in blocked_profiles:
+                    continue
+                # later jobs of the profile wait for this one either way
+                blocked_profiles.add(job.profile)
+                if job.heavy:
+                    if (
+                        (self.max_jobs and heavy >= self.max_jobs)
+                        or any(
+                            self.max_per_device and per_device[device] >= self.max_per_device
+                            for device in job.devices
+                        )
+                        or job.devices & waiting_devices
+                    ):
+                        waiting_devices |= job.devices
+                        continue
+                    heavy += 1
+                    per_device.update(job.devices)
+                self.queued.remove(job)
+                self.running.append(job)
+                job.state = "running"
+                started.append(job)
+        for job in started:
+            threading.Thread(
+                target=self.run_job, args=(job,), name=f"savemanager-job-{job.name}", daemon=True
+            ).start()
+        self.changed()
+
+    def run_job(self, job: Job):
+        self.local.job = job
+        result = None
+        error = None
+        try:
+            if job.cancelled:
+                raise JobCancelled(job.name)
+            result = job.func(*job.args, **job.kwargs)
+        except JobCancelled as e:
+            error = e
+        except Exception as e:
+            error = e
+            self.log(f"Error in {job.name}: {e}\n{traceback.format_exc()}")
+        self.local.job = None
+        with self.lock:
+            self.running.remove(job)
+            job.state = "done"
+        if job.on_done is not None:
+            self.events.put((job.on_done, (job, result, error)))
+        self.dispatch()
+
+    def changed(self):
+        # one on_change per poll, however many jobs moved
+        with self.lock:
+            if self.change_posted:
+                return
+            self.change_posted = True
+        self.events.put((self.notify_change, ()))
+
+    # Tk thread ----------------------------------------------------------
+    def notify_change(self):
+        with self.lock:
+            self.change_posted = False
+        if self.on_change is not None:
+            self.on_change()
+
+    def start(self):
+        self.root.after(self.poll_ms, self.poll)
+
+    def poll(self):
+        while True:
+            try:
+                func, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                self.log(f"Error in GUI callback: {e}")
+        try:
+            self.root.after(self.poll_ms, self.poll)
+        except Exception:
+            # root destroyed
+            pass
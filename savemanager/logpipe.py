@@ -0,0 +1,147 @@
+"""
+Batched, ring-buffered log pipeline.
+
+log() only formats and appends to a bounded ring buffer (and optionally a
+rotating log file); the Tk widget is updated by a timed flush that inserts
+all pending lines at once and trims the oldest lines. Messages below the
+current level return immediately, callers with expensive messages can test
+enabled() first.
+"""
+import logging
+import logging.handlers
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from logging import DEBUG, ERROR, INFO, WARNING
+
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+CAPACITY = 5000
+WIDGET_LINES = 2000
+FLUSH_MS = 100
+LOGFILE_BYTES = 1024 * 1024
+LOGFILE_BACKUPS = 3
+
+
+def level_from_name(name, default=INFO) -> int:
+    if isinstance(name, int):
+        return name
+    return LEVELS.get(str(name).upper(), default)
+
+
+class LogPipeline:
+    def __init__(self, level=INFO, capacity=CAPACITY, widget_lines=WIDGET_LINES, stream=sys.stdout):
+        self.level = level_from_name(level)
+        self.buffer = deque(maxlen=capacity)
+        self.pending = deque(maxlen=capacity)
+        self.dropped = 0
+        self.widget_lines = widget_lines
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.root = None
+        self.widget = None
+        self.flush_ms = FLUSH_MS
+        self.filelog = None
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def set_level(self, level):
+        self.level = level_from_name(level)
+
+    def set_logfile(self, filename: str, max_bytes=LOGFILE_BYTES, backups=LOGFILE_BACKUPS):
+        """Also write every line to a rotating log file (empty name = off)."""
+        if self.filelog is not None:
+            for handler in list(self.filelog.handlers):
+                self.filelog.removeHandler(handler)
+                handler.close()
+            self.filelog = None
+        if not filename:
+            return
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.filelog = logging.getLogger(f"savemanager.logfile.{id(self)}")
+        self.filelog.propagate = False
+        self.filelog.setLevel(DEBUG)
+        self.filelog.addHandler(handler)
+
+    def log(self, text: str, level: int = INFO):
+        if level < self.level:
+            return
+        lines = str(text).split("\n")
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        block = f"{timestamp} | {lines[0]}\n"
+        for line in lines[1:]:
+            block += f"         | {line}\n"
+        with self.lock:
+            self.buffer.append(block)
+            if self.widget is not None:
+                if len(self.pending) == self.pending.maxlen:
+                    self.dropped += 1
+                self.pending.append(block)
+        if self.widget is None and self.stream is not None:
+            self.stream.write(block)
+        if self.filelog is not None:
+            self.filelog.info(block.rstrip("\n"))
+
+    def lines(self) -> list:
+        with self.lock:
+            return list(self.buffer)
+
+    # Tk side ------------------------------------------------------------
+    def attach(self, root, widget, flush_ms=FLUSH_MS):
+        """Start flushing into a (disabled) Text widget every flush_ms."""
+        self.root = root
+        self.widget = widget
+        self.flush_ms = flush_ms
+        self.root.after(self.flush_ms, self.flush)
+
+    def detach(self):
+        self.widget = None
+        self.root = None
+
+    def flush(self):
+        if self.widget is None:
+            return
+        with self.lock:
+            blocks = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if blocks:
+            text = "".join(blocks)
+            if dropped:
+                text = f"         | ... {dropped} older lines not shown ...\n" + text
+            widget = self.widget
+            widget.config(state="normal")
+            widget.insert("end", text)
+            # trim the oldest lines so the widget doesn't grow without bound
+            excess = int(widget.index("end-1c").split(".")[0]) - self.widget_lines
+            if excess > 0:
+                widget.delete("1.0", f"{excess + 1}.0")
+            widget.see("end")
+            widget.config(state="disabled")
+        try:
+            self.root.after(self.flush_ms, self.flush)
+        except Exception:
+            # root destroyed
+            pass
+
+
+class PrefixedLog:
+    """Logs into a LogPipeline with "[prefix] " in front, one per profile."""
+
+    def __init__(self, pipeline: LogPipeline, prefix: str = ""):
+        self.pipeline = pipeline
+        # empty for no prefix, e.g. while there is only one profile
+        self.prefix = prefix
+
+    def enabled(self, level: int) -> bool:
+        return self.pipeline.enabled(level)
+
+    def log(self, text: str, level: int = INFO):
+        if self.prefix:
+            text = f"[{self.prefix}] {text}"
+        self.pipeline.log(text, level)
@@ -0,0 +1,68 @@
+"""
+Background loader for the backup list's metadata columns.
+
+The list asks for the rows it shows. MetadataLoader answers from the catalog
+first (one query for all of them), then reads the archive header of backups
+the catalog only knows from the directory to get their source size and file
+count, which the engine stores for next time. A new request replaces one
+that hasn't been served yet and stops the header reads of the current one,
+so scrolling through thousands of backups only loads what is looked at.
+"""
+import threading
+
+
+class MetadataLoader:
+    def __init__(self, on_result, log=print):
+        """
+        on_result(key, {filename: (row, complete)}) is called from the loader
+        thread, complete is False while the header still has to be read.
+        """
+        self.on_result = on_result
+        self.log = log
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = None
+        self.thread = None
+
+    def request(self, engine, key, filenames: list):
+        """Load filenames of engine, key is passed back with the results."""
+        with self.lock:
+            self.pending = (engine, key, list(filenames))
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name="savemanager-metadata", daemon=True
+            )
+            self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                request, self.pending = self.pending, None
+            if request is None:
+                continue
+            engine, key, filenames = request
+            try:
+                self.load(engine, key, filenames)
+            except Exception as e:
+                self.log(f"Error loading backup details: {e}")
+
+    def load(self, engine, key, filenames: list):
+        rows = engine.backup_details(filenames)
+        self.on_result(
+            key, {name: (row, row["file_count"] is not None) for name, row in rows.items()}
+        )
+        for name, row in rows.items():
+            if row["file_count"] is not None:
+                continue
+            if self.pending is not None:
+                # the list moved on, the newer request goes first
+                return
+            try:
+                row = {**row, **engine.count_backup(name)}
+            except Exception as e:
+                self.log(f"Can't read {name}: {e}")
+            # done either way, unreadable backups aren't retried
+            self.on_result(key, {name: (row, True)})
@@ -0,0 +1,193 @@
+"""
+Differential restore.
+
+Instead of deleting SOURCE_FOLDER and extracting everything, the archive's
+file list and CRCs are compared with the live tree: only entries that differ
+are extracted, files that are not in the backup are deleted and identical
+files are left alone.
+"""
+import os
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from savemanager import trace
+
+
+ArchiveEntry = namedtuple("ArchiveEntry", "name size crc32")
+CRC_BUFSIZE = 1024 * 1024
+CRC_WORKERS = 8
+
+
+def file_crc32(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as infile:
+        while True:
+            data = infile.read(CRC_BUFSIZE)
+            if not data:
+                return crc
+            crc = zlib.crc32(data, crc)
+
+
+def live_files(parent: str, roots) -> dict:
+    """Map 'root/rel/path' -> (path, size) for all files below parent/root."""
+    result = {}
+    for root in roots:
+        top = os.path.join(parent, root)
+        for dirpath, _, filenames in os.walk(top):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                arcname = os.path.relpath(path, parent).replace(os.sep, "/")
+                try:
+                    result[arcname] = (path, os.path.getsize(path))
+                except OSError:
+                    pass
+    return result
+
+
+def plan_restore(entries: dict, parent: str, roots, check=None):
+    """
+    Compare archive entries (normalized name -> ArchiveEntry) with the tree in
+    parent/root. Returns (names to extract, paths to delete, unchanged count).
+    """
+    live = live_files(parent, roots)
+    extract = []
+    compare = []
+    for name, entry in entries.items():
+        found = live.pop(name, None)
+        if found is None or found[1] != entry.size or entry.crc32 is None:
+            extract.append(name)
+        else:
+            compare.append((name, found[0], entry.crc32))
+
+    def same(item):
+        if check is not None:
+            check()
+        try:
+            return file_crc32(item[1]) == item[2]
+        except OSError:
+            return False
+
+    unchanged = 0
+    with ThreadPoolExecutor(max_workers=CRC_WORKERS) as pool:
+        for item, equal in zip(compare, pool.map(same, compare)):
+            if equal:
+                unchanged += 1
+            else:
+                extract.append(item[0])
+    delete = [path for path, _ in live.values()]
+    return extract, delete, unchanged
+
+
+def extract_entries(backend, filename: str, parent: str, entries: dict, names: list, delta=None, check=None):
+    """Extract names (keys of entries) below parent, delta files are rebuilt by delta."""
+    # replace, don't write into: the file may be linked into a staged tree
+    for name in names:
+        try:
+            os.remove(os.path.join(parent, *name.split("/")))
+        except FileNotFoundError:
+            pass
+    rebuilt = set(delta.index(filename)) if delta is not None else set()
+    plain = [entries[name].name for name in names if name not in rebuilt]
+    if plain:
+        backend.extract(filename, parent, plain)
+    deltas = [name for name in names if name in rebuilt]
+    if deltas:
+        delta.rebuild(filename, deltas, parent, check)
+
+
+def partial_restore(
+    backend,
+    filename: str,
+    source: str,
+    targets: list,
+    entries: dict,
+    keep_dirs=(),
+    log=print,
+    check=None,
+    delta=None,
+):
+    """
+    Restore only the archive names in targets (files or directories, e.g.
+    "save/slot1") over source. Below directory targets files that aren't in
+    the backup are removed, everything outside the targets is left alone.
+    delta (a DeltaChains) rebuilds files that were stored as deltas.
+    """
+    source = os.path.normpath(source)
+    parent = os.path.dirname(source)
+    targets = [target.strip("/") for target in targets]
+    wanted = {
+        name: entry
+        for name, entry in entries.items()
+        if any(name == target or name.startswith(f"{target}/") for target in targets)
+    }
+    roots = [target for target in targets if target not in entries]
+    with trace.span("plan"):
+        extract, delete, unchanged = plan_restore(wanted, parent, roots, check)
+    log(
+        f"{len(extract)} of {len(wanted)} selected files differ, "
+        f"{len(delete)} extra files, {unchanged} unchanged."
+    )
+    if check is not None:
+        check()
+    remove_extra(delete, parent, roots, keep_dirs)
+    if extract:
+        with trace.span("extract", sum(wanted[name].size or 0 for name in extract)):
+            extract_entries(backend, filename, parent, wanted, extract, delta, check)
+    return {"extracted": len(extract), "deleted": len(delete), "unchanged": unchanged}
+
+
+def remove_extra(delete: list, parent: str, roots, keep_dirs=()):
+    """Delete files that are not in the backup and prune emptied directories."""
+    for path in delete:
+        os.remove(path)
+    keep = {os.path.normpath(os.path.join(parent, d)) for d in keep_dirs}
+    for root in roots:
+        top = os.path.join(parent, root)
+        for dirpath, _, _ in os.walk(top, topdown=False):
+            if dirpath == top or os.path.normpath(dirpath) in keep:
+                continue
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                # not empty
+                pass
+
+
+def differential_restore(backend, filename: str, source: str, log=print, check=None, delta=None):
+    """
+    Restore archive `filename` over `source`, return a stats dict. delta (a
+    DeltaChains) rebuilds files that were stored as deltas.
+    """
+    source = os.path.normpath(source)
+    parent = os.path.dirname(source)
+    os.makedirs(source, exist_ok=True)
+    if not backend.supports_diff:
+        # no header with sizes/CRCs to compare against: clean full extract
+        _, delete, _ = plan_restore({}, parent, [os.path.basename(source)])
+        remove_extra(delete, parent, [os.path.basename(source)])
+        with trace.span("extract"):
+            backend.extractall(filename, parent)
+        return {"extracted": None, "deleted": len(delete), "unchanged": 0}
+    with trace.span("plan"):
+        entries = backend.entries(filename)
+        if delta is not None:
+            entries = delta.apply(filename, entries)
+        roots = {name.split("/")[0] for name in entries} | {os.path.basename(source)}
+        extract, delete, unchanged = plan_restore(entries, parent, roots, check)
+    log(
+        f"{len(extract)} files differ, {len(delete)} extra files, "
+        f"{unchanged} unchanged."
+    )
+    if check is not None:
+        check()
+    dirs = backend.dirs(filename)
+    remove_extra(delete, parent, roots, dirs)
+    if extract:
+        with trace.span("extract", sum(entries[name].size for name in extract)):
+            extract_entries(backend, filename, parent, entries, extract, delta, check)
+    # empty folders have no files that would create them
+    for name in dirs:
+        if name.split("/")[0] == os.path.basename(source):
+            os.makedirs(os.path.join(parent, *name.split("/")), exist_ok=True)
+    return {"extracted": len(extract), "deleted": len(delete), "unchanged": unchanged}
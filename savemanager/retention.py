@@ -0,0 +1,101 @@
+"""
+Backup retention (keep last N, hourly/daily/weekly thinning, size cap).
+
+select_prune() only decides; the engine deletes. Pinned backups are never
+selected and neither is the newest backup, nor any backup a kept backup's
+delta files are rebuilt from. The safety backup isn't in the catalog, so it
+never gets here at all.
+
+For chunk backups (.manifest) the file is tiny, the disk space is in the
+shared chunks: the size cap counts every chunk once and a pruned manifest
+frees the chunks no kept manifest uses.
+"""
+import json
+import time
+from collections import Counter
+
+
+# 0 disables a rule, all rules 0 keeps everything
+DEFAULT_POLICY = {
+    "keep_last": 0,
+    "hourly": 0,
+    "daily": 0,
+    "weekly": 0,
+    "max_size_gb": 0,
+}
+
+BUCKETS = {
+    "hourly": "%Y-%m-%d %H",
+    "daily": "%Y-%m-%d",
+    "weekly": "%G-%V",
+}
+
+
+def resolve_policy(setting) -> dict:
+    return {**DEFAULT_POLICY, **(setting or {})}
+
+
+def is_active(policy: dict) -> bool:
+    return any(policy[key] for key in DEFAULT_POLICY)
+
+
+def select_prune(rows: list, policy: dict, chunks=None) -> list:
+    """
+    rows are catalog rows (filename, number, size, created, pinned), returns
+    the rows to delete, oldest first. chunks maps manifest filenames to
+    {digest: bytes on disk} of the chunks they use, for the size cap.
+    """
+    chunks = chunks or {}
+    policy = resolve_policy(policy)
+    if not is_active(policy) or not rows:
+        return []
+    # newest first, by number like get_current_highest
+    rows = sorted(rows, key=lambda row: (row["number"] or 0, row["created"] or 0), reverse=True)
+    keep = {rows[0]["filename"]}
+    keep.update(row["filename"] for row in rows if row.get("pinned"))
+    if any(policy[key] for key in ("keep_last", "hourly", "daily", "weekly")):
+        keep.update(row["filename"] for row in rows[: policy["keep_last"]])
+        for rule, fmt in BUCKETS.items():
+            wanted = policy[rule]
+            seen = set()
+            for row in rows:
+                if len(seen) >= wanted:
+                    break
+                bucket = time.strftime(fmt, time.localtime(row["created"] or 0))
+                if bucket not in seen:
+                    # newest backup of each period survives
+                    seen.add(bucket)
+                    keep.add(row["filename"])
+    else:
+        # size cap only
+        keep.update(row["filename"] for row in rows)
+    prune = [row for row in rows if row["filename"] not in keep]
+    if policy["max_size_gb"]:
+        limit = policy["max_size_gb"] * 1024**3
+        kept = [row for row in rows if row["filename"] in keep]
+        refs = Counter()
+        chunk_sizes = {}
+        for row in kept:
+            for digest, size in chunks.get(row["filename"], {}).items():
+                refs[digest] += 1
+                chunk_sizes[digest] = size
+        total = sum(row["size"] or 0 for row in kept) + sum(chunk_sizes.values())
+        # oldest unpinned backups go first, never the newest one
+        for row in reversed(kept[1:]):
+            if total <= limit:
+                break
+            if row.get("pinned"):
+                continue
+            prune.append(row)
+            total -= row["size"] or 0
+            for digest in chunks.get(row["filename"], {}):
+                refs[digest] -= 1
+                if not refs[digest]:
+                    total -= chunk_sizes[digest]
+    doomed = {row["filename"] for row in prune}
+    needed = set()
+    for row in rows:
+        if row["filename"] not in doomed:
+            needed.update(json.loads(row.get("delta_refs") or "[]"))
+    prune = [row for row in prune if row["filename"] not in needed]
+    return sorted(prune, key=lambda row: (row["number"] or 0, row["created"] or 0))
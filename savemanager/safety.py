@@ -0,0 +1,95 @@
+"""
+Fast safety backups.
+
+With SAFETY mode "snapshot" a restore doesn't compress SOURCE_FOLDER into
+SAFETY_BACKUP first. The source tree it replaces is kept as it is: a staged
+restore renames the swapped out folder into the safety folder, an in-place
+or partial restore links the source into it first (reflink/hardlink, see
+staging.link_tree). Either way it costs no file data. undo() swaps it back
+in one rename. The engine compresses it into SAFETY_BACKUP once it is
+compress_after_min old and removes it, unless it was undone or replaced by
+the next restore before that.
+
+Hardlinked files share their data with the live tree: a file the game
+rewrites in place (instead of replacing it) changes in the snapshot too,
+until it is compressed. Reflinks don't have that problem.
+"""
+import json
+import os
+import shutil
+import time
+
+from savemanager.staging import link_tree, swap
+
+
+SAFETY_MODES = ("snapshot", "archive")
+INFO_NAME = "info.json"
+
+DEFAULT_SAFETY = {
+    # "snapshot" keeps the replaced tree, "archive" compresses it before restoring
+    "mode": "snapshot",
+    # snapshots are compressed into SAFETY_BACKUP after this many minutes
+    "compress_after_min": 10,
+}
+
+
+def resolve_safety(setting) -> dict:
+    return {**DEFAULT_SAFETY, **(setting or {})}
+
+
+class SafetySnapshot:
+    def __init__(self, source: str):
+        self.source = os.path.normpath(source)
+        parent, base = os.path.split(self.source)
+        # next to the source, so keeping or undoing is a rename
+        self.container = os.path.join(parent, f".eakse_safety_{base}")
+        # same name as the source, so it archives like the source would
+        self.path = os.path.join(self.container, base)
+
+    def info(self):
+        """{"created", "restored"} of the snapshot, None if there is none."""
+        try:
+            with open(os.path.join(self.container, INFO_NAME)) as infile:
+                info = json.load(infile)
+        except (OSError, ValueError):
+            return None
+        return info if os.path.isdir(self.path) else None
+
+    def _start(self, restored: str):
+        self.discard()
+        os.makedirs(self.container)
+        with open(os.path.join(self.container, INFO_NAME), "w") as outfile:
+            json.dump({"created": time.time(), "restored": restored}, outfile)
+
+    def keep(self, tree: str, restored: str):
+        """Move tree (an old source swapped out by a staged restore) in."""
+        self._start(restored)
+        if os.path.isdir(tree):
+            os.rename(tree, self.path)
+        else:
+            # there was no source, undo leaves an empty one
+            os.makedirs(self.path)
+
+    def link(self, restored: str, check=None) -> dict:
+        """Snapshot the source as it is now, before an in-place restore."""
+        self._start(restored)
+        os.makedirs(self.path)
+        try:
+            return link_tree(self.source, self.path, check)
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        if os.path.lexists(self.container):
+            shutil.rmtree(self.container)
+
+    def undo(self):
+        """Swap the snapshot back in for the source and drop what was restored."""
+        if self.info() is None:
+            raise ValueError("There is no restore to undo")
+        if os.path.lexists(self.source):
+            swap(self.source, self.path)
+        else:
+            os.rename(self.path, self.source)
+        self.discard()
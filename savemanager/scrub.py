@@ -0,0 +1,173 @@
+"""
+Backup verification and scrubbing.
+
+verify_file() checks one backup: the stored archive checksum, then every
+member's CRC (7z/zip testzip, tar.zst frame checksums) or every chunk hash of
+a manifest. All of it is streamed, nothing is extracted to disk. Scrubber
+runs it for many backups on a process pool whose workers run at low
+priority and are throttled to an average read rate (both passes read
+through the throttle), so a scrub doesn't starve a running game. Workers
+are spawned, not forked: the GUI and the daemon have threads running.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from savemanager.catalog import CHECKSUM_BUFSIZE
+from savemanager.chunkstore import ChunkStore, MANIFEST_EXT
+from savemanager.compression import get_backend
+
+
+DEFAULT_SCRUB = {
+    # parallel verifier processes
+    "workers": 2,
+    # average read rate per worker in MB/s, 0 for unthrottled
+    "max_mb_s": 50,
+    # backups verified more recently than this are skipped
+    "max_age_days": 7,
+    # automatic scrub interval for the GUI/daemon, 0 is off
+    "interval_hours": 0,
+}
+
+
+def resolve_scrub(setting) -> dict:
+    return {**DEFAULT_SCRUB, **(setting or {})}
+
+
+class Throttle:
+    """Sleeps just enough to keep the average rate at max_bytes_s."""
+
+    def __init__(self, max_bytes_s: float):
+        self.max_bytes_s = max_bytes_s
+        self.started = time.monotonic()
+        self.done = 0
+
+    def add(self, nbytes: int):
+        if not self.max_bytes_s:
+            return
+        self.done += nbytes
+        ahead = self.done / self.max_bytes_s - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class ThrottledReader(io.RawIOBase):
+    """Read-only file whose reads are counted against a Throttle."""
+
+    def __init__(self, path: str, throttle: Throttle):
+        self.raw = open(path, "rb", buffering=0)
+        self.name = path
+        self.throttle = throttle
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self.raw.readinto(buffer)
+        if count:
+            self.throttle.add(count)
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def throttled_checksum(path: str, throttle: Throttle) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as infile:
+        while True:
+            data = infile.read(CHECKSUM_BUFSIZE)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+            throttle.add(len(data))
+
+
+def verify_file(path: str, checksum, options: dict, max_mb_s: float = 0):
+    """Return (ok, message) for the backup at path."""
+    if not os.path.exists(path):
+        return False, "missing"
+    throttle = Throttle(max_mb_s * 1024 * 1024)
+    try:
+        if checksum and throttled_checksum(path, throttle) != checksum:
+            return False, "checksum mismatch"
+        if path.endswith(MANIFEST_EXT):
+            bad = ChunkStore(os.path.dirname(path)).verify(path, on_read=throttle.add)
+        else:
+            with io.BufferedReader(ThrottledReader(path, throttle), CHECKSUM_BUFSIZE) as reader:
+                bad = get_backend(path, options).test(reader)
+    except Exception as e:
+        return False, f"unreadable: {e}"
+    if bad is not None:
+        return False, f"bad member: {bad}"
+    return True, "ok"
+
+
+def _low_priority():
+    """Pool initializer: be nice to the game."""
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        # not available on Windows
+        pass
+
+
+class Scrubber:
+    def __init__(self, workers: int = 2, max_mb_s: float = 0, check=None):
+        self.workers = max(1, min(workers, os.cpu_count() or 1))
+        self.max_mb_s = max_mb_s
+        self.check = check
+
+    def run(self, jobs: list, options: dict, on_result):
+        """
+        jobs are (filename, path, checksum), on_result(filename, ok, message)
+        is called in the calling thread as results come in.
+        """
+        if not jobs:
+            return
+        pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_low_priority,
+        )
+        finished = False
+        try:
+            pending = {
+                pool.submit(verify_file, path, checksum, options, self.max_mb_s): filename
+                for filename, path, checksum in jobs
+            }
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if self.check is not None:
+                    self.check()
+                for future in done:
+                    filename = pending.pop(future)
+                    try:
+                        ok, message = future.result()
+                    except Exception as e:
+                        ok, message = False, f"verifier failed: {e}"
+                    on_result(filename, ok, message)
+            finished = True
+        finally:
+            if not finished:
+                # cancelled: stop the running verifies instead of letting them
+                # read to the end, a worker holds no state worth keeping
+                processes = list((pool._processes or {}).values())
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.join()
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,280 @@
+"""
+Settings file shared by the GUI, the CLI and the daemon.
+
+Settings are checked against DEFAULT_SETTINGS when loaded: missing keys and
+values of the wrong type get the default, dict settings get the default
+keys they lack. SettingsStore keeps them in memory and writes them behind:
+changes within `delay` seconds are coalesced into one atomic write (temp
+file, fsync, rename) on a timer thread.
+
+PROFILES holds one dict per game: its PROFILE_KEYS plus any setting it
+overrides. profile_settings() layers a profile over the top level settings,
+everything a profile doesn't set is shared.
+"""
+import copy
+import json
+import os
+import threading
+from collections import ChainMap
+
+
+SETTINGS_FILENAME = "./savemanager_settings.json"
+
+DEFAULT_SETTINGS = {
+    "FILE_EXT": ".7z",
+    "FILE_NAME": "BACKUP_",
+    "FILE_ENU": "",
+    "SOURCE_FOLDER": "./",
+    "DEST_FOLDER": "./",
+    "APP_PATH": "",
+    "SHOW_DEBUG": True,
+    # DEBUG, INFO, WARNING or ERROR (SHOW_DEBUG forces DEBUG)
+    "LOG_LEVEL": "INFO",
+    # rotating log file, empty for none
+    "LOG_FILE": "",
+    "X_POS": 0,
+    "Y_POS": 0,
+    "SAFETY_BACKUP": "SAFETY_BACKUP.7z",
+    "MAKE_BACKUP": True,
+    # how MAKE_BACKUP keeps the save a restore replaces: "snapshot" keeps the
+    # folder itself (instant, undoable, compressed to SAFETY_BACKUP after
+    # compress_after_min) or "archive" compresses it first (see savemanager.safety)
+    "SAFETY": {"mode": "snapshot", "compress_after_min": 10},
+    # "staged" restores into a sibling folder that is swapped in when done,
+    # "inplace" changes SOURCE_FOLDER directly (partial restores always do)
+    "RESTORE_MODE": "staged",
+    # "7z" writes full archives, "chunks" writes deduplicated manifests
+    "BACKUP_FORMAT": "7z",
+    # "direct" (read from source), "link" (reflink/hardlink) or "copy"
+    "SNAPSHOT_MODE": "direct",
+    # parallel copy threads (copy snapshots), 0 picks one from the disk type
+    "COPY_WORKERS": 0,
+    # preset name ("fastest", "balanced", "smallest", "store") plus overrides,
+    # "native": "auto"/"off"/path of 7zz picks the 7-Zip program for 7z archives
+    "COMPRESSION": {"preset": "balanced"},
+    # when the source didn't change since the latest backup: "skip" it,
+    # "alias" (hardlink the latest backup under the new name) or "off"
+    "SKIP_UNCHANGED": "skip",
+    # compare file contents (hashes cached by inode, size and mtime) instead
+    # of mtimes, so files that were only touched don't count as changed
+    "FINGERPRINT_HASH": False,
+    # "" (off), "summary" (log a table after each backup/restore), "chrome"
+    # (write TRACE_FILE for chrome://tracing) or "summary,chrome"
+    "TRACE": "",
+    "TRACE_FILE": "./savemanager_trace.json",
+    # pruning after each backup, 0 disables a rule (see savemanager.retention)
+    "RETENTION": {"keep_last": 0, "hourly": 0, "daily": 0, "weekly": 0, "max_size_gb": 0},
+    # binary deltas of big files against the previous backup (7z/zip only),
+    # min_size_mb 0 is off, see savemanager.delta
+    "DELTA": {"min_size_mb": 0, "keyframe_every": 8, "block_kb": 64, "max_changed": 0.5},
+    # background verification, see savemanager.scrub: interval_hours > 0
+    # re-verifies backups older than max_age_days while the GUI/daemon runs
+    "SCRUB": {"workers": 2, "max_mb_s": 50, "max_age_days": 7, "interval_hours": 0},
+    # the profile the GUI shows and the CLI uses without --profile
+    "PROFILE": "default",
+    # profile name -> its own settings, see profile_settings()
+    "PROFILES": {},
+    # running backups/restores/verifies across all profiles, 0 is no limit
+    "JOBS": {"max_jobs": 2, "max_per_device": 1},
+}
+
+# every profile has its own value of these
+PROFILE_KEYS = ("SOURCE_FOLDER", "DEST_FOLDER", "APP_PATH")
+# a profile can't override these
+SHARED_KEYS = ("PROFILE", "PROFILES", "JOBS", "X_POS", "Y_POS")
+
+
+# types allowed besides the default's own
+EXTRA_TYPES = {
+    # a bare preset name
+    "COMPRESSION": (str,),
+}
+
+
+def _valid(value, default, extra=()) -> bool:
+    if isinstance(default, bool) or isinstance(value, bool):
+        return isinstance(value, type(default)) or isinstance(value, extra)
+    # ints and floats are interchangeable
+    if isinstance(default, (int, float)) and isinstance(value, (int, float)):
+        return True
+    return isinstance(value, (type(default), *extra))
+
+
+def validate(raw: dict, log=None) -> dict:
+    """Settings from raw with defaults filled in and wrong types replaced."""
+    settings = {}
+    for key, default in DEFAULT_SETTINGS.items():
+        value = raw.get(key, default)
+        if not _valid(value, default, EXTRA_TYPES.get(key, ())):
+            if log is not None:
+                log(f"Setting {key} = {value!r} is not a {type(default).__name__}, using {default!r}")
+            value = default
+        if isinstance(default, dict) and isinstance(value, dict):
+            checked = dict(value)
+            for name, sub_default in default.items():
+                if name in value and not _valid(value[name], sub_default):
+                    if log is not None:
+                        log(f"Setting {key}.{name} = {value[name]!r} is invalid, using {sub_default!r}")
+                    del checked[name]
+            # COMPRESSION overrides a preset, its missing keys come from there
+            value = checked if key == "COMPRESSION" else {**default, **checked}
+        settings[key] = value
+    # keep keys of newer versions, they are written back unchanged
+    for key, value in raw.items():
+        settings.setdefault(key, value)
+    _validate_profiles(settings, log)
+    return settings
+
+
+def _validate_profiles(settings: dict, log=None):
+    profiles = settings["PROFILES"]
+    for name, profile in list(profiles.items()):
+        if not isinstance(profile, dict):
+            if log is not None:
+                log(f"Profile {name} is not a dict, dropped")
+            del profiles[name]
+            continue
+        for key, value in list(profile.items()):
+            default = DEFAULT_SETTINGS.get(key)
+            if key in SHARED_KEYS:
+                problem = "can't be set per profile"
+            elif default is not None and not _valid(value, default, EXTRA_TYPES.get(key, ())):
+                problem = "is invalid"
+            else:
+                continue
+            if log is not None:
+                log(f"Setting {key} = {value!r} of profile {name} {problem}, ignored")
+            del profile[key]
+        for key in PROFILE_KEYS:
+            profile.setdefault(key, settings[key])
+    if not profiles:
+        # the folders of settings from before profiles become the first one
+        profiles[settings["PROFILE"]] = {key: settings[key] for key in PROFILE_KEYS}
+    if settings["PROFILE"] not in profiles:
+        settings["PROFILE"] = next(iter(profiles))
+
+
+def new_profile() -> dict:
+    return {key: DEFAULT_SETTINGS[key] for key in PROFILE_KEYS}
+
+
+def profile_settings(settings: dict, name: str) -> ChainMap:
+    """
+    Settings of profile name: its own keys first, the shared ones for the
+    rest. Writes go to the profile, changes of either are seen immediately.
+    """
+    return ChainMap(settings["PROFILES"][name], settings)
+
+
+def load_settings(filename: str = SETTINGS_FILENAME, log=None) -> dict:
+    """Load and validate a settings file, defaults if there is none."""
+    raw = {}
+    if os.path.exists(filename):
+        with open(filename) as infile:
+            raw = json.load(infile)
+    return validate(raw, log)
+
+
+def save_settings(settings: dict, filename: str = SETTINGS_FILENAME):
+    """Write settings atomically: a crash leaves the old or the new file."""
+    data = json.dumps(settings, indent=4).encode("utf-8")
+    folder = os.path.dirname(os.path.abspath(filename))
+    tmp = os.path.join(folder, f".{os.path.basename(filename)}.tmp{os.getpid()}")
+    try:
+        with open(tmp, "wb") as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class SettingsStore:
+    """In-memory settings with debounced write-behind to one file."""
+
+    def __init__(self, filename: str = SETTINGS_FILENAME, delay: float = 1.0, log=print):
+        """log(text) reports validation problems and failed writes."""
+        self.filename = filename
+        self.delay = delay
+        self.log = log
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.written = None
+        self.created = not os.path.exists(filename)
+        try:
+            self.settings = load_settings(filename, log)
+        except (OSError, ValueError) as e:
+            log(f"Can't read {filename} ({e}), using defaults")
+            self.settings = validate({})
+        if self.created:
+            self.flush()
+        else:
+            self.written = copy.deepcopy(self.settings)
+
+    def __getitem__(self, key: str):
+        return self.settings[key]
+
+    def set(self, key: str, value):
+        """Change one setting, written with the next flush."""
+        self.update({key: value})
+
+    def update(self, changes: dict):
+        with self.lock:
+            changed = any(self.settings.get(key) != value for key, value in changes.items())
+            self.settings.update(changes)
+        if changed:
+            self.schedule()
+
+    def set_profile(self, name: str, key: str, value):
+        """Change one setting of profile name."""
+        with self.lock:
+            profile = self.settings["PROFILES"][name]
+            changed = profile.get(key) != value
+            profile[key] = value
+        if changed:
+            self.schedule()
+
+    def add_profile(self, name: str, profile: dict):
+        with self.lock:
+            self.settings["PROFILES"][name] = profile
+        self.schedule()
+
+    def remove_profile(self, name: str):
+        with self.lock:
+            self.settings["PROFILES"].pop(name, None)
+        self.schedule()
+
+    def schedule(self):
+        """Flush after `delay` seconds without further changes."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """Write now if anything changed since the last write."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            # profiles are nested dicts that change in place
+            data = copy.deepcopy(self.settings)
+        with self.write_lock:
+            if data == self.written:
+                return
+            try:
+                save_settings(data, self.filename)
+                self.written = data
+            except OSError as e:
+                self.log(f"Can't save settings to {self.filename}: {e}")
+
+    def close(self):
+        self.flush()
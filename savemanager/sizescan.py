@@ -0,0 +1,130 @@
+"""
+Incremental directory size scanner.
+
+Per-directory file totals are cached together with the directory's mtime_ns.
+When a directory's mtime is unchanged its files are not stat'ed again, only
+its subdirectories are checked. Since overwriting a file in place doesn't
+touch the directory mtime, cached listings also expire after `max_age`
+seconds and can be dropped with invalidate() after a restore.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from savemanager import trace
+
+
+MAX_AGE = 60.0
+LARGEST = 5
+
+DirCache = namedtuple("DirCache", "mtime_ns scanned files_size files_count subdirs")
+ScanResult = namedtuple("ScanResult", "path size count largest")
+
+
+class SizeScanner:
+    def __init__(self, max_age: float = MAX_AGE):
+        self.max_age = max_age
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self, path: str):
+        path = os.path.normpath(path)
+        with self.lock:
+            for key in [k for k in self.cache if k == path or k.startswith(path + os.sep)]:
+                del self.cache[key]
+
+    def scan(self, path: str) -> ScanResult:
+        """Return total size, file count and the largest direct subdirectories."""
+        path = os.path.normpath(path)
+        now = time.monotonic()
+        with trace.span("walk") as span:
+            size, count, children = self._scan_dir(path, now)
+            span.add(size)
+        largest = sorted(children.items(), key=lambda item: item[1], reverse=True)
+        return ScanResult(path, size, count, largest[:LARGEST])
+
+    def _scan_dir(self, path: str, now: float):
+        """Return (size, count, {subdir name: size}) for path, recursively."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0, 0, {}
+        with self.lock:
+            cached = self.cache.get(path)
+        if (
+            cached is None
+            or cached.mtime_ns != mtime_ns
+            or now - cached.scanned > self.max_age
+        ):
+            files_size = 0
+            files_count = 0
+            subdirs = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.name)
+                            elif entry.is_file(follow_symlinks=False):
+                                files_size += entry.stat(follow_symlinks=False).st_size
+                                files_count += 1
+                        except OSError:
+                            # vanished while scanning
+                            pass
+            except OSError:
+                pass
+            cached = DirCache(mtime_ns, now, files_size, files_count, tuple(subdirs))
+            with self.lock:
+                self.cache[path] = cached
+        size = cached.files_size
+        count = cached.files_count
+        children = {}
+        for name in cached.subdirs:
+            sub_size, sub_count, _ = self._scan_dir(os.path.join(path, name), now)
+            size += sub_size
+            count += sub_count
+            children[name] = sub_size
+        return size, count, children
+
+
+class BackgroundSizeScanner:
+    """
+    Runs SizeScanner on its own thread. Requests are coalesced: only the
+    latest requested path is scanned, on_result(ScanResult) is called from
+    the scanner thread.
+    """
+
+    def __init__(self, on_result, log=print, max_age: float = MAX_AGE, scanner=None):
+        self.scanner = scanner or SizeScanner(max_age)
+        self.on_result = on_result
+        self.log = log
+        self.wakeup = threading.Event()
+        self.pending = None
+        self.thread = None
+        self.last = None
+
+    def request(self, path: str):
+        self.pending = path
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name="savemanager-sizescan", daemon=True
+            )
+            self.thread.start()
+        self.wakeup.set()
+
+    def invalidate(self, path: str):
+        self.scanner.invalidate(path)
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            path, self.pending = self.pending, None
+            if path is None:
+                continue
+            try:
+                self.last = self.scanner.scan(path)
+                self.on_result(self.last)
+            except Exception as e:
+                self.log(f"Error scanning {path}: {e}")
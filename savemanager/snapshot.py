@@ -0,0 +1,209 @@
+"""
+Source snapshots for create_backup.
+
+"direct" archives straight from SOURCE_FOLDER and re-checks size/mtime_ns of
+every file after it has been read, "link" first builds a reflink/hardlink tree
+next to the source (constant extra space), "copy" is a full temporary copy
+(parallel, see eakse.quickcopy). Snapshot roots keep the source's name, so
+a program archiving the root as a whole names members like the source would.
+"""
+import io
+import os
+import shutil
+import tempfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from eakse.quickcopy import FastCopy, copy_file
+from savemanager import trace
+
+
+SNAPSHOT_MODES = ("direct", "link", "copy")
+# files up to this size are read into memory and re-read until consistent,
+# bigger files are streamed and pinned to a private copy if they changed.
+SPOOL_LIMIT = 8 * 1024 * 1024
+RETRIES = 3
+FICLONE = 0x40049409  # linux ioctl, btrfs/xfs/bcachefs copy-on-write clone
+
+SourceEntry = namedtuple("SourceEntry", "path relpath stat")
+
+
+def same_stat(a: os.stat_result, b: os.stat_result) -> bool:
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+def reflink(src: str, dst: str):
+    import fcntl
+
+    with open(src, "rb") as infile, open(dst, "wb") as outfile:
+        fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+
+
+def clone_file(src: str, dst: str) -> str:
+    """Snapshot a single file as cheaply as possible, return the method used."""
+    try:
+        reflink(src, dst)
+        shutil.copystat(src, dst)
+        return "reflink"
+    except Exception:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    copy_file(src, dst)
+    return "copy"
+
+
+class Snapshot:
+    def __init__(
+        self, source: str, mode: str = "direct", log=print, retries=RETRIES, copy_workers=0
+    ):
+        if mode not in SNAPSHOT_MODES:
+            raise ValueError(f"Unknown snapshot mode: {mode}")
+        self.source = os.path.normpath(source)
+        self.mode = mode
+        self.log = log
+        self.retries = retries
+        self.copy_workers = copy_workers
+        self.root = self.source
+        self.tmp_directory = None
+        self.pin_directory = None
+        self.pinned = {}
+
+    def __enter__(self):
+        if self.mode == "link":
+            # sibling of the source so links stay on the same filesystem
+            self.tmp_directory = tempfile.mkdtemp(
+                prefix=".eakse_snap_", dir=os.path.dirname(self.source)
+            )
+            self.root = os.path.join(self.tmp_directory, os.path.basename(self.source))
+            os.makedirs(self.root)
+            methods = {}
+            with trace.span("link"):
+                for entry in self._walk(self.source):
+                    target = os.path.join(self.root, entry.relpath)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    method = clone_file(entry.path, target)
+                    methods[method] = methods.get(method, 0) + 1
+            self.log(
+                "Snapshot created: "
+                + ", ".join(f"{cnt} {method}" for method, cnt in methods.items())
+            )
+        elif self.mode == "copy":
+            self.tmp_directory = tempfile.mkdtemp(prefix="eakse_")
+            self.root = os.path.join(self.tmp_directory, os.path.basename(self.source))
+            with trace.span("copy") as span:
+                stats = FastCopy(self.copy_workers).copytree(self.source, self.root)
+                span.add(stats["bytes"])
+            self.log(f"Snapshot created: copied {stats['files']} files")
+        return self
+
+    def __exit__(self, *exc):
+        for directory in (self.tmp_directory, self.pin_directory):
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.tmp_directory = None
+        self.pin_directory = None
+        return False
+
+    def _walk(self, root: str):
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # deleted while walking
+                    continue
+                yield SourceEntry(path, os.path.relpath(path, root), st)
+
+    def entries(self):
+        return self._walk(self.root)
+
+    def dirs(self):
+        """
+        SourceEntry of the source folder and every folder in it, empty ones
+        too (relpath "" is the source itself). Read from the source, link
+        snapshots only have the folders that hold files.
+        """
+        for dirpath, dirnames, _ in os.walk(self.source):
+            dirnames.sort()
+            try:
+                st = os.stat(dirpath)
+            except OSError:
+                # deleted while walking
+                continue
+            relpath = os.path.relpath(dirpath, self.source)
+            yield SourceEntry(dirpath, "" if relpath == "." else relpath, st)
+
+    def open(self, entry: SourceEntry):
+        """
+        Return (binary file object, stat before reading) for an entry.
+        Small files are read into memory until two stats agree, big files are
+        returned as an open file and must be checked with changed() after use.
+        """
+        path = self.pinned.get(entry.relpath, entry.path)
+        with trace.span("read", entry.stat.st_size):
+            return self._open(entry, path)
+
+    def _open(self, entry: SourceEntry, path: str):
+        for _ in range(self.retries):
+            infile = open(path, "rb")
+            before = os.fstat(infile.fileno())
+            if before.st_size > SPOOL_LIMIT:
+                return infile, before
+            with infile:
+                data = infile.read()
+                after = os.fstat(infile.fileno())
+            if same_stat(before, after) and len(data) == after.st_size:
+                return io.BytesIO(data), before
+        self.log(f"File kept changing while reading: {entry.path}")
+        return io.BytesIO(data), after
+
+    def prefetch(self, workers: int):
+        """
+        Yield (entry, fileobj, before) like entries() + open(), with the reads
+        running ahead on a thread pool so disk latency overlaps compression.
+        """
+        window = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for entry in self.entries():
+                    window.append((entry, pool.submit(trace.bind(self.open), entry)))
+                    if len(window) > workers * 2:
+                        entry, future = window.popleft()
+                        yield (entry, *future.result())
+                while window:
+                    entry, future = window.popleft()
+                    yield (entry, *future.result())
+            finally:
+                # generator closed early (cancel/error): close what was opened
+                for _, future in window:
+                    try:
+                        future.result()[0].close()
+                    except Exception:
+                        pass
+
+    def changed(self, fileobj, before: os.stat_result) -> bool:
+        if isinstance(fileobj, io.BytesIO):
+            return False
+        return not same_stat(before, os.fstat(fileobj.fileno()))
+
+    def pin(self, entry: SourceEntry):
+        """Replace an entry with a short private copy taken while it is stable."""
+        if self.pin_directory is None:
+            self.pin_directory = tempfile.mkdtemp(prefix="eakse_pin_")
+        target = os.path.join(self.pin_directory, entry.relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        for _ in range(self.retries):
+            before = os.stat(entry.path)
+            copy_file(entry.path, target)
+            if same_stat(before, os.stat(entry.path)):
+                break
+        self.pinned[entry.relpath] = target
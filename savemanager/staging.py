@@ -0,0 +1,129 @@
+"""
+Staged restores.
+
+A full restore doesn't touch SOURCE_FOLDER until it is done: StagedTree
+builds a sibling folder with the current files linked in (reflink, hardlink
+or, where neither works, copy), the restore runs against that folder, and
+commit() swaps it in with one atomic rename (renameat2 RENAME_EXCHANGE on
+Linux, two renames elsewhere). If anything fails before that, the staging
+folder is removed and the source is exactly as it was.
+
+Restores into a staged tree must replace files instead of writing into
+them, a linked file still shares its data with the source.
+"""
+import ctypes
+import errno
+import os
+import shutil
+import tempfile
+
+from savemanager.snapshot import clone_file
+from savemanager import trace
+
+
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+_renameat2 = None
+
+
+def _libc_renameat2():
+    global _renameat2
+    if _renameat2 is None:
+        try:
+            _renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+            _renameat2.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint,
+            ]
+        except (OSError, AttributeError):
+            # not glibc/Linux
+            _renameat2 = False
+    return _renameat2
+
+
+def exchange(a: str, b: str) -> bool:
+    """Atomically swap paths a and b, False if the OS/filesystem can't."""
+    renameat2 = _libc_renameat2()
+    if not renameat2:
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(err, os.strerror(err), a)
+
+
+def swap(live: str, staged: str):
+    """Put staged at live and the old live at staged."""
+    if exchange(live, staged):
+        return
+    aside = f"{staged}.old"
+    os.rename(live, aside)
+    try:
+        os.rename(staged, live)
+    except OSError:
+        os.rename(aside, live)
+        raise
+    os.rename(aside, staged)
+
+
+def link_tree(source: str, target: str, check=None) -> dict:
+    """Clone every file below source to target, return {method: count}."""
+    methods = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        if check is not None:
+            check()
+        folder = os.path.join(target, os.path.relpath(dirpath, source))
+        os.makedirs(folder, exist_ok=True)
+        for name in filenames:
+            method = clone_file(os.path.join(dirpath, name), os.path.join(folder, name))
+            methods[method] = methods.get(method, 0) + 1
+    return methods
+
+
+class StagedTree:
+    def __init__(self, source: str, log=print, check=None):
+        self.source = os.path.normpath(source)
+        self.parent, self.base = os.path.split(self.source)
+        self.log = log
+        self.check = check
+        self.directory = None
+        # restore into this, it has the source's name
+        self.path = None
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix=".eakse_restore_", dir=self.parent or None)
+        self.path = os.path.join(self.directory, self.base)
+        os.makedirs(self.path)
+        with trace.span("stage"):
+            methods = link_tree(self.source, self.path, self.check)
+        if methods:
+            self.log(
+                "Staging folder created: "
+                + ", ".join(f"{cnt} {method}" for method, cnt in methods.items())
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        return False
+
+    def commit(self):
+        """
+        Swap every restored top level folder into the source's parent, the
+        old source is at self.path afterwards (until the context exits).
+        """
+        with trace.span("swap"):
+            for name in os.listdir(self.directory):
+                staged = os.path.join(self.directory, name)
+                live = os.path.join(self.parent, name)
+                if os.path.lexists(live):
+                    swap(live, staged)
+                else:
+                    os.rename(staged, live)
@@ -0,0 +1,172 @@
+"""
+Low-overhead tracing spans.
+
+    with trace.span("extract", nbytes=size):
+        ...
+
+or, where a with-block doesn't fit:
+
+    started = trace.start()
+    ...
+    trace.record("finalize", started, nbytes)
+
+Spans go to the Trace active in the current context, so jobs running at the
+same time each get their own:
+
+    with trace.Trace() as recorded:
+        ...
+    print(trace.summary(recorded.finish()))
+
+Work handed to a thread pool records into it through trace.bind(func).
+Outside a Trace span() returns one shared no-op object and start()/record()
+return right away, so instrumented code costs a context variable lookup and
+a call. Recorded spans can be exported as a Chrome trace (chrome://tracing,
+Perfetto) or summarised as a table.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+
+
+_current = contextvars.ContextVar("savemanager_trace", default=None)
+_pid = os.getpid()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, nbytes: int):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "nbytes", "args", "started")
+
+    def __init__(self, name: str, nbytes: int = 0, args=None):
+        self.name = name
+        self.nbytes = nbytes
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.started, self.nbytes, self.args)
+        return False
+
+    def add(self, nbytes: int):
+        self.nbytes += nbytes
+
+
+class Trace:
+    """Spans of one operation, recorded while it is active (a with-block)."""
+
+    def __init__(self):
+        self.events = []
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+    def finish(self) -> list:
+        """Return the recorded spans and forget them."""
+        # swap, not copy + clear: a straggling thread may still append
+        events, self.events = self.events, []
+        return events
+
+
+def current():
+    """The active Trace, None if nothing is traced."""
+    return _current.get()
+
+
+def bind(func):
+    """func, recording into the active Trace from whichever thread calls it."""
+    active = _current.get()
+    if active is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _current.set(active)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return bound
+
+
+def span(name: str, nbytes: int = 0, **args):
+    if _current.get() is None:
+        return NULL_SPAN
+    return Span(name, nbytes, args or None)
+
+
+def start() -> int:
+    return 0 if _current.get() is None else time.perf_counter_ns()
+
+
+def record(name: str, started: int, nbytes: int = 0, args=None):
+    active = _current.get()
+    if active is None or not started:
+        return
+    # list.append is atomic, no lock needed on the hot path
+    active.events.append(
+        (name, started, time.perf_counter_ns() - started, threading.get_ident(), nbytes, args)
+    )
+
+
+def export_chrome(filename: str, events: list):
+    """Write recorded spans (Trace.finish()) as a Chrome trace event file."""
+    trace_events = []
+    for name, started, duration, tid, nbytes, args in events:
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": started / 1000,
+            "dur": duration / 1000,
+            "pid": _pid,
+            "tid": tid,
+        }
+        if nbytes or args:
+            event["args"] = {**(args or {}), **({"bytes": nbytes} if nbytes else {})}
+        trace_events.append(event)
+    with open(filename, "w") as outfile:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, outfile)
+
+
+def summary(events: list) -> str:
+    """Per span name of events: count, total/mean/max time, bytes and throughput."""
+    totals = {}
+    for name, _, duration, _, nbytes, _ in events:
+        count, total, longest, size = totals.get(name, (0, 0, 0, 0))
+        totals[name] = (count + 1, total + duration, max(longest, duration), size + nbytes)
+    lines = [
+        f"{'span':<16}{'count':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'MB':>10}{'MB/s':>10}"
+    ]
+    for name, (count, total, longest, size) in sorted(
+        totals.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        seconds = total / 1e9
+        megabytes = size / (1024 * 1024)
+        rate = f"{megabytes / seconds:10.1f}" if size and seconds else f"{'':>10}"
+        lines.append(
+            f"{name:<16}{count:>8}{seconds:>10.3f}{total / count / 1e6:>10.2f}"
+            f"{longest / 1e6:>10.2f}{megabytes:>10.1f}{rate}"
+        )
+    return "\n".join(lines)
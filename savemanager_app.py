@@ -1,43 +1,299 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, scrolledtext
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import os
-import py7zr
-import json
 from datetime import datetime
-import time
-from shutil import copytree, rmtree
-import eakse
-from eakse.util import dump_args # type: ignore
+import threading
 from eakse.theme import apply_dark_theme
 from eakse.spawn_subprocess import start_executable
-import tempfile
+from savemanager.engine import BackupEngine, sizeof_fmt
+from savemanager.jobs import AUTOMATIC, MANUAL, JobCancelled, JobScheduler
+from savemanager.scrub import resolve_scrub
+from savemanager.settings import (
+    DEFAULT_SETTINGS,
+    SETTINGS_FILENAME,
+    SettingsStore,
+    new_profile,
+    profile_settings,
+)
+from savemanager.sizescan import BackgroundSizeScanner
+from savemanager.metadata import MetadataLoader
+from savemanager.logpipe import DEBUG, ERROR, INFO, WARNING, LogPipeline, PrefixedLog
+
+
+class ArchiveBrowser:
+    """Toplevel tree of one backup, folders are filled in when opened."""
+
+    def __init__(self, app, profile: str, path: str, listing):
+        self.app = app
+        # restores go to this profile even if the app switched to another
+        self.profile = profile
+        self.path = path
+        self.listing = listing
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"Browse {os.path.basename(path)} ({profile})")
+        frame = ttk.Frame(self.window)
+        frame.pack(fill="both", expand=True, padx=6, pady=6)
+        self.tree = ttk.Treeview(frame, columns=("size",), height=20, selectmode="extended")
+        self.tree.heading("#0", text="Name")
+        self.tree.heading("size", text="Size")
+        self.tree.column("#0", width=420)
+        self.tree.column("size", width=100, anchor="e")
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.config(yscrollcommand=scrollbar.set)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        buttons = ttk.Frame(self.window)
+        buttons.pack(fill="x", padx=6, pady=(0, 6))
+        self.restore_btn = ttk.Button(
+            buttons, text="RESTORE SELECTED", command=self.on_restore_selected
+        )
+        self.restore_btn.pack(side="left")
+        self.fill("")
+
+    def fill(self, parent: str):
+        # item ids are archive names, "" is the root
+        for name, is_dir, size in self.listing.list(parent):
+            label = name.rpartition("/")[2]
+            self.tree.insert(
+                parent, "end", iid=name, text=label, values=(sizeof_fmt(size or 0),)
+            )
+            if is_dir and self.listing.children.get(name):
+                # placeholder so the folder can be opened
+                self.tree.insert(name, "end", iid=f"{name}//")
+
+    def on_open(self, event=None):
+        name = self.tree.focus()
+        if self.tree.exists(f"{name}//"):
+            self.tree.delete(f"{name}//")
+            self.fill(name)
+
+    def on_restore_selected(self):
+        targets = [name for name in self.tree.selection() if not name.endswith("//")]
+        if not targets:
+            return
+        self.app.submit(
+            "restore selection",
+            self.app.engine_for(self.profile).restore_paths,
+            self.path,
+            targets,
+            self.app.make_backup_var.get(),
+            profile=self.profile,
+            on_done=self.app.on_job_done,
+        )
+
+
+class BackupList:
+    """
+    Backup list that only has Treeview items for the rows in view: the names
+    are kept in a list and scrolling moves `height` item slots over it. The
+    metadata columns of the rows shown are requested with on_need(names) and
+    filled in by set_details() as they arrive.
+    """
+
+    columns = (
+        ("number", "#", 50, "e"),
+        ("date", "Date", 130, "w"),
+        ("size", "Size", 90, "e"),
+        ("source_size", "Source size", 90, "e"),
+        ("files", "Files", 70, "e"),
+        ("verified", "Verified", 180, "w"),
+    )
+
+    def __init__(self, parent, height: int, on_need):
+        self.height = height
+        self.on_need = on_need
+        self.names = []
+        self.positions = {}
+        # name -> column values, complete once nothing more will be loaded
+        self.details = {}
+        self.complete = set()
+        self.pinned = set()
+        self.top = 0
+        self.selected = None
+        # incomplete rows in view that were last asked for
+        self.wanted = ()
+        self.tree = ttk.Treeview(
+            parent,
+            columns=[column[0] for column in self.columns],
+            height=height,
+            selectmode="browse",
+        )
+        self.tree.heading("#0", text="Backup")
+        self.tree.column("#0", width=260)
+        for name, text, width, anchor in self.columns:
+            self.tree.heading(name, text=text)
+            self.tree.column(name, width=width, anchor=anchor)
+        self.tree.tag_configure("pinned", foreground="#e5c07b")
+        self.tree.pack(side="left", fill="x", expand=True)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", -height), ("<Next>", height)):
+            self.tree.bind(key, lambda event, step=step: self.move_selection(step))
+        self.tree.bind("<Home>", lambda event: self.move_selection(-len(self.names)))
+        self.tree.bind("<End>", lambda event: self.move_selection(len(self.names)))
+        self.render()
+
+    def bind(self, sequence: str, func):
+        self.tree.bind(sequence, func)
+
+    # model --------------------------------------------------------------
+    def set_names(self, names: list):
+        """Show names, rows that stay keep their details and the selection."""
+        # the first row in view stays there if it is still in the list
+        anchor = self.names[self.top] if self.top < len(self.names) else None
+        self.names = list(names)
+        self.positions = {name: index for index, name in enumerate(self.names)}
+        self.top = self.positions.get(anchor, self.top)
+        for name in [name for name in self.details if name not in self.positions]:
+            del self.details[name]
+            self.complete.discard(name)
+        if self.selected not in self.positions:
+            self.selected = None
+        self.render()
+
+    def remove(self, names):
+        gone = set(names)
+        self.set_names([name for name in self.names if name not in gone])
+
+    def set_pinned(self, names):
+        self.pinned = set(names)
+        self.render()
+
+    def pin(self, name: str, pinned: bool):
+        if pinned:
+            self.pinned.add(name)
+        else:
+            self.pinned.discard(name)
+        self.render()
+
+    def set_details(self, details: dict):
+        """details maps name -> (column values, complete)."""
+        shown = False
+        for name, (values, complete) in details.items():
+            if name not in self.positions:
+                continue
+            self.details[name] = values
+            if complete:
+                self.complete.add(name)
+            shown = shown or self.top <= self.positions[name] < self.top + self.height
+        if shown:
+            self.render()
+
+    def invalidate(self):
+        """Forget all details, the rows in view are loaded again."""
+        self.details.clear()
+        self.complete.clear()
+        self.wanted = ()
+        self.render()
+
+    def selection(self):
+        return self.selected
+
+    def name_at(self, y: int):
+        slot = self.tree.identify_row(y)
+        if not slot:
+            return None
+        index = self.top + int(slot)
+        return self.names[index] if index < len(self.names) else None
+
+    # view ---------------------------------------------------------------
+    def render(self):
+        self.top = max(0, min(self.top, len(self.names) - self.height))
+        shown = self.names[self.top : self.top + self.height]
+        slots = self.tree.get_children()
+        for slot in slots[len(shown) :]:
+            self.tree.delete(slot)
+        for index, name in enumerate(shown):
+            options = {
+                "text": name,
+                "values": self.details.get(name, ()),
+                "tags": ("pinned",) if name in self.pinned else (),
+            }
+            if index < len(slots):
+                self.tree.item(str(index), **options)
+            else:
+                self.tree.insert("", "end", iid=str(index), **options)
+        position = self.positions.get(self.selected)
+        if position is not None and self.top <= position < self.top + self.height:
+            self.tree.selection_set(str(position - self.top))
+        else:
+            self.tree.selection_set(())
+        count = len(self.names)
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + self.height) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        wanted = tuple(name for name in shown if name not in self.complete)
+        if wanted != self.wanted:
+            self.wanted = wanted
+            if wanted:
+                self.on_need(list(wanted))
+
+    def scroll(self, rows: int):
+        self.top += rows
+        self.render()
+        return "break"
+
+    def on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.names))
+        elif args[0] == "scroll":
+            self.top += int(args[1]) * (self.height if args[2] == "pages" else 1)
+        self.render()
+
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            index = self.top + int(selection[0])
+            if index < len(self.names):
+                self.selected = self.names[index]
+
+    def move_selection(self, step: int):
+        if not self.names:
+            return "break"
+        position = self.positions.get(self.selected)
+        if position is None:
+            visible = min(self.top + self.height, len(self.names))
+            index = self.top if step > 0 else visible - 1
+        else:
+            index = position + step
+        index = max(0, min(len(self.names) - 1, index))
+        self.selected = self.names[index]
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.height:
+            self.top = index - self.height + 1
+        self.render()
+        self.tree.focus(str(index - self.top))
+        return "break"
 
 
 class SaveManagerApp:
     # Class constants
-    settings_filename = "./savemanager_settings.json"
-    slow_log_interval = 30
-    settings = {
-        "FILE_EXT": "",
-        "FILE_NAME": "",
-        "FILE_ENU": "",
-        "SOURCE_FOLDER": "",
-        "DEST_FOLDER": "",
-        "APP_PATH": "",
-        "SHOW_DEBUG": False,
-        "X_POS": 0,
-        "Y_POS": 0,
-        "SAFETY_BACKUP": "SAFETY_BACKUP.7z,",
-        "MAKE_BACKUP": True,
-    }
-
+    settings_filename = SETTINGS_FILENAME
+    log_height = 31
+    # first scheduled scrub this long after startup, retry delay while busy
+    scrub_delay_ms = 60 * 1000
+    # how often to look for a safety snapshot that is due for compression
+    safety_poll_ms = 60 * 1000
+    settings = dict(DEFAULT_SETTINGS)
+    # seconds of quiet before changed settings are written
+    settings_delay = 1.0
+    # rows of the backup list
+    list_height = 10
 
     def __init__(self):
         # runtime state
         self.path_7zip = ""
         self.path_working = ""
-        self.slow_log_str = ""
-        self.slow_log_cnt = 0
         self.progress_cnt = 0
         self.progress_max = 0
 
@@ -47,20 +303,57 @@ class SaveManagerApp:
         self.dest_var = tk.StringVar()
         self.app_path_var = tk.StringVar()
         self.make_backup_var = tk.BooleanVar(value=True)
+        self.profile_var = tk.StringVar()
+
+        # log pipeline, prints to stdout until the log widget exists
+        self.logger = LogPipeline()
 
         # widget references
         self.log_text = None
         self.size_label = None
-        self.backups_listbox = None
+        self.backup_list = None
         self.run_app_btn = None
-
-        self.initializing = True
+        self.cancel_btn = None
+        self.undo_btn = None
+        self.profile_box = None
+        self.queue_view = None
+        self.job_buttons = []
+        self.profile_buttons = []
+        # one engine per profile, self.engine is the one of self.profile
+        self.engines = {}
+        self.engine = None
+        self.profile = None
+        self.store = None
+        self.size_scanner = None
 
         # Load settings before building GUI so initial state is known
         self.settings_init()
+
+        # jobs of all profiles, started once the main loop runs
+        self.jobs = JobScheduler(
+            self.root,
+            max_jobs=self.settings["JOBS"]["max_jobs"],
+            max_per_device=self.settings["JOBS"]["max_per_device"],
+            on_change=self.on_jobs_changed,
+            log=self.log,
+        )
         self.debug = self.settings["SHOW_DEBUG"]
-        eakse.util.debug = self.debug # type: ignore
-        
+        self.logger.set_level(DEBUG if self.debug else self.settings["LOG_LEVEL"])
+        try:
+            self.logger.set_logfile(self.settings["LOG_FILE"])
+        except Exception as e:
+            self.log(f"Can't open log file {self.settings['LOG_FILE']}: {e}", ERROR)
+
+        # all backup work is done by the engines, the GUI only drives them
+        self.profile = self.settings["PROFILE"]
+        self.engine = self.engine_for(self.profile)
+        self.size_scanner = BackgroundSizeScanner(
+            self.on_size_scanned, log=self.log, scanner=self.engine.size_scanner
+        )
+        # fills the backup list's columns for the rows in view
+        self.metadata_loader = MetadataLoader(
+            self.on_details_loaded, log=lambda text: self.log(text, WARNING)
+        )
 
         # Build GUI
         self.root.title("Save Manager")
@@ -80,6 +373,46 @@ class SaveManagerApp:
         except Exception:
             pass
 
+        # Profiles: selector, new/delete and the job queue of every profile
+        profile_frame = ttk.Frame(self.root)
+        profile_frame.pack(fill="x", padx=6, pady=(6, 0))
+
+        ttk.Label(profile_frame, text="Profile").pack(side="left", padx=(0, 6))
+        self.profile_box = ttk.Combobox(
+            profile_frame, textvariable=self.profile_var, state="readonly", width=30
+        )
+        self.profile_box.pack(side="left", padx=(0, 6))
+        self.profile_box.bind("<<ComboboxSelected>>", self.on_profile_selected)
+
+        new_profile_btn = ttk.Button(profile_frame, text="NEW", command=self.on_new_profile)
+        new_profile_btn.pack(side="left", padx=(0, 6))
+
+        delete_profile_btn = ttk.Button(
+            profile_frame, text="DELETE", command=self.on_delete_profile
+        )
+        delete_profile_btn.pack(side="left", padx=(0, 6))
+        self.profile_buttons = [delete_profile_btn]
+
+        queue_frame = ttk.Frame(self.root)
+        queue_frame.pack(fill="x", padx=6, pady=(6, 0))
+        self.queue_view = ttk.Treeview(
+            queue_frame, columns=("running", "queued"), height=3, selectmode="browse"
+        )
+        self.queue_view.heading("#0", text="Profile")
+        self.queue_view.heading("running", text="Running")
+        self.queue_view.heading("queued", text="Queued")
+        self.queue_view.column("#0", width=200)
+        self.queue_view.column("running", width=300)
+        self.queue_view.column("queued", width=400)
+        self.queue_view.pack(side="left", fill="x", expand=True)
+        queue_scrollbar = ttk.Scrollbar(
+            queue_frame, orient="vertical", command=self.queue_view.yview
+        )
+        queue_scrollbar.pack(side="right", fill="y")
+        self.queue_view.config(yscrollcommand=queue_scrollbar.set)
+        # double click switches to that profile
+        self.queue_view.bind("<Double-Button-1>", self.on_queue_double_click)
+
         # Top controls: Backup / Restore / Restore Latest / Create Backup checkbox / Size info
         top_frame = ttk.Frame(self.root)
         top_frame.pack(fill="x", padx=6, pady=6)
@@ -95,11 +428,26 @@ class SaveManagerApp:
         )
         restore_latest_btn.pack(side="left", padx=(0, 6))
 
+        browse_btn = ttk.Button(top_frame, text="BROWSE", command=self.on_browse_backup)
+        browse_btn.pack(side="left", padx=(0, 6))
+
+        self.undo_btn = ttk.Button(
+            top_frame, text="UNDO RESTORE", command=self.on_undo_restore, state="disabled"
+        )
+        self.undo_btn.pack(side="left", padx=(0, 6))
+
         make_backup_cb = ttk.Checkbutton(
             top_frame, text="CREATE BACKUP", variable=self.make_backup_var
         )
         make_backup_cb.pack(side="left", padx=(0, 6))
 
+        self.cancel_btn = ttk.Button(
+            top_frame, text="CANCEL", command=self.on_cancel, state="disabled"
+        )
+        self.cancel_btn.pack(side="left", padx=(0, 6))
+        # disabled while a job of the profile is queued or running
+        self.job_buttons = [backup_btn, restore_btn, restore_latest_btn, browse_btn]
+
         # Run APP button moved to top-right, disabled by default; it will be enabled when a valid executable path is set.
         self.run_app_btn = ttk.Button(
             top_frame, text="RUN APP", command=self.on_run_app, state="disabled"
@@ -108,10 +456,12 @@ class SaveManagerApp:
 
         self.size_label = ttk.Label(top_frame, text="")
         self.size_label.pack(side="right")
+        # click to log the largest subfolders
+        self.size_label.bind("<Button-1>", self.on_size_clicked)
 
         # Initialize run_app_btn state based on saved settings
         try:
-            app_path = self.settings["APP_PATH"]
+            app_path = self.engine.settings["APP_PATH"]
             if app_path and os.path.exists(app_path) and os.access(app_path, os.X_OK):
                 self.run_app_btn.config(state="normal")
             else:
@@ -123,27 +473,10 @@ class SaveManagerApp:
         # Use a Frame (ttk.Frame) so it follows the themed background
         list_frame = ttk.Frame(self.root)
         list_frame.pack(fill="both", expand=False, padx=6)
-        self.backups_listbox = tk.Listbox(list_frame, height=10, width=120)
-        self.backups_listbox.pack(side="left", fill="x", expand=True)
-        scrollbar = ttk.Scrollbar(
-            list_frame, orient="vertical", command=self.backups_listbox.yview
-        )
-        scrollbar.pack(side="right", fill="y")
-        self.backups_listbox.config(yscrollcommand=scrollbar.set)
-        self.backups_listbox.bind("<Double-Button-1>", self.on_backup_double_click)
-        # Apply dark styling to listbox (unselected background & selection colors)
-        try:
-            self.root._apply_dark_style(self.backups_listbox)  # type: ignore
-            self.backups_listbox.config(
-                selectbackground="#0e639c", selectforeground="#ffffff"
-            )
-        except Exception:
-            self.backups_listbox.config(
-                bg="#252526",
-                fg="#d4d4d4",
-                selectbackground="#0e639c",
-                selectforeground="#ffffff",
-            )
+        self.backup_list = BackupList(list_frame, self.list_height, self.on_details_needed)
+        self.backup_list.bind("<Double-Button-1>", self.on_backup_double_click)
+        # right click pins/unpins, pinned backups are never pruned
+        self.backup_list.bind("<Button-3>", self.on_backup_right_click)
 
         # Source / Destination / APP entries
         io_frame = ttk.Frame(self.root)
@@ -171,51 +504,37 @@ class SaveManagerApp:
         log_frame = ttk.Frame(self.root)
         log_frame.pack(fill="both", expand=True, padx=6, pady=(0, 6))
         self.log_text = scrolledtext.ScrolledText(
-            log_frame, height=self.slow_log_interval + 1, wrap="word", state="disabled"
+            log_frame, height=self.log_height, wrap="word", state="disabled"
         )
         self.log_text.pack(fill="both", expand=True)
         try:
             self.root._apply_dark_style(self.log_text)  # type: ignore
         except Exception:
             self.log_text.config(bg="#3c3c3c", fg="#d4d4d4", insertbackground="#d4d4d4")
+        self.logger.attach(self.root, self.log_text)
 
         # When entries change, update settings
         self.src_var.trace_add("write", self.on_src_changed)
         self.dest_var.trace_add("write", self.on_dest_changed)
         self.app_path_var.trace_add("write", self.on_app_changed)
+        self.make_backup_var.trace_add("write", self.on_make_backup_changed)
 
         # Close handler
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    # Entry change handlers (bound to tkinter variable traces)
+    # Entry change handlers (bound to tkinter variable traces), the store
+    # writes once typing stops
     def on_src_changed(self, *args):
-        self.settings["SOURCE_FOLDER"] = self.src_var.get()
-        if self.initializing:
-            return
-        self.save_settings()
+        self.store.set_profile(self.profile, "SOURCE_FOLDER", self.src_var.get())
 
     def on_dest_changed(self, *args):
-        self.settings["DEST_FOLDER"] = self.dest_var.get()
-        if self.initializing:
-            return
-        self.save_settings()
+        self.store.set_profile(self.profile, "DEST_FOLDER", self.dest_var.get())
+
+    def on_make_backup_changed(self, *args):
+        self.store.set("MAKE_BACKUP", self.make_backup_var.get())
 
     def on_app_changed(self, *args):
-        self.settings["APP_PATH"] = self.app_path_var.get()
-        if self.initializing:
-            # still update run button state even during init
-            try:
-                path = self.app_path_var.get()
-                if self.run_app_btn is not None:
-                    self.run_app_btn.config(
-                        state="normal"
-                        if path and os.path.exists(path) and os.access(path, os.X_OK)
-                        else "disabled"
-                    )
-            except Exception:
-                pass
-            return
-        self.save_settings()
+        self.store.set_profile(self.profile, "APP_PATH", self.app_path_var.get())
         try:
             path = self.app_path_var.get()
             if self.run_app_btn is not None:
@@ -228,29 +547,36 @@ class SaveManagerApp:
             pass
 
     def on_close(self):
+        if self.jobs.busy():
+            # let the running jobs stop at their next checkpoint first
+            self.log("Cancelling running jobs before closing...")
+            self.jobs.cancel()
+            self.root.after(200, self.on_close)
+            return
+        self.jobs.stop()
         try:
             geom = self.root.winfo_geometry()
             # geometry looks like 'WxH+X+Y'
             if "+" in geom:
                 parts = geom.split("+")
-                self.settings["X_POS"] = int(parts[1])
-                self.settings["Y_POS"] = int(parts[2])
-                self.save_settings()
+                self.store.update({"X_POS": int(parts[1]), "Y_POS": int(parts[2])})
         except Exception:
             pass
+        # pending changes are written now, not by the timer
+        self.store.close()
         self.root.destroy()
 
     # Event handlers -----------------------------------------------------
     def on_browse_source(self):
         folder = filedialog.askdirectory(
-            initialdir=self.settings["SOURCE_FOLDER"]
+            initialdir=self.engine.settings["SOURCE_FOLDER"]
         )
         if folder:
             self.src_var.set(folder)
 
     def on_browse_dest(self):
         folder = filedialog.askdirectory(
-            initialdir=self.settings["DEST_FOLDER"]
+            initialdir=self.engine.settings["DEST_FOLDER"]
         )
         if folder:
             self.dest_var.set(folder)
@@ -258,21 +584,21 @@ class SaveManagerApp:
     def on_select_app(self):
         filename = filedialog.askopenfilename(
             title="Select executable",
-            initialdir=os.path.dirname(self.settings["APP_PATH"])
-            if self.settings["APP_PATH"]
-            else self.settings["SOURCE_FOLDER"]
+            initialdir=os.path.dirname(self.engine.settings["APP_PATH"])
+            if self.engine.settings["APP_PATH"]
+            else self.engine.settings["SOURCE_FOLDER"]
         )
         if filename:
             self.app_path_var.set(filename)
             self.log(f"Selected executable: {filename}")
 
     def on_run_app(self):
-        path = self.settings["APP_PATH"]
+        path = self.engine.settings["APP_PATH"]
         if not path:
             self.log("No executable selected. Please select an executable first.")
             return
         if not os.path.exists(path):
-            self.log(f"Executable not found: {path}")
+            self.log(f"Executable not found: {path}", WARNING)
             try:
                 if self.run_app_btn is not None:
                     self.run_app_btn.config(state="disabled")
@@ -291,314 +617,477 @@ class SaveManagerApp:
             start_executable([path])
             self.log(f"Started executable: {path}")
         except Exception as e:
-            self.log(f"Error starting executable: {e}")
+            self.log(f"Error starting executable: {e}", ERROR)
 
     def on_backup(self):
         # Ensure settings reflect entries
-        self.settings["SOURCE_FOLDER"] = self.src_var.get()
-        self.settings["DEST_FOLDER"] = self.dest_var.get()
-        self.save_settings()
-        self.add_new_backup()
-        self.log(
-            "----------------------------------------------------------------------------------------------------------------------"
-        )
+        self.store.set_profile(self.profile, "SOURCE_FOLDER", self.src_var.get())
+        self.store.set_profile(self.profile, "DEST_FOLDER", self.dest_var.get())
+        self.submit("backup", self.engine.add_new_backup, on_done=self.on_backup_done)
+
+    def on_backup_done(self, job, result, error):
+        self.on_job_done(job, result, error)
+        if error is None and result is not None:
+            # retention runs after a backup was written, still off the UI thread
+            self.submit(
+                "prune",
+                self.engine_for(job.profile).prune,
+                profile=job.profile,
+                priority=AUTOMATIC,
+            )
 
     def on_restore(self):
         filename = filedialog.askopenfilename(
-            initialdir=self.settings["DEST_FOLDER"],
+            initialdir=self.engine.settings["DEST_FOLDER"],
             title="Select backup to restore",
         )
         if filename:
-            self.restore_backup(filename, self.make_backup_var.get())
-            self.log(
-                "----------------------------------------------------------------------------------------------------------------------"
+            self.submit(
+                "restore",
+                self.engine.restore_backup,
+                filename,
+                self.make_backup_var.get(),
+                on_done=self.on_job_done,
             )
 
     def on_restore_latest(self):
-        self.restore_backup(
-            f"{self.settings['DEST_FOLDER']}{os.sep}{self.get_current_highest()}",
+        self.submit(
+            "restore latest",
+            self.engine.restore_latest,
             self.make_backup_var.get(),
-        )
-        self.log(
-            "----------------------------------------------------------------------------------------------------------------------"
+            on_done=self.on_job_done,
         )
 
     def on_backup_double_click(self, event=None):
-        sel = self.backups_listbox.curselection()  # type: ignore
-        if not sel:
+        filename = self.backup_list.name_at(event.y) if event else self.backup_list.selection()
+        if not filename:
             return
-        filename = self.backups_listbox.get(sel[0])  # type: ignore
         # if it's the safety backup, use full path
-        fullpath = f"{self.settings['DEST_FOLDER']}{os.sep}{filename}"
-        self.restore_backup(fullpath, self.make_backup_var.get())
+        fullpath = self.engine.dest_path(filename)
+        self.submit(
+            "restore",
+            self.engine.restore_backup,
+            fullpath,
+            self.make_backup_var.get(),
+            on_done=self.on_job_done,
+        )
+
+    def on_browse_backup(self):
+        # selected backup, newest if nothing is selected (found on the worker)
+        self.submit(
+            "browse",
+            self.load_listing,
+            self.profile,
+            self.backup_list.selection(),
+            heavy=False,
+            on_done=lambda job, result, error: self.on_listing_loaded(job.profile, result, error),
+        )
+
+    def load_listing(self, profile: str, filename=None):
+        """Worker: (path, listing) of filename or the newest backup, None if it's gone."""
+        engine = self.engine_for(profile)
+        path = engine.dest_path(filename or engine.get_current_highest())
+        if not os.path.exists(path):
+            self.log(f"File: {path} not found.", WARNING)
+            return None
+        # the window opens when the header is read
+        return path, engine.list_archive(path)
+
+    def on_listing_loaded(self, profile, result, error):
+        if error is not None:
+            self.log(f"Can't read backup: {error}", ERROR)
+            return
+        if result is not None:
+            ArchiveBrowser(self, profile, *result)
+
+    def on_backup_right_click(self, event):
+        filename = self.backup_list.name_at(event.y)
+        if filename is None or filename == self.engine.settings["SAFETY_BACKUP"]:
+            return
+        # the catalog is reconciled on the worker, the row follows when it's done
+        self.submit(
+            "pin",
+            self.engine.toggle_pin,
+            filename,
+            heavy=False,
+            on_done=lambda job, pinned, error: self.on_pin_done(job.profile, filename, pinned, error),
+        )
+
+    def on_pin_done(self, profile, filename, pinned, error):
+        if error is not None:
+            self.log(f"Can't pin {filename}: {error}", ERROR)
+        elif profile == self.profile:
+            self.backup_list.pin(filename, pinned)
+
+    def on_backups_removed(self, profile, filenames):
+        self.ui(self.remove_from_list, profile, filenames)
+
+    def on_undo_restore(self):
+        self.submit("undo restore", self.engine.undo_restore, on_done=self.on_job_done)
+
+    def on_safety_changed(self):
+        self.ui(self.update_undo_button)
+
+    def update_undo_button(self):
+        if self.undo_btn is not None:
+            self.undo_btn.config(
+                state="normal"
+                if not self.jobs.busy(self.profile) and self.engine.can_undo_restore()
+                else "disabled"
+            )
+
+    def on_safety_timer(self):
+        # compressing a snapshot waits for the profile's other jobs and its age
+        for name in self.settings["PROFILES"]:
+            engine = self.engine_for(name)
+            if not self.jobs.busy(name) and engine.safety_due():
+                self.submit(
+                    "compress safety snapshot",
+                    engine.compress_safety,
+                    profile=name,
+                    priority=AUTOMATIC,
+                )
+        self.root.after(self.safety_poll_ms, self.on_safety_timer)
+
+    def on_cancel(self):
+        self.log("Cancelling...")
+        self.jobs.cancel(self.profile)
+
+    def schedule_scrub(self, delay_ms=None):
+        hours = resolve_scrub(self.settings["SCRUB"])["interval_hours"]
+        if hours:
+            self.root.after(delay_ms or int(hours * 3600 * 1000), self.on_scrub_timer)
+
+    def on_scrub_timer(self):
+        # user jobs go first, the scheduler runs these when nothing else waits
+        pending = {job.profile for job in self.jobs.jobs() if job.name == "scrub"}
+        for name in self.settings["PROFILES"]:
+            if name in pending:
+                continue
+            self.submit(
+                "scrub",
+                self.engine_for(name).scrub,
+                profile=name,
+                priority=AUTOMATIC,
+                on_done=self.on_scrub_done,
+            )
+        self.schedule_scrub()
+
+    def on_scrub_done(self, job, result, error):
+        self.on_job_done(job, result, error)
+        if job.profile == self.profile:
+            # the verified column changed
+            self.backup_list.invalidate()
+
+    def on_jobs_changed(self):
+        busy = self.jobs.busy(self.profile)
+        for btn in self.job_buttons + self.profile_buttons:
+            btn.config(state="disabled" if busy else "normal")
+        self.update_undo_button()
+        if self.cancel_btn is not None:
+            self.cancel_btn.config(state="normal" if busy else "disabled")
+        self.fill_queue_view()
+
+    def fill_queue_view(self):
+        if self.queue_view is None:
+            return
+        running = {}
+        queued = {}
+        for job in self.jobs.jobs():
+            target = running if job.state == "running" else queued
+            target.setdefault(job.profile, []).append(job.name)
+        names = list(self.settings["PROFILES"])
+        for iid in self.queue_view.get_children():
+            if iid not in self.settings["PROFILES"]:
+                self.queue_view.delete(iid)
+        for index, name in enumerate(names):
+            values = (
+                ", ".join(running.get(name, ())) or "idle",
+                ", ".join(queued.get(name, ())),
+            )
+            if self.queue_view.exists(name):
+                self.queue_view.item(name, values=values)
+                self.queue_view.move(name, "", index)
+            else:
+                self.queue_view.insert("", index, iid=name, text=name, values=values)
+        if self.queue_view.exists(self.profile):
+            self.queue_view.selection_set(self.profile)
+
+    def on_job_done(self, job, result, error):
+        if isinstance(error, JobCancelled):
+            self.log(f"Cancelled {job.name}.")
         self.log(
             "----------------------------------------------------------------------------------------------------------------------"
         )
 
     # helpers / utilities -----------------------------------------------
-    @dump_args
     def now(self):
         return datetime.now().strftime("%H:%M:%S")
 
-    @dump_args
-    def log(self, text, debug=False):
-        if not debug or (debug and self.settings["SHOW_DEBUG"]) or self.debug:
-            lines = text.split("\n")
-            timestamp = self.now()
-            if self.log_text is None:
-                # Fallback to printing to stdout
-                print(f"{timestamp} | {lines[0]}")
-                for line in lines[1:]:
-                    print(f"         | {line}")
-                return
-            self.log_text.config(state="normal")
-            self.log_text.insert(tk.END, f"{timestamp} | {lines[0]}\n")
-            for line in lines[1:]:
-                self.log_text.insert(tk.END, f"         | {line}\n")
-            self.log_text.see(tk.END)
-            self.log_text.config(state="disabled")
-            try:
-                self.root.update()
-            except Exception:
-                pass
+    def log(self, text, level=INFO):
+        # thread-safe, lines reach the widget with the next timed flush
+        self.logger.log(text, level)
 
-    def slow_log(self, text):
-        self.slow_log_cnt += 1
-        if self.slow_log_str == "":
-            self.slow_log_str = text
+    def ui(self, func, *args):
+        """Run func(*args) on the Tk thread, queued if called from a job."""
+        if threading.current_thread() is threading.main_thread():
+            func(*args)
         else:
-            self.slow_log_str = f"{self.slow_log_str}\n{text}"
-        if self.slow_log_cnt == self.slow_log_interval:
-            self.slow_log_cnt = 0
-            self.log(self.slow_log_str)
-            self.slow_log_str = ""
-
-    @dump_args
-    def sizeof_fmt(self, num, suffix="B"):
-        # https://stackoverflow.com/a/1094933/9267296
-        for unit in ["", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"]:
-            if abs(num) < 1024.0:
-                return f"{num:3.1f}{unit}{suffix}"
-            num /= 1024.0
-        return f"{num:.1f}Yi{suffix}"
-
-    @dump_args
-    def update_size(self):
-        src = self.settings["SOURCE_FOLDER"]
+            self.jobs.call_soon(func, *args)
+
+    def update_size(self, profile=None):
+        if profile is not None and profile != self.profile:
+            return
+        src = self.engine.settings["SOURCE_FOLDER"]
         if not src or not os.path.exists(src):
-            txt = "Source folder not found"
-            if self.size_label is not None:
-                self.size_label.config(text=txt)
-            else:
-                self.log(txt)
+            self.set_size_text("Source folder not found")
             return
 
-        size = 0
-        for path, _, files in os.walk(src):
-            for f in files:
-                fp = os.path.join(path, f)
-                try:
-                    size += os.path.getsize(fp)
-                except Exception as e:
-                    # Log debug info but continue counting other files
-                    try:
-                        self.log(f"Error getting size for {fp}: {e}", debug=True)
-                    except Exception:
-                        pass
-        txt = f"Folder size: {self.sizeof_fmt(size)}"
+        # scanned on its own thread, result arrives in on_size_scanned
+        self.size_scanner.request(src)
+
+    def on_size_scanned(self, result):
+        if os.path.normpath(self.engine.settings["SOURCE_FOLDER"]) != result.path:
+            # source folder changed while scanning
+            return
+        self.set_size_text(
+            f"Folder size: {sizeof_fmt(result.size)} ({result.count} files)"
+        )
+
+    def on_size_clicked(self, event=None):
+        result = self.size_scanner.last
+        if result is None:
+            return
+        lines = [f"Largest folders in {result.path}:"]
+        for name, size in result.largest:
+            lines.append(f"  {sizeof_fmt(size):>10}  {name}")
+        self.log("\n".join(lines))
+
+    def set_size_text(self, txt):
         if self.size_label is not None:
-            self.size_label.config(text=txt)
+            self.ui(self.size_label.config, {"text": txt})
         else:
             self.log(txt)
 
-    @dump_args
-    def load_settings(self, filename=None):
-        filename = filename or self.settings_filename
-        self.log(f"Loading settings from {filename}")
-        with open(filename) as infile:
-            self.settings = json.load(infile)
-        self.log(
-            "----------------------------------------------------------------------------------------------------------------------"
+    def settings_init(self):
+        # validated against the defaults, kept in memory and written behind
+        self.store = SettingsStore(
+            self.settings_filename,
+            delay=self.settings_delay,
+            log=lambda text: self.log(text, WARNING),
         )
+        if self.store.created:
+            self.log("No settings file found, created default settings.")
+        else:
+            self.log(f"Loaded settings from {self.settings_filename}")
+        # the engines share this dict, store updates are seen immediately
+        self.settings = self.store.settings
 
-    @dump_args
-    def save_settings(self, filename=None):
-        filename = filename or self.settings_filename
-        self.log(f"Saving settings to {filename}")
-        with open(filename, "w") as outfile:
-            json.dump(self.settings, outfile, indent=4)
-        self.log(
-            "----------------------------------------------------------------------------------------------------------------------"
-        )
+    # profiles -----------------------------------------------------------
+    def engine_for(self, profile: str) -> BackupEngine:
+        """The engine of profile, created on first use."""
+        engine = self.engines.get(profile)
+        if engine is None:
+            engine = BackupEngine(
+                profile_settings(self.settings, profile),
+                PrefixedLog(self.logger),
+                check=self.jobs.check_cancelled,
+            )
+            engine.on_backups_changed = lambda: self.get_current_backups(profile)
+            engine.on_source_changed = lambda: self.update_size(profile)
+            engine.on_backups_removed = lambda names: self.on_backups_removed(profile, names)
+            engine.on_safety_changed = self.on_safety_changed
+            self.engines[profile] = engine
+            self.update_log_prefixes()
+        return engine
 
-    @dump_args
-    def settings_init(self):
-        if os.path.exists(self.settings_filename):
-            self.load_settings()
-        else:
-            self.log("No settings file found, creating default settings...")
-            self.settings = {
-                "FILE_EXT": ".7z",
-                "FILE_NAME": "BACKUP_",
-                "FILE_ENU": "",
-                "SOURCE_FOLDER": "./",
-                "DEST_FOLDER": "./",
-                "APP_PATH": "",
-                "SHOW_DEBUG": True,
-                "X_POS": 0,
-                "Y_POS": 0,
-                "SAFETY_BACKUP": "SAFETY_BACKUP.7z",
-            }
-            self.save_settings()
-
-    @dump_args
-    def create_backup(self, filename, extralog=""):
-        logstr = "Starting backup, application might freeze a bit..."
-        rootdir = os.path.basename(self.settings["SOURCE_FOLDER"])
-        # dirname = os.path.normpath(rootdir)
-        tmp_directory = tempfile.mkdtemp(prefix="eakse_") #f"./TMP_savemanager/{dirname}"
-        # create dirs to be safe
-        os.makedirs(rootdir, exist_ok=True)
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        if extralog != "":
-            logstr = extralog + "\n" + logstr
-        self.log(logstr)
-        self.log("Making TMP copy of existing directory.")
-        try:
-            copytree(self.settings["SOURCE_FOLDER"], tmp_directory, dirs_exist_ok=True)
-            self.log("Done.\nCreating 7z file...")
-            filecount = 0
-            with py7zr.SevenZipFile(filename, "w") as archive:
-                for dirpath, dirnames, filenames in os.walk(tmp_directory):
-                    for filename in filenames:
-                        filepath = os.path.join(dirpath, filename)
-                        parentpath = os.path.relpath(filepath, tmp_directory)
-                        arcname = os.path.join(rootdir, parentpath)
-                        self.slow_log(f"Adding: {filepath}")
-                        archive.write(filepath, arcname)
-                        filecount += 1
-            self.log(f"Added {filecount} files.\nFinalizing 7z file...")
-            self.log("Done.\nRemoving TMP copy.")
-            rmtree(tmp_directory)
-            self.log("Done")
-        except Exception as e:
-            self.log(f"Error during backup: {e}")
-        self.get_current_backups()
-
-    @dump_args
-    def add_new_backup(self):
-        newbackupname = self.increase(self.get_current_highest())
-        start = time.time()
-        self.create_backup(
-            f"{self.settings['DEST_FOLDER']}{os.sep}{newbackupname}",
-            extralog=f"Creating new backup with filename:\n  {newbackupname}",
+    def update_log_prefixes(self):
+        # lines only say which profile they belong to once there are several
+        several = len(self.settings["PROFILES"]) > 1
+        for name, engine in self.engines.items():
+            engine.logger.prefix = name if several else ""
+
+    def submit(self, name: str, func, *args, profile=None, priority=MANUAL, heavy=True, on_done=None):
+        """Queue a job of profile (the current one by default) with the scheduler."""
+        profile = profile or self.profile
+        settings = self.engine_for(profile).settings
+        # the disks a heavy job reads and writes count against the device limit
+        paths = (settings["SOURCE_FOLDER"], settings["DEST_FOLDER"]) if heavy else ()
+        return self.jobs.submit(
+            name,
+            func,
+            *args,
+            profile=profile,
+            priority=priority,
+            paths=paths,
+            heavy=heavy,
+            on_done=on_done,
         )
-        self.log(f"Backup done.\nTime elapsed: {time.time() - start:.2f} seconds")
-
-    @dump_args
-    def restore_backup(self, filename: str, do_backup: bool):
-        start = time.time()
-        if os.path.exists(filename):
-            if do_backup:
-                if os.path.exists(
-                    f"{self.settings['DEST_FOLDER']}{os.sep}{self.settings['SAFETY_BACKUP']}"
-                ):
-                    os.remove(
-                        f"{self.settings['DEST_FOLDER']}{os.sep}{self.settings['SAFETY_BACKUP']}"
-                    )
-                os.makedirs(self.settings["SOURCE_FOLDER"], exist_ok=True)
-                self.create_backup(
-                    f"{self.settings['DEST_FOLDER']}{os.sep}{self.settings['SAFETY_BACKUP']}",
-                    extralog=f"Creating safety backup: {self.settings['SAFETY_BACKUP']}",
-                )
-            else:
-                self.log("Skipping safety backup.")
-        else:
-            self.log(f"File: {filename} not found.")
+
+    def show_profile(self, profile: str):
+        """Switch the window to profile: entries, backup list, size and buttons."""
+        self.profile = profile
+        self.store.set("PROFILE", profile)
+        self.engine = self.engine_for(profile)
+        self.size_scanner.scanner = self.engine.size_scanner
+        self.profile_box.config(values=list(self.settings["PROFILES"]))
+        self.profile_var.set(profile)
+        # the traces write these back to the same profile, unchanged
+        self.src_var.set(self.engine.settings["SOURCE_FOLDER"])
+        self.dest_var.set(self.engine.settings["DEST_FOLDER"])
+        self.app_path_var.set(self.engine.settings["APP_PATH"])
+        # details of the previous profile's backups don't apply
+        self.backup_list.set_names([])
+        self.backup_list.invalidate()
+        self.set_size_text("")
+        self.submit("list backups", self.load_backups, profile, heavy=False)
+        self.on_jobs_changed()
+
+    def on_profile_selected(self, event=None):
+        profile = self.profile_var.get()
+        if profile != self.profile:
+            self.show_profile(profile)
+
+    def on_queue_double_click(self, event=None):
+        profile = self.queue_view.identify_row(event.y)  # type: ignore
+        if profile and profile != self.profile:
+            self.show_profile(profile)
+
+    def on_new_profile(self):
+        name = simpledialog.askstring("New profile", "Profile name:", parent=self.root)
+        if not name or not name.strip():
             return
-        self.log(f"Deleting existing directory: {self.settings['SOURCE_FOLDER']}")
-        try:
-            rmtree(self.settings["SOURCE_FOLDER"])
-        except Exception as e:
-            self.log(f"Error deleting existing directory: {e}")
-        self.log(f"Restoring backup: {filename}")
-        old_cwd = os.getcwd()
-        os.makedirs(self.settings["SOURCE_FOLDER"], exist_ok=True)
-        os.chdir(f"{self.settings['SOURCE_FOLDER']}{os.sep}..")
-        with py7zr.SevenZipFile(f"{filename}", "r") as archive:
-            archive.extractall()
-        self.log(f"Backup restored.\nTime elapsed: {time.time() - start:.2f} seconds")
-        os.chdir(old_cwd)
-
-    @dump_args
-    def get_current_backups(self) -> list:
-        result = [
-            filename
-            for filename in next(
-                os.walk(self.settings["DEST_FOLDER"]), (None, None, [])
-            )[2]
-            if (
-                filename.startswith(self.settings["FILE_NAME"])
-                and filename.lower().endswith(self.settings["FILE_EXT"].lower())
-            )
-        ]
-        result.sort(reverse=True)
-        if os.path.exists(
-            f"{self.settings['DEST_FOLDER']}{os.sep}{self.settings['SAFETY_BACKUP']}"
+        name = name.strip()
+        if name in self.settings["PROFILES"]:
+            self.log(f"Profile {name} already exists.", WARNING)
+            return
+        self.store.add_profile(name, new_profile())
+        self.update_log_prefixes()
+        self.log(f"Created profile {name}, set its folders below.")
+        self.show_profile(name)
+
+    def on_delete_profile(self):
+        profiles = self.settings["PROFILES"]
+        if len(profiles) < 2:
+            self.log("The last profile can't be deleted.", WARNING)
+            return
+        if self.jobs.busy(self.profile):
+            return
+        if not messagebox.askyesno(
+            "Delete profile",
+            f"Delete profile {self.profile}? Its backups and saves are kept.",
+            parent=self.root,
         ):
-            result.insert(0, self.settings["SAFETY_BACKUP"])
-        if self.backups_listbox is not None:
-            self.backups_listbox.delete(0, tk.END)
-            for r in result:
-                self.backups_listbox.insert(tk.END, r)
-        self.update_size()
-        try:
-            self.root.update()
-        except Exception:
-            pass
+            return
+        name = self.profile
+        self.store.remove_profile(name)
+        engine = self.engines.pop(name, None)
+        if engine is not None and engine.catalog is not None:
+            engine.catalog.close()
+        self.update_log_prefixes()
+        self.log(f"Deleted profile {name}.")
+        self.show_profile(next(iter(profiles)))
+
+    def load_backups(self, profile=None) -> list:
+        """
+        Fill the list and size from the catalog as it was last synced, then
+        reconcile it with the folder and scan the source.
+        """
+        profile = profile or self.profile
+        engine = self.engine_for(profile)
+        rows = engine.get_backup_rows(cached=True)
+        if self.backup_list is not None:
+            pinned = {row["filename"] for row in rows if row["pinned"]}
+            self.ui(self.fill_backup_list, profile, engine.get_current_backups(cached=True), pinned)
+        latest = next((row for row in rows if row["source_size"] is not None), None)
+        if latest is not None and profile == self.profile:
+            # replaced by the scan result
+            self.set_size_text(
+                f"Folder size: {sizeof_fmt(latest['source_size'])} "
+                f"({latest['file_count']} files) at {latest['filename']}"
+            )
+        return self.get_current_backups(profile)
+
+    def get_current_backups(self, profile=None) -> list:
+        profile = profile or self.profile
+        engine = self.engine_for(profile)
+        result = engine.get_current_backups()
+        if self.backup_list is not None:
+            self.ui(self.fill_backup_list, profile, result, engine.pinned_backups())
+        self.update_size(profile)
         return result
 
-    @dump_args
-    def get_number(self, filename: str) -> int:
-        raw = filename.split(self.settings["FILE_NAME"])[1].split(self.settings["FILE_EXT"])[0]
-        number = int("".join(ch for ch in raw if ch.isdigit()))
-        return number
-
-    @dump_args
-    def increase(self, filename: str) -> str:
-        nr = self.get_number(filename) +1
-        return f"{filename.split(self.settings['FILE_NAME'])[0]}{self.settings['FILE_NAME']}{nr:03}{self.settings['FILE_EXT']}"
-
-    @dump_args
-    def get_current_highest(self) -> str:
-        highest = f"{self.settings['FILE_NAME']}-1{self.settings['FILE_EXT']}"
-        filelist = self.get_current_backups()
-        if self.settings["SAFETY_BACKUP"] in filelist:
-            filelist.remove(self.settings["SAFETY_BACKUP"])
-        for filename in filelist:
-            if self.get_number(filename) > self.get_number(highest):
-                highest = filename
-        return highest
+    def fill_backup_list(self, profile: str, filelist: list, pinned=()):
+        if profile != self.profile:
+            # the window switched to another profile meanwhile
+            return
+        # only rows that came or went change, details are kept
+        self.backup_list.set_names(filelist)
+        self.backup_list.set_pinned(pinned)
+
+    def remove_from_list(self, profile: str, filenames):
+        if profile == self.profile:
+            self.backup_list.remove(filenames)
+
+    def on_details_needed(self, filenames: list):
+        self.metadata_loader.request(self.engine, self.profile, filenames)
+
+    def on_details_loaded(self, profile: str, details: dict):
+        # loader thread
+        self.ui(self.show_details, profile, details)
+
+    def show_details(self, profile: str, details: dict):
+        if profile != self.profile:
+            return
+        self.backup_list.set_details(
+            {
+                name: (self.format_details(row), complete)
+                for name, (row, complete) in details.items()
+            }
+        )
+
+    def format_details(self, row: dict) -> tuple:
+        def stamp(value):
+            return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M")
+
+        if row["verified"] is None:
+            verified = "never"
+        elif row["verify_result"] == "ok":
+            verified = f"ok {stamp(row['verified'])}"
+        else:
+            verified = row["verify_result"] or "failed"
+        return (
+            "" if row["number"] is None else row["number"],
+            "" if row["created"] is None else stamp(row["created"]),
+            "" if row["size"] is None else sizeof_fmt(row["size"]),
+            "" if row["source_size"] is None else sizeof_fmt(row["source_size"]),
+            "" if row["file_count"] is None else row["file_count"],
+            verified,
+        )
 
     def run(self):
         # Initialization already performed in __init__ (settings loaded and GUI built).
         # Populate variable values from settings for the GUI.
         if self.src_var is not None:
-            self.src_var.set(self.settings["SOURCE_FOLDER"])
+            self.src_var.set(self.engine.settings["SOURCE_FOLDER"])
         if self.dest_var is not None:
-            self.dest_var.set(self.settings["DEST_FOLDER"])
+            self.dest_var.set(self.engine.settings["DEST_FOLDER"])
         if self.app_path_var is not None:
-            self.app_path_var.set(self.settings["APP_PATH"])
+            self.app_path_var.set(self.engine.settings["APP_PATH"])
         if self.make_backup_var is not None:
             self.make_backup_var.set(self.settings["MAKE_BACKUP"])
+        self.profile_box.config(values=list(self.settings["PROFILES"]))
+        self.profile_var.set(self.profile)
 
-        self.get_current_backups()
-
-        # finished initialization - allow settings to be saved on change
-        self.initializing = False
+        # the window shows first, backups and size are loaded by a job
+        self.jobs.start()
+        self.submit("list backups", self.load_backups, self.profile, heavy=False)
+        self.schedule_scrub(self.scrub_delay_ms)
+        self.on_jobs_changed()
+        self.root.after(self.safety_poll_ms, self.on_safety_timer)
 
         # Enter tkinter main loop
         try:
             self.root.mainloop()
         except Exception as e:
-            self.log(f"Error in GUI loop: {e}")
+            self.log(f"Error in GUI loop: {e}", ERROR)
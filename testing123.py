@@ -7,4 +7,4 @@ dest = "C:\\###VS Projects\\###TMP\\maps2\\"
 
 
 
-# FastCopy(source, dest)
+# FastCopy().copytree(source, dest)
@@ -0,0 +1,163 @@
+import io
+import os
+import random
+
+import pytest
+
+from savemanager import chunkstore
+from savemanager.chunkstore import MAX_CHUNK, MIN_CHUNK, ChunkStore, iter_chunks
+
+
+def write_tree(root, files: dict):
+    for relpath, data in files.items():
+        path = os.path.join(root, *relpath.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as outfile:
+            outfile.write(data)
+
+
+def read_tree(root) -> dict:
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as infile:
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = infile.read()
+    return files
+
+
+@pytest.fixture
+def source(tmp_path):
+    rng = random.Random(1)
+    root = tmp_path / "save"
+    write_tree(
+        root,
+        {
+            "slot1.sav": rng.randbytes(700_000),
+            "slot2.sav": rng.randbytes(10_000),
+            "profile/options.ini": b"volume=7\n",
+            "profile/empty.dat": b"",
+        },
+    )
+    return str(root)
+
+
+def test_round_trip(tmp_path, source):
+    store = ChunkStore(str(tmp_path / "dest"))
+    manifest = str(tmp_path / "dest" / "BACKUP_001.manifest")
+    stats = store.backup(source, manifest)
+    assert stats["files"] == 4
+    target = str(tmp_path / "restored" / "save")
+    store.restore(manifest, target)
+    assert read_tree(target) == read_tree(source)
+    assert store.verify(manifest) is None
+
+
+def test_unchanged_files_reuse_chunks(tmp_path, source):
+    store = ChunkStore(str(tmp_path / "dest"))
+    first = str(tmp_path / "dest" / "BACKUP_001.manifest")
+    second = str(tmp_path / "dest" / "BACKUP_002.manifest")
+    store.backup(source, first)
+    with open(os.path.join(source, "slot2.sav"), "ab") as outfile:
+        outfile.write(b"more")
+    stats = store.backup(source, second, previous=first)
+    assert stats["reused"] == 3
+    # only the changed file's chunks are new
+    assert 0 < stats["written"] < 20_000
+
+
+def test_restore_removes_extra_files(tmp_path, source):
+    store = ChunkStore(str(tmp_path / "dest"))
+    manifest = str(tmp_path / "dest" / "BACKUP_001.manifest")
+    store.backup(source, manifest)
+    write_tree(source, {"new.sav": b"x"})
+    os.remove(os.path.join(source, "slot2.sav"))
+    stats = store.restore(manifest, source)
+    assert stats["deleted"] == 1
+    assert set(read_tree(source)) == {"slot1.sav", "slot2.sav", "profile/options.ini", "profile/empty.dat"}
+
+
+def test_verify_finds_corrupt_chunk(tmp_path, source):
+    store = ChunkStore(str(tmp_path / "dest"))
+    manifest = str(tmp_path / "dest" / "BACKUP_001.manifest")
+    store.backup(source, manifest)
+    digest = store.load_manifest(manifest)["files"][0]["chunks"][0]
+    with open(store.chunk_path(digest), "r+b") as outfile:
+        outfile.seek(10)
+        outfile.write(b"garbage")
+    assert store.verify(manifest) is not None
+
+
+def test_gc_keeps_referenced_chunks(tmp_path, source):
+    dest = tmp_path / "dest"
+    store = ChunkStore(str(dest))
+    first = str(dest / "BACKUP_001.manifest")
+    second = str(dest / "BACKUP_002.manifest")
+    store.backup(source, first)
+    write_tree(source, {"slot1.sav": random.Random(2).randbytes(300_000)})
+    store.backup(source, second, previous=first)
+    first_chunks = {
+        digest for entry in store.load_manifest(first)["files"] for digest in entry["chunks"]
+    }
+    os.remove(first)
+    # chunks written after the newest manifest are kept, make them older
+    for _, path, st in store.chunk_files():
+        os.utime(path, (st.st_mtime - 10, st.st_mtime - 10))
+    unused = first_chunks - store.referenced()
+    assert unused
+    assert store.gc()["chunks"] == len(unused)
+    assert {digest for digest, _, _ in store.chunk_files()} == store.referenced()
+    target = str(tmp_path / "restored" / "save")
+    store.restore(second, target)
+    assert read_tree(target) == read_tree(source)
+
+
+def test_gc_during_backup_keeps_reused_chunks(tmp_path, source):
+    dest = tmp_path / "dest"
+    store = ChunkStore(str(dest))
+    first = str(dest / "BACKUP_001.manifest")
+    second = str(dest / "BACKUP_003.manifest")
+    store.backup(source, first)
+    for _, path, st in store.chunk_files():
+        os.utime(path, (st.st_mtime - 100, st.st_mtime - 100))
+    calls = []
+
+    def check():
+        # runs before each file: the old backup goes, gc runs once slot1.sav
+        # reused its chunks
+        calls.append(1)
+        if len(calls) == 1:
+            os.remove(first)
+            # a newer manifest, so gc() doesn't keep the old chunks for being young
+            newer = dest / "BACKUP_002.manifest"
+            newer.write_text('{"files": []}')
+            mtime = os.stat(newer).st_mtime - 10
+            os.utime(newer, (mtime, mtime))
+        elif len(calls) == 2:
+            assert ChunkStore(str(dest)).gc()["chunks"] > 0
+
+    stats = store.backup(source, second, previous=first, check=check)
+    # slot1.sav and the empty file, whose chunk list is empty
+    assert stats["reused"] == 2
+    target = str(tmp_path / "restored" / "save")
+    store.restore(second, target)
+    assert read_tree(target) == read_tree(source)
+    assert store.verify(second) is None
+
+
+def test_chunk_sizes():
+    data = random.Random(3).randbytes(3 * MAX_CHUNK)
+    chunks = list(iter_chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(MIN_CHUNK <= len(chunk) <= MAX_CHUNK for chunk in chunks[:-1])
+
+
+def test_cut_points_without_numpy(monkeypatch):
+    if chunkstore._load_numpy() is None:
+        pytest.skip("numpy not installed")
+    rng = random.Random(4)
+    # random data and long runs, which only cut at MAX_CHUNK
+    data = rng.randbytes(2 * MAX_CHUNK) + bytes(MAX_CHUNK) + rng.randbytes(MAX_CHUNK)
+    vectorized = [len(chunk) for chunk in iter_chunks(io.BytesIO(data))]
+    monkeypatch.setattr(chunkstore, "_load_numpy", lambda: None)
+    assert [len(chunk) for chunk in iter_chunks(io.BytesIO(data))] == vectorized
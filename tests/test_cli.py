@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from savemanager import cli
+from savemanager.settings import save_settings, validate
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    source = tmp_path / "save"
+    source.mkdir()
+    (source / "slot1.sav").write_bytes(b"level 3")
+    (tmp_path / "backups").mkdir()
+    settings = validate({})
+    settings["PROFILES"][settings["PROFILE"]].update(
+        SOURCE_FOLDER=str(source), DEST_FOLDER=str(tmp_path / "backups")
+    )
+    path = str(tmp_path / "settings.json")
+    save_settings(settings, path)
+    return path
+
+
+def run(settings_file, *args) -> int:
+    return cli.main(["--settings", settings_file, *args])
+
+
+def test_backup_and_restore(tmp_path, settings_file, capsys):
+    assert run(settings_file, "backup") == 0
+    filename = capsys.readouterr().out.strip()
+    (tmp_path / "save" / "slot1.sav").write_bytes(b"level 4")
+    assert run(settings_file, "restore", "--no-safety", filename) == 0
+    assert (tmp_path / "save" / "slot1.sav").read_bytes() == b"level 3"
+
+
+def test_restore_missing_backup_fails(tmp_path, settings_file):
+    assert run(settings_file, "restore", "--no-safety", "BACKUP_999.7z") == 1
+    assert run(settings_file, "restore-latest", "--no-safety") == 1
+    # the save is left alone
+    assert os.listdir(tmp_path / "save") == ["slot1.sav"]
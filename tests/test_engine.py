@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from eakse.quickzip import find_7zip
+from savemanager.compression import load_zstd
+from savemanager.engine import BackupEngine
+from savemanager.settings import profile_settings, validate
+
+MTIME = 1_100_000_000
+
+
+def make_engine(tmp_path, **overrides) -> BackupEngine:
+    source = tmp_path / "save"
+    source.mkdir(parents=True, exist_ok=True)
+    dest = tmp_path / "backups"
+    dest.mkdir(parents=True, exist_ok=True)
+    settings = validate({})
+    settings["PROFILES"][settings["PROFILE"]].update(
+        SOURCE_FOLDER=str(source), DEST_FOLDER=str(dest), **overrides
+    )
+    return BackupEngine(profile_settings(settings, settings["PROFILE"]))
+
+
+@pytest.mark.parametrize("backend", ["7z", "zip", "tar.zst"])
+def test_restore_keeps_mtimes(tmp_path, backend):
+    if backend == "tar.zst" and load_zstd() is None:
+        pytest.skip("no zstd module")
+    engine = make_engine(tmp_path, COMPRESSION={"backend": backend, "native": "off"})
+    path = tmp_path / "save" / "slot" / "slot1.sav"
+    path.parent.mkdir()
+    path.write_bytes(b"level 3")
+    os.utime(path, (MTIME, MTIME))
+    filename = engine.add_new_backup()
+    assert filename.endswith(backend)
+    path.write_bytes(b"level 4")
+    engine.restore_backup(engine.dest_path(filename), False)
+    assert path.read_bytes() == b"level 3"
+    assert os.stat(path).st_mtime == MTIME
+
+
+def round_trip(tmp_path, native: str):
+    """Back up a small tree as 7z, restore it elsewhere: (member names, file mtimes)."""
+    engine = make_engine(tmp_path, COMPRESSION={"backend": "7z", "native": native})
+    source = tmp_path / "save"
+    (source / "empty").mkdir(parents=True, exist_ok=True)
+    for relpath, mtime in (("slot1.sav", MTIME), ("profile/options.ini", MTIME + 86400)):
+        path = source / relpath
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(relpath.encode())
+        os.utime(path, (mtime, mtime))
+    filename = engine.dest_path(engine.add_new_backup())
+    entries, dirs = engine.backend_for(filename).listing(filename)
+    target = tmp_path / "restored"
+    engine.backend_for(filename).extractall(filename, str(target))
+    mtimes = {name: os.stat(target / name).st_mtime for name in entries}
+    return sorted(entries) + sorted(dirs), mtimes
+
+
+def test_native_and_py7zr_archives_match(tmp_path):
+    names, mtimes = round_trip(tmp_path / "py7zr", "off")
+    assert names == [
+        "save/profile/options.ini",
+        "save/slot1.sav",
+        "save",
+        "save/empty",
+        "save/profile",
+    ]
+    assert mtimes == {"save/slot1.sav": MTIME, "save/profile/options.ini": MTIME + 86400}
+    if find_7zip() is None:
+        pytest.skip("7-Zip not installed")
+    assert round_trip(tmp_path / "native", "auto") == (names, mtimes)
@@ -0,0 +1,70 @@
+import os
+
+from savemanager.fingerprint import HashCache, diff_trees, pack_entries, scan_tree, unpack_entries
+
+
+def write(path, data: bytes, mtime_ns=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as outfile:
+        outfile.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_same_tree_same_digest(tmp_path):
+    write(str(tmp_path / "slot1.sav"), b"one")
+    write(str(tmp_path / "sub" / "slot2.sav"), b"two")
+    assert scan_tree(str(tmp_path)).digest == scan_tree(str(tmp_path)).digest
+
+
+def test_changes_change_the_digest(tmp_path):
+    path = str(tmp_path / "slot1.sav")
+    write(path, b"one", mtime_ns=1_000_000_000)
+    before = scan_tree(str(tmp_path))
+    write(path, b"two", mtime_ns=2_000_000_000)
+    after = scan_tree(str(tmp_path))
+    assert before.digest != after.digest
+    assert diff_trees(before.entries, after.entries).changed == ["slot1.sav"]
+
+
+def test_touch_only_counts_without_content_hashes(tmp_path):
+    path = str(tmp_path / "slot1.sav")
+    write(path, b"same", mtime_ns=1_000_000_000)
+    hashes = HashCache()
+    by_mtime = scan_tree(str(tmp_path))
+    by_content = scan_tree(str(tmp_path), hashes)
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert scan_tree(str(tmp_path)).digest != by_mtime.digest
+    assert scan_tree(str(tmp_path), hashes).digest == by_content.digest
+
+
+def test_hash_cache_stores_new_hashes(tmp_path):
+    write(str(tmp_path / "slot1.sav"), b"data")
+    stored = []
+    hashes = HashCache(store=stored.extend)
+    scan_tree(str(tmp_path), hashes)
+    scan_tree(str(tmp_path), hashes)
+    # hashed once, the second scan hits the cache
+    assert len(stored) == 1
+    warm = HashCache(load=lambda: stored)
+    assert scan_tree(str(tmp_path), warm).digest == scan_tree(str(tmp_path), hashes).digest
+    assert not warm.new
+
+
+def test_diff_trees(tmp_path):
+    write(str(tmp_path / "kept.sav"), b"k")
+    write(str(tmp_path / "gone.sav"), b"g")
+    before = scan_tree(str(tmp_path)).entries
+    os.remove(str(tmp_path / "gone.sav"))
+    write(str(tmp_path / "new" / "added.sav"), b"a")
+    diff = diff_trees(before, scan_tree(str(tmp_path)).entries)
+    assert diff.added == ["new/", "new/added.sav"]
+    assert diff.removed == ["gone.sav"]
+    assert diff.changed == []
+
+
+def test_pack_round_trip(tmp_path):
+    write(str(tmp_path / "slot1.sav"), b"one")
+    write(str(tmp_path / "sub" / "slot2.sav"), b"two")
+    entries = scan_tree(str(tmp_path), HashCache()).entries
+    assert unpack_entries(pack_entries(entries)) == entries
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from savemanager.jobs import AUTOMATIC, JobCancelled, JobScheduler, MANUAL
+
+
+class FakeRoot:
+    def after(self, ms, func):
+        pass
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(FakeRoot(), max_jobs=2, max_per_device=0, log=lambda text: None)
+    yield scheduler
+    scheduler.stop()
+
+
+@pytest.fixture
+def gate():
+    # jobs block on it until the test opens it
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def running(scheduler) -> list:
+    return sorted(job.name for job in scheduler.jobs() if job.state == "running")
+
+
+def test_max_jobs(scheduler, gate):
+    for name in ("a", "b", "c"):
+        scheduler.submit(name, gate.wait, profile=name)
+    wait_for(lambda: len(running(scheduler)) == 2)
+    assert running(scheduler) == ["a", "b"]
+    gate.set()
+    wait_for(lambda: not scheduler.busy())
+
+
+def test_light_jobs_dont_count(scheduler, gate):
+    scheduler.submit("a", gate.wait, profile="a")
+    scheduler.submit("b", gate.wait, profile="b")
+    scheduler.submit("list", gate.wait, profile="c", heavy=False)
+    wait_for(lambda: len(running(scheduler)) == 3)
+
+
+def test_one_job_per_profile_in_priority_order(scheduler, gate):
+    order = []
+    scheduler.submit("first", gate.wait, profile="p")
+    scheduler.submit("auto", order.append, "auto", profile="p", priority=AUTOMATIC)
+    scheduler.submit("manual", order.append, "manual", profile="p", priority=MANUAL)
+    wait_for(lambda: running(scheduler) == ["first"])
+    time.sleep(0.05)
+    assert running(scheduler) == ["first"]
+    gate.set()
+    wait_for(lambda: not scheduler.busy())
+    assert order == ["manual", "auto"]
+
+
+def test_max_per_device(tmp_path, gate):
+    scheduler = JobScheduler(FakeRoot(), max_jobs=0, max_per_device=1, log=lambda text: None)
+    disk = str(tmp_path)
+    scheduler.submit("a", gate.wait, profile="a", paths=(disk,))
+    scheduler.submit("b", gate.wait, profile="b", paths=(disk,))
+    # a light job doesn't wait for the disk
+    scheduler.submit("list", gate.wait, profile="c", paths=(disk,), heavy=False)
+    wait_for(lambda: len(running(scheduler)) == 2)
+    time.sleep(0.05)
+    assert running(scheduler) == ["a", "list"]
+    gate.set()
+    wait_for(lambda: not scheduler.busy())
+    scheduler.stop()
+
+
+def test_cancel(scheduler):
+    started = threading.Event()
+    ran = []
+
+    def work():
+        started.set()
+        while True:
+            scheduler.check_cancelled()
+            time.sleep(0.01)
+
+    running_job = scheduler.submit("work", work, profile="p")
+    queued_job = scheduler.submit("later", ran.append, 1, profile="p")
+    started.wait(5)
+    scheduler.cancel("p")
+    wait_for(lambda: not scheduler.busy("p"))
+    assert ran == []
+    assert running_job.cancelled and queued_job.cancelled
+
+
+def test_results_reach_on_done(scheduler):
+    results = {}
+
+    def on_done(job, result, error):
+        results[job.name] = (result, type(error))
+
+    scheduler.submit("ok", lambda: 42, profile="a", on_done=on_done)
+    scheduler.submit("fails", lambda: 1 / 0, profile="b", on_done=on_done)
+    # on_done runs on the Tk thread, from poll()
+    wait_for(lambda: scheduler.poll() or len(results) == 2)
+    assert results == {"ok": (42, type(None)), "fails": (None, ZeroDivisionError)}
+
+
+def test_cancelled_job_reports_job_cancelled(scheduler):
+    started = threading.Event()
+    errors = []
+
+    def work():
+        started.set()
+        while True:
+            scheduler.check_cancelled()
+            time.sleep(0.01)
+
+    def on_done(job, result, error):
+        errors.append(error)
+
+    scheduler.submit("work", work, profile="p", on_done=on_done)
+    started.wait(5)
+    scheduler.cancel("p")
+    wait_for(lambda: scheduler.poll() or errors)
+    assert isinstance(errors[0], JobCancelled)
+
+
+def test_check_cancelled_outside_jobs(scheduler):
+    # not in a job: nothing to cancel
+    scheduler.check_cancelled()
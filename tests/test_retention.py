@@ -0,0 +1,85 @@
+import json
+import time
+
+from savemanager.retention import is_active, resolve_policy, select_prune
+
+HOUR = 3600
+DAY = 24 * HOUR
+NOW = time.mktime((2026, 6, 15, 12, 0, 0, 0, 0, -1))
+GB = 1024**3
+
+
+def row(number: int, age: float = 0, size: int = 0, pinned: bool = False, delta_refs=None) -> dict:
+    return {
+        "filename": f"BACKUP_{number:03}.7z",
+        "number": number,
+        "created": NOW - age,
+        "size": size,
+        "pinned": int(pinned),
+        "delta_refs": json.dumps(delta_refs) if delta_refs else None,
+    }
+
+
+def names(rows: list) -> list:
+    return [r["filename"] for r in rows]
+
+
+def test_inactive_policy_keeps_everything():
+    rows = [row(n, age=n * DAY) for n in range(1, 6)]
+    assert not is_active(resolve_policy({}))
+    assert select_prune(rows, {}) == []
+
+
+def test_keep_last():
+    rows = [row(n, age=(10 - n) * HOUR) for n in range(1, 11)]
+    assert names(select_prune(rows, {"keep_last": 3})) == names(rows[:7])
+
+
+def test_pinned_and_newest_are_kept():
+    rows = [row(1, pinned=True), row(2), row(3), row(4)]
+    assert names(select_prune(rows, {"keep_last": 1})) == ["BACKUP_002.7z", "BACKUP_003.7z"]
+
+
+def test_daily_keeps_newest_of_each_day():
+    # two backups a day for five days, numbered oldest first
+    rows = [row(n, age=(10 - n) * DAY / 2) for n in range(1, 11)]
+    pruned = names(select_prune(rows, {"daily": 3}))
+    kept = [r for r in rows if r["filename"] not in pruned]
+    days = [time.strftime("%Y-%m-%d", time.localtime(r["created"])) for r in kept]
+    assert len(set(days)) == len(days) == 3
+    # the newest of each kept day survives
+    assert all(
+        r["created"] >= other["created"]
+        for r in kept
+        for other in rows
+        if time.localtime(other["created"])[:3] == time.localtime(r["created"])[:3]
+    )
+
+
+def test_size_cap_prunes_oldest_first():
+    rows = [row(n, age=(5 - n) * HOUR, size=GB // 2) for n in range(1, 6)]
+    assert names(select_prune(rows, {"max_size_gb": 1.2})) == names(rows[:3])
+
+
+def test_size_cap_skips_pinned():
+    rows = [row(1, size=GB, pinned=True), row(2, size=GB), row(3, size=GB)]
+    assert names(select_prune(rows, {"max_size_gb": 2})) == ["BACKUP_002.7z"]
+
+
+def test_delta_bases_are_kept():
+    rows = [row(1), row(2), row(3, delta_refs=["BACKUP_001.7z"])]
+    assert names(select_prune(rows, {"keep_last": 1})) == ["BACKUP_002.7z"]
+
+
+def test_size_cap_counts_shared_chunks_once():
+    rows = [
+        {**row(n, age=(4 - n) * HOUR, size=1000), "filename": f"BACKUP_{n:03}.manifest"}
+        for n in range(1, 5)
+    ]
+    # every manifest shares "base", each adds a chunk of its own
+    chunks = {r["filename"]: {"base": GB // 2, r["filename"]: GB // 4} for r in rows}
+    # all four: 1/2 + 4 * 1/4 GB, the two newest: 1/2 + 2 * 1/4 GB
+    pruned = select_prune(rows, {"max_size_gb": 1.1}, chunks)
+    assert names(pruned) == ["BACKUP_001.manifest", "BACKUP_002.manifest"]
+    # without chunk sizes only the tiny manifests count
+    assert select_prune(rows, {"max_size_gb": 1.1}) == []
@@ -0,0 +1,110 @@
+import io
+import multiprocessing
+import os
+import random
+import time
+
+import pytest
+
+from savemanager.catalog import file_checksum
+from savemanager.chunkstore import ChunkStore
+from savemanager.compression import get_backend, resolve_options
+from savemanager.scrub import Scrubber, Throttle, verify_file
+
+OPTIONS = resolve_options({"backend": "zip", "native": "off"})
+DATA = random.Random(1).randbytes(1024 * 1024)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / "BACKUP_001.zip")
+    writer = get_backend(path, OPTIONS).writer(path)
+    writer.add(io.BytesIO(DATA), "save/slot1.sav")
+    writer.add(io.BytesIO(b"volume=7\n"), "save/options.ini")
+    writer.close()
+    return path
+
+
+def corrupt(path: str):
+    with open(path, "r+b") as outfile:
+        outfile.seek(os.path.getsize(path) // 2)
+        outfile.write(b"garbage")
+
+
+def test_good_archive(archive):
+    assert verify_file(archive, file_checksum(archive), OPTIONS) == (True, "ok")
+
+
+def test_missing_archive(tmp_path):
+    assert verify_file(str(tmp_path / "gone.zip"), None, OPTIONS) == (False, "missing")
+
+
+def test_checksum_mismatch(archive):
+    assert verify_file(archive, "0" * 40, OPTIONS) == (False, "checksum mismatch")
+
+
+def test_bad_member(archive):
+    corrupt(archive)
+    ok, message = verify_file(archive, None, OPTIONS)
+    assert not ok
+    assert message == "bad member: save/slot1.sav"
+
+
+def test_manifest(tmp_path):
+    source = tmp_path / "save"
+    source.mkdir()
+    (source / "slot1.sav").write_bytes(DATA)
+    manifest = str(tmp_path / "dest" / "BACKUP_001.manifest")
+    store = ChunkStore(str(tmp_path / "dest"))
+    store.backup(str(source), manifest)
+    assert verify_file(manifest, None, OPTIONS) == (True, "ok")
+    digest = store.load_manifest(manifest)["files"][0]["chunks"][0]
+    corrupt(store.chunk_path(digest))
+    assert verify_file(manifest, None, OPTIONS) == (False, "bad member: slot1.sav")
+
+
+def test_throttle_covers_member_test(archive):
+    # checksum and member test both read the archive, about 2 MB at 4 MB/s
+    started = time.monotonic()
+    assert verify_file(archive, file_checksum(archive), OPTIONS, max_mb_s=4)[0]
+    assert time.monotonic() - started >= 0.4
+
+
+def test_throttle_rate():
+    throttle = Throttle(10 * 1024 * 1024)
+    started = time.monotonic()
+    for _ in range(5):
+        throttle.add(1024 * 1024)
+    assert time.monotonic() - started >= 0.45
+
+
+def test_scrubber(tmp_path, archive):
+    bad = str(tmp_path / "BACKUP_002.zip")
+    with open(archive, "rb") as infile, open(bad, "wb") as outfile:
+        outfile.write(infile.read())
+    corrupt(bad)
+    results = {}
+    Scrubber(workers=2).run(
+        [("BACKUP_001.zip", archive, None), ("BACKUP_002.zip", bad, None)],
+        OPTIONS,
+        lambda filename, ok, message: results.update({filename: ok}),
+    )
+    assert results == {"BACKUP_001.zip": True, "BACKUP_002.zip": False}
+
+
+def test_scrubber_cancel(archive):
+    class Cancelled(Exception):
+        pass
+
+    def check():
+        raise Cancelled()
+
+    started = time.monotonic()
+    with pytest.raises(Cancelled):
+        # would take seconds at this rate, cancel doesn't wait for it
+        Scrubber(workers=2, max_mb_s=0.2, check=check).run(
+            [("a", archive, None), ("b", archive, None)], OPTIONS, print
+        )
+    assert time.monotonic() - started < 3
+    # the running verifies were stopped, not left reading in the background
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,76 @@
+from savemanager.settings import DEFAULT_SETTINGS, PROFILE_KEYS, profile_settings, validate
+
+
+def test_defaults_for_empty_settings():
+    settings = validate({})
+    for key, default in DEFAULT_SETTINGS.items():
+        if key != "PROFILES":
+            assert settings[key] == default
+    # settings from before profiles become the default profile
+    assert list(settings["PROFILES"]) == ["default"]
+    assert set(settings["PROFILES"]["default"]) == set(PROFILE_KEYS)
+
+
+def test_wrong_types_get_the_default():
+    logged = []
+    settings = validate({"FILE_EXT": 7, "SHOW_DEBUG": "yes", "X_POS": 1.5}, logged.append)
+    assert settings["FILE_EXT"] == DEFAULT_SETTINGS["FILE_EXT"]
+    assert settings["SHOW_DEBUG"] is DEFAULT_SETTINGS["SHOW_DEBUG"]
+    # ints and floats are interchangeable
+    assert settings["X_POS"] == 1.5
+    assert len(logged) == 2
+
+
+def test_dict_settings_are_merged_per_key():
+    settings = validate({"RETENTION": {"keep_last": 5, "daily": "many"}}, lambda text: None)
+    assert settings["RETENTION"] == {**DEFAULT_SETTINGS["RETENTION"], "keep_last": 5}
+
+
+def test_compression_preset_name():
+    assert validate({"COMPRESSION": "fastest"})["COMPRESSION"] == "fastest"
+    # missing keys come from the preset, not from the default
+    assert validate({"COMPRESSION": {"level": 3}})["COMPRESSION"] == {"level": 3}
+
+
+def test_unknown_keys_are_kept():
+    assert validate({"FROM_A_NEWER_VERSION": 1})["FROM_A_NEWER_VERSION"] == 1
+
+
+def test_profiles_are_validated():
+    logged = []
+    settings = validate(
+        {
+            "SOURCE_FOLDER": "/saves",
+            "PROFILE": "gone",
+            "PROFILES": {
+                "game": {"DEST_FOLDER": "/backups", "JOBS": {}, "FILE_EXT": 3, "TRACE": "summary"},
+                "broken": [],
+            },
+        },
+        logged.append,
+    )
+    assert list(settings["PROFILES"]) == ["game"]
+    game = settings["PROFILES"]["game"]
+    # shared keys and wrong types are dropped, missing profile keys filled in
+    assert game == {
+        "DEST_FOLDER": "/backups",
+        "TRACE": "summary",
+        "SOURCE_FOLDER": "/saves",
+        "APP_PATH": "",
+    }
+    assert settings["PROFILE"] == "game"
+    assert len(logged) == 3
+
+
+def test_profile_settings_layer_over_shared():
+    settings = validate({"PROFILES": {"a": {"TRACE": "summary"}, "b": {}}})
+    a = profile_settings(settings, "a")
+    b = profile_settings(settings, "b")
+    assert a["TRACE"] == "summary"
+    assert b["TRACE"] == ""
+    settings["LOG_LEVEL"] = "DEBUG"
+    assert a["LOG_LEVEL"] == b["LOG_LEVEL"] == "DEBUG"
+    # writes stay in the profile
+    a["SOURCE_FOLDER"] = "/a"
+    assert b["SOURCE_FOLDER"] != "/a"
+    assert settings["SOURCE_FOLDER"] != "/a"